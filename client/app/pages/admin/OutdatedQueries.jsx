@@ -1,4 +1,4 @@
-import { map, uniqueId } from "lodash";
+import { isNil, map, uniqueId } from "lodash";
 import React from "react";
 
 import Switch from "antd/lib/switch";
@@ -17,6 +17,7 @@ import { StateStorage } from "@/components/items-list/classes/StateStorage";
 import LoadingState from "@/components/items-list/components/LoadingState";
 import ItemsTable, { Columns } from "@/components/items-list/components/ItemsTable";
 
+import { prettySize } from "@/lib/utils";
 import { axios } from "@/services/axios";
 import { Query } from "@/services/query";
 import recordEvent from "@/services/recordEvent";
@@ -59,6 +60,11 @@ class OutdatedQueries extends React.Component {
     Columns.dateTime.sortable({ title: "Created At", field: "created_at" }),
     Columns.duration.sortable({ title: "Runtime", field: "runtime" }),
     Columns.dateTime.sortable({ title: "Last Executed At", field: "retrieved_at", orderByField: "executed_at" }),
+    Columns.custom((text, item) => (isNil(item.byte_size) ? "" : prettySize(item.byte_size)), {
+      title: "Result Size",
+      field: "byte_size",
+      width: "1%",
+    }),
     Columns.custom.sortable((text, item) => <SchedulePhrase schedule={item.schedule} isNew={item.isNew()} />, {
       title: "Update Schedule",
       field: "schedule",
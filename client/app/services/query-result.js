@@ -7,6 +7,8 @@ import { isString, uniqBy, each, isNumber, includes, extend, forOwn, get } from
 
 const logger = debug("redash:services:QueryResult");
 const filterTypes = ["filter", "multi-filter", "multiFilter"];
+// Seconds the server may hold a job status request until the job completes (see REDASH_JOB_WAIT_TIMEOUT).
+const JOB_WAIT_TIMEOUT = 30;
 
 function defer() {
   const result = { onStatusChange: status => {} };
@@ -101,7 +103,7 @@ function sleep(ms) {
 }
 
 export function fetchDataFromJob(jobId, interval = 1000) {
-  return axios.get(`api/jobs/${jobId}`).then(data => {
+  return axios.get(`api/jobs/${jobId}`, { params: { wait: JOB_WAIT_TIMEOUT } }).then(data => {
     const status = statuses[data.job.status];
     if (status === ExecutionStatus.WAITING || status === ExecutionStatus.PROCESSING) {
       return sleep(interval).then(() => fetchDataFromJob(data.job.id));
@@ -405,9 +407,11 @@ class QueryResult {
     const loadResult = () =>
       Auth.isAuthenticated() ? this.loadResult() : this.loadLatestCachedResult(query, parameters);
 
+    // The server responds as soon as the job completes, or after at most `wait` seconds (if it supports waiting).
+    const params = { wait: JOB_WAIT_TIMEOUT };
     const request = Auth.isAuthenticated()
-      ? axios.get(`api/jobs/${this.job.id}`)
-      : axios.get(`api/queries/${query}/jobs/${this.job.id}`);
+      ? axios.get(`api/jobs/${this.job.id}`, { params })
+      : axios.get(`api/queries/${query}/jobs/${this.job.id}`, { params });
 
     request
       .then(jobResponse => {
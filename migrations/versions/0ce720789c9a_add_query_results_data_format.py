@@ -0,0 +1,26 @@
+"""Add data format and blob columns to query results
+
+Revision ID: 0ce720789c9a
+Revises: 7205816877ec
+Create Date: 2026-10-18 09:12:40.116294
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0ce720789c9a"
+down_revision = "7205816877ec"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("query_results", sa.Column("data_format", sa.String(length=32), nullable=True))
+    op.add_column("query_results", sa.Column("data_blob", sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("query_results", "data_blob")
+    op.drop_column("query_results", "data_format")
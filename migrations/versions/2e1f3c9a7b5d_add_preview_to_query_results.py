@@ -0,0 +1,24 @@
+"""Add preview to query results
+
+Revision ID: 2e1f3c9a7b5d
+Revises: 6381cd729b87
+Create Date: 2026-10-18 14:02:37.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2e1f3c9a7b5d"
+down_revision = "6381cd729b87"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("query_results", sa.Column("preview", sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("query_results", "preview")
@@ -0,0 +1,74 @@
+"""Add next_run_at to queries
+
+Revision ID: 6381cd729b87
+Revises: 86b95a1ced2a
+Create Date: 2026-10-18 11:21:05.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import table
+
+from redash.models import get_next_run_at, scheduled_queries_executions
+from redash.utils import utcnow
+
+
+# revision identifiers, used by Alembic.
+revision = "6381cd729b87"
+down_revision = "86b95a1ced2a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("queries", sa.Column("next_run_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        "queries_next_run_at",
+        "queries",
+        ["next_run_at"],
+        unique=False,
+        postgresql_where=sa.text("next_run_at IS NOT NULL"),
+    )
+
+    queries = table(
+        "queries",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("schedule", JSONB),
+        sa.Column("schedule_failures", sa.Integer),
+        sa.Column("latest_query_data_id", sa.Integer),
+        sa.Column("next_run_at", sa.DateTime(timezone=True)),
+    )
+    query_results = table(
+        "query_results",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("retrieved_at", sa.DateTime(timezone=True)),
+    )
+
+    conn = op.get_bind()
+    scheduled_queries_executions.refresh()
+    retrieved_at = (
+        sa.select([query_results.c.retrieved_at])
+        .where(query_results.c.id == queries.c.latest_query_data_id)
+        .as_scalar()
+        .label("retrieved_at")
+    )
+    scheduled_queries = conn.execute(
+        sa.select([queries.c.id, queries.c.schedule, queries.c.schedule_failures, retrieved_at]).where(
+            sa.func.jsonb_typeof(queries.c.schedule) != "null"
+        )
+    )
+    for query in scheduled_queries.fetchall():
+        previous_iteration = scheduled_queries_executions.get(query.id) or query.retrieved_at
+        try:
+            next_run_at = get_next_run_at(query.schedule, query.schedule_failures, previous_iteration)
+        except Exception:
+            next_run_at = utcnow()
+
+        if next_run_at is not None:
+            conn.execute(queries.update().where(queries.c.id == query.id).values(next_run_at=next_run_at))
+
+
+def downgrade():
+    op.drop_index("queries_next_run_at", table_name="queries")
+    op.drop_column("queries", "next_run_at")
@@ -0,0 +1,31 @@
+"""Add result store reference and metadata columns to query results
+
+Revision ID: 86b95a1ced2a
+Revises: 0ce720789c9a
+Create Date: 2026-10-18 10:03:27.552481
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision = "86b95a1ced2a"
+down_revision = "0ce720789c9a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("query_results", sa.Column("data_ref", sa.String(length=255), nullable=True))
+    op.add_column("query_results", sa.Column("row_count", sa.Integer(), nullable=True))
+    op.add_column("query_results", sa.Column("byte_size", sa.BigInteger(), nullable=True))
+    op.add_column("query_results", sa.Column("column_schema", JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    op.drop_column("query_results", "column_schema")
+    op.drop_column("query_results", "byte_size")
+    op.drop_column("query_results", "row_count")
+    op.drop_column("query_results", "data_ref")
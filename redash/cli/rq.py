@@ -12,6 +12,7 @@ from supervisor_checks.check_modules import base
 
 from redash import rq_redis_connection
 from redash.tasks import (
+    QueryScheduler,
     periodic_job_definitions,
     rq_scheduler,
     schedule_periodic_jobs,
@@ -29,6 +30,12 @@ def scheduler():
     rq_scheduler.run()
 
 
+@manager.command()
+def query_scheduler():
+    """Refresh scheduled queries as they become due (see REDASH_DEDICATED_QUERY_SCHEDULER)."""
+    QueryScheduler().run()
+
+
 @manager.command()
 @argument("queues", nargs=-1)
 def worker(queues):
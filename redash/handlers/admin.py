@@ -1,4 +1,5 @@
 from flask_login import current_user, login_required
+from sqlalchemy.orm import contains_eager
 
 from redash import models, redis_connection
 from redash.authentication import current_org
@@ -19,6 +20,7 @@ def outdated_queries():
     if query_ids:
         outdated_queries = (
             models.Query.query.outerjoin(models.QueryResult)
+            .options(contains_eager(models.Query.latest_query_data).load_only(*models.QueryResult.STATS_COLUMNS))
             .filter(models.Query.id.in_(query_ids))
             .order_by(models.Query.created_at.desc())
         )
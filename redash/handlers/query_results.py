@@ -2,7 +2,7 @@ import unicodedata
 from urllib.parse import quote
 
 import regex
-from flask import make_response, request
+from flask import make_response, request, stream_with_context
 from flask_login import current_user
 from flask_restful import abort
 
@@ -25,11 +25,12 @@ from redash.permissions import (
 from redash.serializers import (
     serialize_job,
     serialize_query_result,
-    serialize_query_result_to_dsv,
-    serialize_query_result_to_xlsx,
+    stream_query_result_to_dsv,
+    stream_query_result_to_xlsx,
 )
 from redash.tasks import Job
 from redash.tasks.queries import enqueue_query
+from redash.tasks.worker import COMPLETED_JOB_STATUSES, wait_for_job
 from redash.utils import (
     collect_parameters_from_request,
     json_dumps,
@@ -81,7 +82,7 @@ def run_query(query, parameters, data_source, query_id, should_apply_auto_limit,
     if max_age == 0:
         query_result = None
     else:
-        query_result = models.QueryResult.get_latest(data_source, query_text, max_age)
+        query_result = models.QueryResult.get_latest(data_source, query_text, max_age, with_data=True)
 
     record_event(
         current_user.org,
@@ -306,12 +307,16 @@ class QueryResultResource(BaseResource):
         # They need to be split, as they have different logic (for example, retrieving by query id
         # should check for query parameters and shouldn't cache the result).
         should_cache = query_result_id is not None
+        # The JSON response reads the stored result as is (see make_json_response).
+        with_data = filetype != "json"
 
         query_result = None
         query = None
 
         if query_result_id:
-            query_result = get_object_or_404(models.QueryResult.get_by_id_and_org, query_result_id, self.current_org)
+            query_result = get_object_or_404(
+                models.QueryResult.get_by_id_and_org, query_result_id, self.current_org, with_data=with_data
+            )
 
         if query_id is not None:
             query = get_object_or_404(models.Query.get_by_id_and_org, query_id, self.current_org)
@@ -321,6 +326,7 @@ class QueryResultResource(BaseResource):
                     models.QueryResult.get_by_id_and_org,
                     query.latest_query_data_id,
                     self.current_org,
+                    with_data=with_data,
                 )
 
             if query is not None and query_result is not None and self.current_user.is_api_user():
@@ -351,12 +357,20 @@ class QueryResultResource(BaseResource):
                 self.record_event(event)
 
             response_builders = {
-                "json": self.make_json_response,
                 "xlsx": self.make_excel_response,
                 "csv": self.make_csv_response,
                 "tsv": self.make_tsv_response,
             }
-            response = response_builders[filetype](query_result)
+            if filetype == "json":
+                # A query result never changes, so its ID identifies the response.
+                etag = "query-result-{}".format(query_result.id)
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response("", 304)
+                else:
+                    response = self.make_json_response(query_result)
+                response.set_etag(etag, weak=True)
+            else:
+                response = response_builders[filetype](query_result)
 
             if len(settings.ACCESS_CONTROL_ALLOW_ORIGIN) > 0:
                 self.add_cors_headers(response.headers)
@@ -376,32 +390,44 @@ class QueryResultResource(BaseResource):
 
     @staticmethod
     def make_json_response(query_result):
-        data = json_dumps({"query_result": query_result.to_dict()})
+        # The result's data is spliced into the response as it's stored, instead of being decoded and encoded again.
+        envelope = json_dumps({"query_result": query_result.to_dict(with_data=False)})
+        data = '{},"data":{}}}}}'.format(envelope[:-2], query_result.get_serialized_data())
         headers = {"Content-Type": "application/json"}
         return make_response(data, 200, headers)
 
+    # The file formats are streamed, so the whole file is never held in memory.
     @staticmethod
     def make_csv_response(query_result):
         headers = {"Content-Type": "text/csv; charset=UTF-8"}
-        return make_response(serialize_query_result_to_dsv(query_result, ","), 200, headers)
+        return make_response(stream_with_context(stream_query_result_to_dsv(query_result, ",")), 200, headers)
 
     @staticmethod
     def make_tsv_response(query_result):
         headers = {"Content-Type": "text/tab-separated-values; charset=UTF-8"}
-        return make_response(serialize_query_result_to_dsv(query_result, "\t"), 200, headers)
+        return make_response(stream_with_context(stream_query_result_to_dsv(query_result, "\t")), 200, headers)
 
     @staticmethod
     def make_excel_response(query_result):
         headers = {"Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
-        return make_response(serialize_query_result_to_xlsx(query_result), 200, headers)
+        return make_response(stream_with_context(stream_query_result_to_xlsx(query_result)), 200, headers)
 
 
 class JobResource(BaseResource):
     def get(self, job_id, query_id=None):
         """
         Retrieve info about a running query job.
+
+        :qparam number wait: Seconds to wait for the job to complete before responding (capped by
+                             REDASH_JOB_WAIT_TIMEOUT)
         """
         job = Job.fetch(job_id)
+
+        wait = min(request.args.get("wait", 0, type=float), settings.JOB_WAIT_TIMEOUT)
+        if wait > 0 and job.get_status(refresh=False) not in COMPLETED_JOB_STATUSES:
+            wait_for_job(job, wait)
+            job.refresh()
+
         return serialize_job(job)
 
     def delete(self, job_id):
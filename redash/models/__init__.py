@@ -3,18 +3,33 @@ import datetime
 import logging
 import numbers
 import time
+import uuid
+from collections.abc import Mapping, Sequence
 
 import pytz
-from sqlalchemy import UniqueConstraint, and_, cast, distinct, func, or_
+from sqlalchemy import (
+    UniqueConstraint,
+    and_,
+    cast,
+    distinct,
+    func,
+    inspect,
+    or_,
+    type_coerce,
+)
 from sqlalchemy.dialects.postgresql import ARRAY, DOUBLE_PRECISION, JSONB
 from sqlalchemy.event import listens_for
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import (
     backref,
     contains_eager,
+    deferred,
     joinedload,
     load_only,
+    object_session,
+    selectinload,
     subqueryload,
+    undefer_group,
 )
 from sqlalchemy.orm.exc import NoResultFound  # noqa: F401
 from sqlalchemy_utils import generic_relationship
@@ -45,12 +60,22 @@ from redash.models.parameterized_query import (
     ParameterizedQuery,
     QueryDetachedFromDataSourceError,
 )
+from redash.models.result_storage import (
+    ROW_GROUP_SIZE,
+    delete_stored_payloads,
+    get_result_format,
+    get_result_store,
+    iter_batches,
+    json_dumps_result,
+    select_data,
+)
 from redash.models.types import (
     Configuration,
     EncryptedConfiguration,
     JSONText,
     MutableDict,
     MutableList,
+    SerializedJSON,
     json_cast_property,
 )
 from redash.models.users import (  # noqa
@@ -103,10 +128,49 @@ class ScheduledQueriesExecutions:
 
         return timestamp
 
+    def fetch(self, query_id):
+        """Like `get`, but reads the query's execution time from Redis instead of the last `refresh`."""
+        timestamp = redis_connection.hget(self.KEY_NAME, query_id)
+        if timestamp:
+            timestamp = utils.dt_from_timestamp(timestamp)
+
+        return timestamp
+
 
 scheduled_queries_executions = ScheduledQueriesExecutions()
 
 
+class QueryScheduleChanges:
+    """A Redis stream of the ids of the queries whose next_run_at changed, read by the dedicated query scheduler."""
+
+    KEY_NAME = "sq:changes"
+    MAX_LENGTH = 10000
+
+    def publish(self, query_ids):
+        pipe = redis_connection.pipeline()
+        for query_id in query_ids:
+            pipe.xadd(self.KEY_NAME, {"query_id": query_id}, maxlen=self.MAX_LENGTH, approximate=True)
+        pipe.execute()
+
+    def last_id(self):
+        entries = redis_connection.xrevrange(self.KEY_NAME, count=1)
+        return entries[0][0] if entries else "0-0"
+
+    def read(self, last_id, timeout=0):
+        """Returns the id of the last change read and the ids of the changed queries, waiting up to `timeout` seconds."""
+        block = int(timeout * 1000) or None
+        query_ids = set()
+        for _, entries in redis_connection.xread({self.KEY_NAME: last_id}, block=block) or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                query_ids.add(int(fields["query_id"]))
+
+        return last_id, query_ids
+
+
+query_schedule_changes = QueryScheduleChanges()
+
+
 @generic_repr("id", "name", "type", "org_id", "created_at")
 class DataSource(BelongsToOrgMixin, db.Model):
     id = primary_key("DataSource")
@@ -194,9 +258,11 @@ class DataSource(BelongsToOrgMixin, db.Model):
 
     def delete(self):
         Query.query.filter(Query.data_source == self).update(dict(data_source_id=None, latest_query_data_id=None))
+        stored_payloads = QueryResult.stored_payloads(QueryResult.query.filter(QueryResult.data_source == self))
         QueryResult.query.filter(QueryResult.data_source == self).delete()
         res = db.session.delete(self)
         db.session.commit()
+        delete_stored_payloads(stored_payloads)
 
         redis_connection.delete(self._schema_key)
 
@@ -316,25 +382,168 @@ class QueryResult(db.Model, BelongsToOrgMixin):
     data_source = db.relationship(DataSource, backref=backref("query_results"))
     query_hash = Column(db.String(32), index=True)
     query_text = Column("query", db.Text)
-    data = Column(JSONText, nullable=True)
+    # The payload columns are only loaded when the result's data is read (see `get_by_id_and_org(with_data=True)`).
+    _data = deferred(Column("data", JSONText, nullable=True), group="payload")
+    # When set, the result is stored using this format (see redash.models.result_storage) in `data_blob`, or in the
+    # result store under the `data_ref` key. Otherwise it's stored as JSON in the `data` column.
+    data_format = Column(db.String(32), nullable=True)
+    data_blob = deferred(Column(db.LargeBinary, nullable=True), group="payload")
+    data_ref = Column(db.String(255), nullable=True)
+    row_count = Column(db.Integer, nullable=True)
+    byte_size = Column(db.BigInteger, nullable=True)
+    column_schema = Column(JSONB, nullable=True)
+    # The first QUERY_RESULTS_PREVIEW_ROWS rows, to read small parts of the result without loading its payload.
+    # It's a JSON text column (and not JSONB) to keep the order of the rows' keys.
+    preview = Column(JSONText, nullable=True)
     runtime = Column(DOUBLE_PRECISION)
     retrieved_at = Column(db.DateTime(True))
 
     __tablename__ = "query_results"
 
+    # The columns queries are serialized with (see `serialize_query(with_stats=True)`). Lists of queries only load
+    # these, and not the result itself.
+    STATS_COLUMNS = ("runtime", "retrieved_at", "row_count", "byte_size")
+
     def __str__(self):
         return "%d | %s | %s" % (self.id, self.query_hash, self.retrieved_at)
 
-    def to_dict(self):
-        return {
+    @property
+    def data(self):
+        # Decoded once, as it's read repeatedly (e.g. by alerts and the Python query runner).
+        if "_decoded_data" not in self.__dict__:
+            self._decoded_data = self.get_data()
+        return self._decoded_data
+
+    @data.setter
+    def data(self, data):
+        self.__dict__.pop("_decoded_data", None)
+        is_result = isinstance(data, Mapping)
+        has_rows = is_result and isinstance(data.get("rows"), Sequence)
+        self.row_count = len(data["rows"]) if has_rows else None
+        self.column_schema = data.get("columns") if is_result else None
+        # Encoded and decoded again, so the preview's values are the same as the ones read from the stored result.
+        self.preview = (
+            json_loads(json_dumps(data["rows"][: settings.QUERY_RESULTS_PREVIEW_ROWS])) if has_rows else None
+        )
+
+        result_format = get_result_format(settings.QUERY_RESULTS_STORAGE_FORMAT)
+        if not result_format.can_encode(data):
+            result_format = get_result_format("json")
+        result_store = get_result_store()
+
+        self.data_ref = None
+        self.data_blob = None
+
+        if result_format.name == "json" and result_store is None:
+            # Encode the result once here (instead of letting JSONText do it on flush), so its size is known.
+            self._data = SerializedJSON(json_dumps_result(data))
+            self.data_format = None
+            self.byte_size = len(self._data.encode("utf-8"))
+            return
+
+        payload = result_format.encode(data)
+        self._data = None
+        self.data_format = result_format.name
+        self.byte_size = len(payload)
+
+        if result_store is not None and len(payload) > settings.QUERY_RESULTS_STORE_THRESHOLD:
+            self.data_ref = uuid.uuid4().hex
+            result_store.put(self.data_ref, payload)
+            # Deleted again if the transaction is rolled back (see `discard_stored_payloads`).
+            db.session.info.setdefault("stored_payload_refs", []).append(self.data_ref)
+        else:
+            self.data_blob = payload
+
+    def get_data(self, columns=None, offset=0, limit=None):
+        """Returns the result, optionally limited to the given column names and range of rows.
+
+        With the columnar storage format only the requested parts of the stored payload are decoded. Ranges of rows
+        within the result's preview are read from it, without loading the payload (the result then only has its
+        `columns` and `rows`).
+        """
+        if self._preview_covers(offset, limit):
+            return select_data({"columns": self.column_schema, "rows": self.preview}, columns, offset, limit)
+
+        if self.data_format is None:
+            return select_data(self._legacy_data(), columns, offset, limit)
+
+        return get_result_format(self.data_format).decode(self._load_payload(), columns, offset, limit)
+
+    def _preview_covers(self, offset, limit):
+        if limit is None or self.preview is None or self.column_schema is None:
+            return False
+
+        return offset + limit <= len(self.preview) or len(self.preview) == self.row_count
+
+    def iter_row_batches(self, batch_size=ROW_GROUP_SIZE):
+        """Yields the result's rows in lists of at most `batch_size` rows."""
+        if self.data_format is None:
+            data = self._legacy_data()
+            if data is not None:
+                yield from iter_batches(data["rows"], batch_size)
+        else:
+            yield from get_result_format(self.data_format).iter_row_batches(self._load_payload(), batch_size)
+
+    def _legacy_data(self):
+        # Results set in this session are kept encoded until they're flushed (see the `data` setter).
+        if isinstance(self._data, SerializedJSON):
+            return json_loads(self._data)
+
+        return self._data
+
+    def _load_payload(self):
+        if self.data_ref is None:
+            return self.data_blob
+
+        result_store = get_result_store()
+        if result_store is None:
+            raise Exception("Query result {} is kept in a result store, but none is configured.".format(self.id))
+
+        return result_store.get(self.data_ref)
+
+    def get_serialized_data(self):
+        """Returns the result encoded as JSON. Results stored as JSON are returned as stored, without decoding them."""
+        if self.data_format == "json":
+            return self._load_payload().decode("utf-8")
+
+        if self.data_format is not None:
+            return json_dumps_result(self.get_data())
+
+        if "_data" in self.__dict__:
+            if isinstance(self._data, SerializedJSON):
+                return str(self._data)
+            return json_dumps(self._data)
+
+        # Selects the raw text of the (deferred) data column, instead of loading it through JSONText.
+        serialized_data = (
+            db.session.query(type_coerce(QueryResult._data, db.Text)).filter(QueryResult.id == self.id).scalar()
+        )
+        return "null" if serialized_data is None else serialized_data
+
+    def to_dict(self, with_data=True):
+        d = {
             "id": self.id,
             "query_hash": self.query_hash,
             "query": self.query_text,
-            "data": self.data,
             "data_source_id": self.data_source_id,
             "runtime": self.runtime,
             "retrieved_at": self.retrieved_at,
         }
+        if with_data:
+            d["data"] = self.data
+        return d
+
+    @classmethod
+    def get_by_id_and_org(cls, object_id, org, with_data=False):
+        query = cls.query.filter(cls.id == object_id, cls.org == org)
+        if with_data:
+            query = query.options(undefer_group("payload"))
+        return query.one()
+
+    @classmethod
+    def stored_payloads(cls, query):
+        """Returns the result store keys of the query results selected by the given query."""
+        return [ref for (ref,) in query.filter(cls.data_ref.isnot(None)).with_entities(cls.data_ref)]
 
     @classmethod
     def unused(cls, days=7):
@@ -344,7 +553,7 @@ class QueryResult(db.Model, BelongsToOrgMixin):
         )
 
     @classmethod
-    def get_latest(cls, data_source, query, max_age=0):
+    def get_latest(cls, data_source, query, max_age=0, with_data=False):
         query_hash = gen_query_hash(query)
 
         if max_age == -1 and settings.QUERY_RESULTS_EXPIRED_TTL_ENABLED:
@@ -362,6 +571,9 @@ class QueryResult(db.Model, BelongsToOrgMixin):
                 ),
             )
 
+        if with_data:
+            query = query.options(undefer_group("payload"))
+
         return query.order_by(cls.retrieved_at.desc()).first()
 
     @classmethod
@@ -386,7 +598,32 @@ class QueryResult(db.Model, BelongsToOrgMixin):
         return self.data_source.groups
 
 
-def should_schedule_next(previous_iteration, now, interval, time=None, day_of_week=None, failures=0):
+@listens_for(QueryResult, "expire")
+@listens_for(QueryResult, "refresh")
+def discard_decoded_data(target, *args):
+    # The target is None when it was garbage collected before a rollback expires it.
+    if target is not None:
+        target.__dict__.pop("_decoded_data", None)
+
+
+@listens_for(db.session, "after_commit")
+def keep_stored_payloads(session):
+    session.info.pop("stored_payload_refs", None)
+
+
+@listens_for(db.session, "after_soft_rollback")
+def discard_stored_payloads(session, previous_transaction):
+    # Soft rollbacks are listened to, as results that were never flushed don't make the database roll back.
+    if previous_transaction.parent is not None:
+        return
+
+    # The payloads of results that were never committed aren't referenced by any row.
+    refs = session.info.pop("stored_payload_refs", None)
+    if refs:
+        delete_stored_payloads(refs)
+
+
+def get_next_iteration(previous_iteration, interval, time=None, day_of_week=None, failures=0):
     # if time exists then interval > 23 hours (82800s)
     # if day_of_week exists then interval > 6 days (518400s)
     if time is None:
@@ -418,8 +655,43 @@ def should_schedule_next(previous_iteration, now, interval, time=None, day_of_we
         try:
             next_iteration += datetime.timedelta(minutes=2**failures)
         except OverflowError:
-            return False
-    return now > next_iteration
+            return None
+    return next_iteration
+
+
+def should_schedule_next(previous_iteration, now, interval, time=None, day_of_week=None, failures=0):
+    next_iteration = get_next_iteration(previous_iteration, interval, time, day_of_week, failures)
+    return next_iteration is not None and now > next_iteration
+
+
+def get_next_run_at(schedule, failures, previous_iteration):
+    """
+    Returns when a query with the given schedule is due next, following the rules of `should_schedule_next`, or None
+    if the schedule won't run it. Queries that never ran aren't due, as `should_schedule_next` counts from the current
+    time for them. Raises if the schedule is invalid.
+    """
+    if not schedule or schedule.get("disabled"):
+        return None
+
+    schedule_until = None
+    if schedule["until"]:
+        schedule_until = pytz.utc.localize(datetime.datetime.strptime(schedule["until"], "%Y-%m-%d"))
+
+    next_run_at = get_next_iteration(
+        previous_iteration or utils.utcnow(),
+        schedule["interval"],
+        schedule["time"],
+        schedule["day_of_week"],
+        failures,
+    )
+
+    if previous_iteration is None or next_run_at is None:
+        return None
+
+    if schedule_until is not None and next_run_at >= schedule_until:
+        return None
+
+    return next_run_at
 
 
 @gfk_type
@@ -461,6 +733,7 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
     schedule = Column(MutableDict.as_mutable(JSONB), nullable=True)
     interval = json_cast_property(db.Integer, "schedule", "interval", default=0)
     schedule_failures = Column(db.Integer, default=0)
+    next_run_at = Column(db.DateTime(True), nullable=True)
     visualizations = db.relationship("Visualization", cascade="all, delete-orphan")
     options = Column(MutableDict.as_mutable(JSONB), default={})
     search_vector = Column(
@@ -477,6 +750,7 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     query_class = SearchBaseQuery
     __tablename__ = "queries"
+    __table_args__ = (db.Index("queries_next_run_at", "next_run_at", postgresql_where=next_run_at.isnot(None)),)
     __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
     def __str__(self):
@@ -525,7 +799,7 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
         queries = (
             cls.query.options(
                 joinedload(Query.user),
-                joinedload(Query.latest_query_data).load_only("runtime", "retrieved_at"),
+                joinedload(Query.latest_query_data).load_only(*QueryResult.STATS_COLUMNS),
             )
             .filter(cls.id.in_(query_ids))
             # Adding outer joins to be able to order by relationship
@@ -585,15 +859,21 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
         ]
 
     @classmethod
-    def outdated_queries(cls):
-        queries = (
-            Query.query.options(joinedload(Query.latest_query_data).load_only("retrieved_at"))
-            .filter(func.jsonb_typeof(Query.schedule) != "null")
-            .order_by(Query.id)
-            .all()
-        )
-
+    def outdated_queries(cls, query_ids=None):
+        # next_run_at only moves when the schedule or the executions of a query change, so the rules are checked
+        # again for the due queries: their scheduled execution may have started since.
         now = utils.utcnow()
+        # The organizations, data sources and users are loaded with one SELECT each, as refresh_queries uses them.
+        queries = Query.query.options(
+            joinedload(Query.latest_query_data).load_only("retrieved_at"),
+            selectinload(Query.org),
+            selectinload(Query.data_source),
+            selectinload(Query.user),
+        ).filter(Query.next_run_at <= now)
+        if query_ids is not None:
+            queries = queries.filter(Query.id.in_(query_ids))
+        queries = queries.order_by(Query.id).all()
+
         outdated_queries = {}
         scheduled_queries_executions.refresh()
 
@@ -831,12 +1111,46 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
         self.query_hash = query_runner.gen_query_hash(query_text, should_apply_auto_limit)
 
+    def update_next_run_at(self):
+        previous_iteration = (self.id and scheduled_queries_executions.fetch(self.id)) or (
+            self.latest_query_data and self.latest_query_data.retrieved_at
+        )
+
+        try:
+            self.next_run_at = get_next_run_at(self.schedule, self.schedule_failures, previous_iteration)
+        except Exception:
+            # Due right away, so outdated_queries disables the invalid schedule.
+            self.next_run_at = utils.utcnow()
+
 
 @listens_for(Query, "before_insert")
 @listens_for(Query, "before_update")
 def receive_before_insert_update(mapper, connection, target):
     target.update_query_hash()
 
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("schedule", "schedule_failures", "latest_query_data")):
+        target.update_next_run_at()
+
+
+@listens_for(Query, "after_insert")
+@listens_for(Query, "after_update")
+def receive_after_insert_update(mapper, connection, target):
+    if settings.DEDICATED_QUERY_SCHEDULER and inspect(target).attrs.next_run_at.history.has_changes():
+        object_session(target).info.setdefault("rescheduled_query_ids", set()).add(target.id)
+
+
+@listens_for(db.session, "after_commit")
+def publish_schedule_changes(session):
+    query_ids = session.info.pop("rescheduled_query_ids", None)
+    if query_ids:
+        query_schedule_changes.publish(query_ids)
+
+
+@listens_for(db.session, "after_rollback")
+def discard_schedule_changes(session):
+    session.info.pop("rescheduled_query_ids", None)
+
 
 @listens_for(Query.user_id, "set")
 def query_last_modified_by(target, val, oldval, initiator):
@@ -959,16 +1273,14 @@ class Alert(TimestampMixin, BelongsToOrgMixin, db.Model):
         return super(Alert, cls).get_by_id_and_org(object_id, org, Query)
 
     def evaluate(self):
-        data = self.query_rel.latest_query_data.data
+        selector = self.options.get("selector", "first")
+        data = self.query_rel.latest_query_data.get_data(
+            columns=[self.options.get("column")], limit=1 if selector == "first" else None
+        )
 
         if data["rows"] and self.options["column"] in data["rows"][0]:
             op = OPERATORS.get(self.options["op"], lambda v, t: False)
 
-            if "selector" not in self.options:
-                selector = "first"
-            else:
-                selector = self.options["selector"]
-
             try:
                 if selector == "max":
                     max_val = float("-inf")
@@ -23,7 +23,7 @@ def _load_result(query_id, org):
     query = models.Query.get_by_id_and_org(query_id, org)
 
     if query.data_source:
-        query_result = models.QueryResult.get_by_id_and_org(query.latest_query_data_id, org)
+        query_result = models.QueryResult.get_by_id_and_org(query.latest_query_data_id, org, with_data=True)
         return query_result.data
     else:
         raise QueryDetachedFromDataSourceError(query_id)
@@ -0,0 +1,321 @@
+"""
+Encoding formats and external stores for the payload of `QueryResult.data`.
+
+The legacy format is a single JSON document (`{"columns": [...], "rows": [{...}, ...]}`) stored in the `data`
+text column. The columnar format stores the same document as a small header followed by zlib compressed
+column chunks, split into row groups. Readers that only need some columns or a range of rows only decompress the
+chunks they need.
+
+When a result store is configured, encoded payloads larger than `QUERY_RESULTS_STORE_THRESHOLD` are kept in the
+store and the `query_results` row only holds their key.
+"""
+import logging
+import os
+import struct
+import zlib
+from collections.abc import Mapping, Sequence
+
+from redash import settings
+from redash.query_runner import TupleResult
+from redash.utils import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+ROW_GROUP_SIZE = 10000
+
+
+class ResultFormat:
+    name = None
+
+    def encode(self, data):
+        raise NotImplementedError()
+
+    def decode(self, payload, columns=None, offset=0, limit=None):
+        raise NotImplementedError()
+
+    def iter_row_batches(self, payload, batch_size=ROW_GROUP_SIZE):
+        data = self.decode(payload)
+        if data is not None:
+            yield from iter_batches(data["rows"], batch_size)
+
+    @classmethod
+    def can_encode(cls, data):
+        return True
+
+
+def iter_batches(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start : start + batch_size]
+
+
+def _project_row(row, columns):
+    return {name: row[name] for name in columns if name in row}
+
+
+def select_data(data, columns=None, offset=0, limit=None):
+    """Applies a column and row range selection to a decoded (row oriented) result."""
+    if not data or (columns is None and offset == 0 and limit is None):
+        return data
+
+    rows = data["rows"]
+    end = None if limit is None else offset + limit
+    rows = rows[offset:end]
+
+    selected = dict(data)
+    if columns is not None:
+        selected["columns"] = [c for c in data["columns"] if c["name"] in columns]
+        rows = [_project_row(row, columns) for row in rows]
+    selected["rows"] = rows
+
+    return selected
+
+
+def json_dumps_result(data):
+    """json_dumps for query results. A TupleResult's rows are turned into dicts one batch at a time."""
+    if not isinstance(data, TupleResult) or not data.tuples:
+        return json_dumps(data)
+
+    rows = ",".join(json_dumps(batch)[1:-1] for batch in iter_batches(data["rows"], ROW_GROUP_SIZE))
+    head = json_dumps({"columns": data.columns, **data.extra})
+
+    return '{}, "rows": [{}]}}'.format(head[:-1], rows)
+
+
+class JSONResultFormat(ResultFormat):
+    name = "json"
+
+    def encode(self, data):
+        return json_dumps_result(data).encode("utf-8")
+
+    def decode(self, payload, columns=None, offset=0, limit=None):
+        return select_data(json_loads(payload), columns, offset, limit)
+
+
+class ColumnarResultFormat(ResultFormat):
+    """
+    Layout: MAGIC | header length (uint32) | header (JSON) | chunks.
+
+    The header holds the columns metadata, the list of keys the rows have, any additional top level keys of the
+    result and, for each row group, the offset and length of each column's chunk. A chunk is a zlib compressed JSON
+    array of the column's values. Cells missing from a row (as opposed to null) are listed per row group in the
+    header, so the original rows are restored exactly.
+    """
+
+    name = "columnar"
+    MAGIC = b"RDC1"
+    _header_length = struct.Struct(">I")
+
+    @classmethod
+    def can_encode(cls, data):
+        return (
+            isinstance(data, Mapping)
+            and isinstance(data.get("columns"), list)
+            and isinstance(data.get("rows"), Sequence)
+        )
+
+    def _group_values(self, group, index, key, missing):
+        values = []
+        for row_index, row in enumerate(group):
+            if key in row:
+                values.append(row[key])
+            else:
+                values.append(None)
+                missing.setdefault(str(index), []).append(row_index)
+
+        return values
+
+    def encode(self, data):
+        columns = data["columns"]
+
+        # A TupleResult's rows have exactly one value per column, so the column values are read off the tuples
+        # directly, without building the rows' dicts.
+        if isinstance(data, TupleResult):
+            rows = data.tuples
+            keys = data.column_names
+        else:
+            rows = data["rows"]
+            keys = {c["name"]: None for c in columns}
+            for row in rows:
+                for key in row:
+                    if key not in keys:
+                        keys[key] = None
+            keys = list(keys)
+
+        chunks = []
+        position = 0
+        row_groups = []
+        for start in range(0, len(rows), ROW_GROUP_SIZE):
+            group = rows[start : start + ROW_GROUP_SIZE]
+            offsets = []
+            missing = {}
+            for index, key in enumerate(keys):
+                if isinstance(data, TupleResult):
+                    values = [row[index] for row in group]
+                else:
+                    values = self._group_values(group, index, key, missing)
+                chunk = zlib.compress(json_dumps(values).encode("utf-8"))
+                offsets.append([position, len(chunk)])
+                position += len(chunk)
+                chunks.append(chunk)
+
+            row_groups.append({"rows": len(group), "chunks": offsets, "missing": missing})
+
+        header = {
+            "columns": columns,
+            "keys": keys,
+            "row_count": len(rows),
+            "row_groups": row_groups,
+            "extra": {k: v for k, v in data.items() if k not in ("columns", "rows")},
+        }
+        header = json_dumps(header).encode("utf-8")
+
+        return b"".join([self.MAGIC, self._header_length.pack(len(header)), header] + chunks)
+
+    def read_header(self, payload):
+        payload = memoryview(payload)
+        if bytes(payload[: len(self.MAGIC)]) != self.MAGIC:
+            raise ValueError("Not a columnar query result payload.")
+
+        start = len(self.MAGIC) + self._header_length.size
+        (length,) = self._header_length.unpack(payload[len(self.MAGIC) : start])
+        header = json_loads(bytes(payload[start : start + length]).decode("utf-8"))
+
+        return header, start + length
+
+    def _decode_row_group(self, payload, body, keys, group, selected, start, end):
+        values = {}
+        for i in selected:
+            chunk_offset, chunk_length = group["chunks"][i]
+            chunk = payload[body + chunk_offset : body + chunk_offset + chunk_length]
+            values[i] = json_loads(zlib.decompress(chunk).decode("utf-8"))
+
+        missing = {int(i): set(indexes) for i, indexes in group["missing"].items()}
+        return [
+            {keys[i]: values[i][row_index] for i in selected if i not in missing or row_index not in missing[i]}
+            for row_index in range(start, end)
+        ]
+
+    def decode(self, payload, columns=None, offset=0, limit=None):
+        header, body = self.read_header(payload)
+        payload = memoryview(payload)
+
+        keys = header["keys"]
+        if columns is None:
+            selected = list(range(len(keys)))
+        else:
+            selected = [i for i, key in enumerate(keys) if key in columns]
+
+        end = header["row_count"] if limit is None else min(offset + limit, header["row_count"])
+        rows = []
+        group_start = 0
+        for group in header["row_groups"]:
+            group_end = group_start + group["rows"]
+            if group_end > offset and group_start < end:
+                rows.extend(
+                    self._decode_row_group(
+                        payload,
+                        body,
+                        keys,
+                        group,
+                        selected,
+                        max(offset, group_start) - group_start,
+                        min(end, group_end) - group_start,
+                    )
+                )
+            group_start = group_end
+
+        data = dict(header["extra"])
+        data["columns"] = header["columns"]
+        if columns is not None:
+            data["columns"] = [c for c in header["columns"] if c["name"] in columns]
+        data["rows"] = rows
+
+        return data
+
+    def iter_row_batches(self, payload, batch_size=ROW_GROUP_SIZE):
+        """Yields the rows one row group at a time, so only a single group is decoded at any point."""
+        header, body = self.read_header(payload)
+        payload = memoryview(payload)
+        selected = list(range(len(header["keys"])))
+
+        for group in header["row_groups"]:
+            rows = self._decode_row_group(payload, body, header["keys"], group, selected, 0, group["rows"])
+            yield from iter_batches(rows, batch_size)
+
+
+result_formats = {}
+
+
+def register_result_format(result_format_class):
+    result_formats[result_format_class.name] = result_format_class()
+
+
+def get_result_format(name):
+    if name not in result_formats:
+        raise ValueError("Unknown query results storage format: {}".format(name))
+
+    return result_formats[name]
+
+
+register_result_format(JSONResultFormat)
+register_result_format(ColumnarResultFormat)
+
+
+class ResultStore:
+    def put(self, key, payload):
+        raise NotImplementedError()
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+
+class FileSystemResultStore(ResultStore):
+    def __init__(self, path):
+        self.path = path
+
+    def _path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def put(self, key, payload):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first, so readers never see a partially written payload.
+        temp_path = "{}.tmp".format(path)
+        with open(temp_path, "wb") as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+
+    def get(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+def get_result_store():
+    if settings.dynamic_settings.QueryResultPersistence is not None:
+        return settings.dynamic_settings.QueryResultPersistence
+
+    if settings.QUERY_RESULTS_STORE_PATH:
+        return FileSystemResultStore(settings.QUERY_RESULTS_STORE_PATH)
+
+    return None
+
+
+def delete_stored_payloads(keys):
+    result_store = get_result_store()
+
+    for key in keys:
+        if result_store is None:
+            logger.warning("Can't delete query result payload %s: no result store is configured.", key)
+            continue
+
+        result_store.delete(key)
@@ -29,6 +29,10 @@ class EncryptedConfiguration(EncryptedType):
         )
 
 
+class SerializedJSON(str):
+    """A JSON document that is already encoded, which JSONText stores as is instead of encoding it again."""
+
+
 # Utilized for cases when JSON size is bigger than JSONB (255MB) or JSON (10MB) limit
 class JSONText(TypeDecorator):
     impl = db.Text
@@ -37,6 +41,9 @@ class JSONText(TypeDecorator):
         if value is None:
             return value
 
+        if isinstance(value, SerializedJSON):
+            return str(value)
+
         return json_dumps(value)
 
     def process_result_value(self, value, dialect):
@@ -1,5 +1,8 @@
+import datetime
 import logging
+import re
 from collections import defaultdict
+from collections.abc import Mapping, Sequence
 from contextlib import ExitStack
 from functools import wraps
 
@@ -22,6 +25,9 @@ __all__ = [
     "BaseHTTPQueryRunner",
     "InterruptException",
     "JobTimeoutException",
+    "QueryResultTooLarge",
+    "ResultWriter",
+    "TupleResult",
     "BaseSQLQueryRunner",
     "TYPE_DATETIME",
     "TYPE_BOOLEAN",
@@ -34,6 +40,7 @@ __all__ = [
     "get_query_runner",
     "import_query_runners",
     "guess_type",
+    "guess_column_types",
 ]
 
 # Valid types of columns returned in results:
@@ -113,6 +120,109 @@ class NotSupported(Exception):
     pass
 
 
+class QueryResultTooLarge(Exception):
+    pass
+
+
+class ResultRows(Sequence):
+    """The rows of a TupleResult. They're kept as tuples and returned as dicts (the legacy row format) on access."""
+
+    __slots__ = ("names", "tuples")
+
+    def __init__(self, names, tuples):
+        self.names = names
+        self.tuples = tuples
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [dict(zip(self.names, row)) for row in self.tuples[index]]
+
+        return dict(zip(self.names, self.tuples[index]))
+
+    def __iter__(self):
+        names = self.names
+        for row in self.tuples:
+            yield dict(zip(names, row))
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+
+        return list(self) == list(other)
+
+
+class TupleResult(Mapping):
+    """
+    A compact query result: the columns and a list of row tuples, with the values in the order of the columns.
+
+    It can be used wherever a legacy `{"columns": [...], "rows": [{...}, ...]}` result is expected, as
+    `result["rows"]` turns the tuples into dicts lazily. Consumers that modify the result should use `to_dict()`.
+    """
+
+    __slots__ = ("columns", "tuples", "extra")
+
+    def __init__(self, columns, tuples=None, **extra):
+        self.columns = columns
+        self.tuples = [] if tuples is None else tuples
+        self.extra = extra
+
+    @property
+    def column_names(self):
+        return [column["name"] for column in self.columns]
+
+    def __getitem__(self, key):
+        if key == "columns":
+            return self.columns
+        if key == "rows":
+            return ResultRows(self.column_names, self.tuples)
+
+        return self.extra[key]
+
+    def __iter__(self):
+        yield "columns"
+        yield "rows"
+        yield from self.extra
+
+    def __len__(self):
+        return 2 + len(self.extra)
+
+    def to_dict(self):
+        return {"columns": self.columns, "rows": list(self["rows"]), **self.extra}
+
+
+class ResultWriter:
+    """
+    Builds a TupleResult from batches of row tuples as the query runner fetches them, enforcing the
+    QUERY_RESULTS_MAX_ROWS and QUERY_RESULTS_MAX_BYTES limits after each batch, so a query returning too much data
+    is aborted before all of it is fetched.
+    """
+
+    def __init__(self, columns, max_rows=None, max_bytes=None):
+        self.result = TupleResult(columns)
+        self.max_rows = settings.QUERY_RESULTS_MAX_ROWS if max_rows is None else max_rows
+        self.max_bytes = settings.QUERY_RESULTS_MAX_BYTES if max_bytes is None else max_bytes
+        self.byte_size = 0
+
+    def write(self, rows):
+        rows = [tuple(row) for row in rows]
+        self.result.tuples.extend(rows)
+
+        if self.max_rows and len(self.result.tuples) > self.max_rows:
+            raise QueryResultTooLarge(
+                "Query result exceeds the maximum allowed number of rows ({}).".format(self.max_rows)
+            )
+
+        if self.max_bytes:
+            self.byte_size += len(utils.json_dumps(ResultRows(self.result.column_names, rows)).encode("utf-8"))
+            if self.byte_size > self.max_bytes:
+                raise QueryResultTooLarge(
+                    "Query result exceeds the maximum allowed size ({} bytes).".format(self.max_bytes)
+                )
+
+
 class BaseQueryRunner:
     deprecated = False
     should_annotate_query = True
@@ -228,6 +338,16 @@ class BaseQueryRunner:
 
         return new_columns
 
+    def fetch_result(self, columns, rows):
+        """
+        Returns a compact TupleResult with the given rows (tuples of values in the order of the columns), which can
+        be a DB-API cursor. The result limits are enforced while the rows are read.
+        """
+        writer = ResultWriter(columns)
+        writer.write(rows)
+
+        return writer.result
+
     def get_schema(self, get_stats=False):
         raise NotSupported()
 
@@ -406,6 +526,8 @@ class BaseHTTPQueryRunner(BaseQueryRunner):
 
 
 query_runners = {}
+# The `custom_json_encoder` of the registered query runners, used by redash.utils.json_dumps.
+custom_json_encoders = {}
 
 
 def register(query_runner_class):
@@ -417,6 +539,8 @@ def register(query_runner_class):
             query_runner_class.type(),
         )
         query_runners[query_runner_class.type()] = query_runner_class
+        if hasattr(query_runner_class, "custom_json_encoder"):
+            custom_json_encoders[query_runner_class.type()] = query_runner_class.custom_json_encoder
     else:
         logger.debug(
             "%s query runner enabled but not supported, not registering. Either disable or install missing "
@@ -476,6 +600,9 @@ def guess_type_from_string(string_value):
     if str(string_value).lower() in ("true", "false"):
         return TYPE_BOOLEAN
 
+    if _is_iso_datetime(string_value):
+        return TYPE_DATETIME
+
     try:
         parser.parse(string_value)
         return TYPE_DATETIME
@@ -485,6 +612,48 @@ def guess_type_from_string(string_value):
     return TYPE_STRING
 
 
+ISO_DATE_PREFIX = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _is_iso_datetime(value):
+    # Much cheaper than dateutil's parser, which handles the remaining formats.
+    if not isinstance(value, str) or not ISO_DATE_PREFIX.match(value):
+        return False
+
+    try:
+        datetime.datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+def guess_column_types(rows, column_count):
+    """
+    Returns the type of each column of `rows` (sequences of values): the type `guess_type` guesses for all of the
+    column's values, or string when they don't agree (and None when there are no rows).
+
+    A column stops being checked as soon as it's known to be a string column, so text columns only pay for
+    guessing the type of a value or two.
+    """
+    types = [None] * column_count
+    pending = list(range(column_count))
+
+    for row in rows:
+        if not pending:
+            break
+
+        for index in pending:
+            guess = guess_type(row[index])
+            if types[index] is None:
+                types[index] = guess
+            elif types[index] != guess:
+                types[index] = TYPE_STRING
+
+        pending = [index for index in pending if types[index] != TYPE_STRING]
+
+    return types
+
+
 def with_ssh_tunnel(query_runner, details):
     def tunnel(f):
         @wraps(f)
@@ -1,5 +1,7 @@
 import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 
 from redash.query_runner import (
     TYPE_BOOLEAN,
@@ -9,6 +11,9 @@ from redash.query_runner import (
     TYPE_INTEGER,
     TYPE_STRING,
     BaseQueryRunner,
+    QueryResultTooLarge,
+    ResultWriter,
+    TupleResult,
     register,
 )
 from redash.settings import parse_boolean
@@ -18,10 +23,14 @@ ANNOTATE_QUERY = parse_boolean(os.environ.get("ATHENA_ANNOTATE_QUERY", "true"))
 SHOW_EXTRA_SETTINGS = parse_boolean(os.environ.get("ATHENA_SHOW_EXTRA_SETTINGS", "true"))
 ASSUME_ROLE = parse_boolean(os.environ.get("ATHENA_ASSUME_ROLE", "false"))
 OPTIONAL_CREDENTIALS = parse_boolean(os.environ.get("ATHENA_OPTIONAL_CREDENTIALS", "true"))
+# Size of the parts of a query's results file downloaded in parallel from S3, and how many are downloaded at once.
+S3_DOWNLOAD_PART_SIZE = int(os.environ.get("ATHENA_S3_DOWNLOAD_PART_SIZE", 8 * 1024 * 1024))
+S3_DOWNLOAD_THREADS = int(os.environ.get("ATHENA_S3_DOWNLOAD_THREADS", "8"))
 
 try:
     import boto3
     import pyathena
+    from pyathena.converter import DefaultTypeConverter
 
     enabled = True
 except ImportError:
@@ -46,6 +55,39 @@ _TYPE_MAPPINGS = {
 }
 
 
+# A field of Athena's CSV results and the separator after it. Athena quotes all the values (doubling the quotes in
+# them) and leaves nulls empty, which is how they're told apart from empty strings.
+_CSV_FIELD = re.compile(r'(?:"([^"]*(?:""[^"]*)*)")?(,|\n|$)')
+
+
+def parse_csv_results(text):
+    """Parses the CSV results of a query into rows of strings and Nones, header included."""
+    rows = []
+    row = []
+    position = 0
+    for match in _CSV_FIELD.finditer(text):
+        if match.start() != position:
+            raise ValueError("Unexpected value at position {} of the query results.".format(position))
+        if position == len(text):
+            break
+
+        value, separator = match.groups()
+        row.append(None if value is None else value.replace('""', '"'))
+        if separator != ",":
+            rows.append(row)
+            row = []
+        position = match.end()
+
+    return rows
+
+
+def convert_columns(rows, types):
+    """Converts rows of strings to row tuples of the given Athena types, a column at a time."""
+    converter = DefaultTypeConverter()
+    columns = zip(*rows)
+    return list(zip(*[list(map(converter.get(type_), column)) for type_, column in zip(types, columns)]))
+
+
 class SimpleFormatter:
     def format(self, operation, parameters=None):
         return operation
@@ -90,9 +132,13 @@ class Athena(BaseQueryRunner):
                     "title": "Athena cost per Tb scanned (USD)",
                     "default": 5,
                 },
+                "read_results_from_s3": {
+                    "type": "boolean",
+                    "title": "Download query results from the S3 staging bucket (faster for large results)",
+                },
             },
             "required": ["region", "s3_staging_dir"],
-            "extra_options": ["glue", "catalog_ids", "cost_per_tb"],
+            "extra_options": ["glue", "catalog_ids", "cost_per_tb", "read_results_from_s3"],
             "order": [
                 "region",
                 "s3_staging_dir",
@@ -239,6 +285,34 @@ class Athena(BaseQueryRunner):
 
         return list(schema.values())
 
+    def _download_results(self, output_location, user):
+        """Downloads the results file of a query, in parts downloaded in parallel."""
+        s3 = boto3.client("s3", **self._get_iam_credentials(user=user))
+        bucket, key = output_location[len("s3://") :].split("/", 1)
+        size = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        if not size:
+            return b""
+
+        def get_part(start):
+            byte_range = "bytes={}-{}".format(start, min(start + S3_DOWNLOAD_PART_SIZE, size) - 1)
+            return s3.get_object(Bucket=bucket, Key=key, Range=byte_range)["Body"].read()
+
+        starts = range(0, size, S3_DOWNLOAD_PART_SIZE)
+        with ThreadPoolExecutor(max_workers=min(S3_DOWNLOAD_THREADS, len(starts))) as executor:
+            return b"".join(executor.map(get_part, starts))
+
+    def _fetch_rows_from_s3(self, cursor, columns, user):
+        """Reads the rows of a SELECT query from its CSV results file on S3, instead of paging through them with
+        GetQueryResults. Returns None for other statements, whose results aren't stored as CSV."""
+        output_location = cursor.output_location
+        if not output_location or not output_location.endswith(".csv"):
+            return None
+
+        rows = parse_csv_results(self._download_results(output_location, user).decode("utf-8"))
+        writer = ResultWriter(columns)
+        writer.write(convert_columns(rows[1:], [column[1] for column in cursor.description]))
+        return writer.result.tuples
+
     def run_query(self, query, user):
         cursor = pyathena.connect(
             s3_staging_dir=self.configuration["s3_staging_dir"],
@@ -254,7 +328,11 @@ class Athena(BaseQueryRunner):
             cursor.execute(query)
             column_tuples = [(i[0], _TYPE_MAPPINGS.get(i[1], None)) for i in cursor.description]
             columns = self.fetch_columns(column_tuples)
-            rows = [dict(zip(([c["name"] for c in columns]), r)) for i, r in enumerate(cursor.fetchall())]
+            rows = None
+            if self.configuration.get("read_results_from_s3"):
+                rows = self._fetch_rows_from_s3(cursor, columns, user)
+            if rows is None:
+                rows = cursor.fetchall()
             qbytes = None
             athena_query_id = None
             try:
@@ -267,17 +345,20 @@ class Athena(BaseQueryRunner):
                 logger.debug("Athena Upstream can't get query_id: %s", e)
 
             price = self.configuration.get("cost_per_tb", 5)
-            data = {
-                "columns": columns,
-                "rows": rows,
-                "metadata": {
+            data = TupleResult(
+                columns,
+                rows,
+                metadata={
                     "data_scanned": qbytes,
                     "athena_query_id": athena_query_id,
                     "query_cost": price * qbytes * 10e-12,
                 },
-            }
+            )
 
             error = None
+        except QueryResultTooLarge as e:
+            data = None
+            error = str(e)
         except Exception:
             if cursor.query_id:
                 cursor.cancel()
@@ -1,8 +1,12 @@
 import datetime
+import itertools
 import logging
 import socket
+import threading
 import time
 from base64 import b64decode
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from redash import settings
 from redash.query_runner import (
@@ -14,6 +18,8 @@ from redash.query_runner import (
     BaseQueryRunner,
     InterruptException,
     JobTimeoutException,
+    QueryResultTooLarge,
+    ResultWriter,
     register,
 )
 from redash.utils import json_loads
@@ -40,33 +46,37 @@ types_map = {
 }
 
 
+CELL_CONVERTERS = {
+    "INTEGER": int,
+    "FLOAT": float,
+    "BOOLEAN": lambda cell_value: cell_value.lower() == "true",
+    "TIMESTAMP": lambda cell_value: datetime.datetime.fromtimestamp(float(cell_value)),
+}
+
+
 def transform_cell(field_type, cell_value):
     if cell_value is None:
         return None
-    if field_type == "INTEGER":
-        return int(cell_value)
-    elif field_type == "FLOAT":
-        return float(cell_value)
-    elif field_type == "BOOLEAN":
-        return cell_value.lower() == "true"
-    elif field_type == "TIMESTAMP":
-        return datetime.datetime.fromtimestamp(float(cell_value))
-    return cell_value
-
-
-def transform_row(row, fields):
-    row_data = {}
-
-    for column_index, cell in enumerate(row["f"]):
-        field = fields[column_index]
-        if field.get("mode") == "REPEATED":
-            cell_value = [transform_cell(field["type"], item["v"]) for item in cell["v"]]
-        else:
-            cell_value = transform_cell(field["type"], cell["v"])
 
-        row_data[field["name"]] = cell_value
+    convert = CELL_CONVERTERS.get(field_type)
+    return cell_value if convert is None else convert(cell_value)
+
+
+def transform_column(field, cell_values):
+    if field.get("mode") == "REPEATED":
+        return [[transform_cell(field["type"], item["v"]) for item in cell_value] for cell_value in cell_values]
+
+    convert = CELL_CONVERTERS.get(field["type"])
+    if convert is None:
+        return list(cell_values)
+
+    return [None if cell_value is None else convert(cell_value) for cell_value in cell_values]
 
-    return row_data
+
+def transform_rows(rows, fields):
+    """Converts the rows of a result page into tuples, a column at a time."""
+    columns = zip(*([cell["v"] for cell in row["f"]] for row in rows))
+    return list(zip(*[transform_column(field, column) for field, column in zip(fields, columns)]))
 
 
 def _load_key(filename):
@@ -212,52 +222,102 @@ class BigQuery(BaseQueryRunner):
         job_data = self._get_job_data(query)
         insert_response = jobs.insert(projectId=project_id, body=job_data).execute()
         self.current_job_id = insert_response["jobReference"]["jobId"]
-        current_row = 0
         query_reply = _get_query_results(
             jobs,
             project_id=project_id,
             location=self._get_location(),
             job_id=self.current_job_id,
-            start_index=current_row,
+            start_index=0,
         )
 
         logger.debug("bigquery replied: %s", query_reply)
 
+        fields = query_reply["schema"]["fields"]
+        columns = [
+            {
+                "name": f["name"],
+                "friendly_name": f["name"],
+                "type": "string" if f.get("mode") == "REPEATED" else types_map.get(f["type"], "string"),
+            }
+            for f in fields
+        ]
+        writer = ResultWriter(columns)
+
+        # The result is checked against the rows limit before it's downloaded. The bytes limit is checked as it
+        # goes, as the size of the result in BigQuery's storage doesn't tell its size once serialized.
+        total_rows = int(query_reply.get("totalRows", 0))
+        if writer.max_rows and total_rows > writer.max_rows:
+            raise QueryResultTooLarge(
+                "Query result exceeds the maximum allowed number of rows ({}).".format(writer.max_rows)
+            )
+
+        rows = query_reply.get("rows", [])
+        writer.write(transform_rows(rows, fields))
+        for rows in self._get_remaining_pages(jobs, len(rows), total_rows, len(rows)):
+            writer.write(transform_rows(rows, fields))
+
+        writer.result.extra["metadata"] = {"data_scanned": _get_total_bytes_processed_for_resp(query_reply)}
+        return writer.result
+
+    def _get_rows(self, jobs, start_index, end_index):
+        """Returns the rows from start_index to end_index, which may take several requests as BigQuery caps the
+        size of its replies."""
         rows = []
-
-        while ("rows" in query_reply) and current_row < int(query_reply["totalRows"]):
-            for row in query_reply["rows"]:
-                rows.append(transform_row(row, query_reply["schema"]["fields"]))
-
-            current_row += len(query_reply["rows"])
-
+        while start_index < end_index:
             query_result_request = {
-                "projectId": project_id,
-                "jobId": query_reply["jobReference"]["jobId"],
-                "startIndex": current_row,
+                "projectId": self._get_project_id(),
+                "jobId": self.current_job_id,
+                "startIndex": start_index,
+                "maxResults": end_index - start_index,
             }
 
             if self._get_location():
                 query_result_request["location"] = self._get_location()
 
-            query_reply = jobs.getQueryResults(**query_result_request).execute()
+            page_rows = jobs.getQueryResults(**query_result_request).execute().get("rows", [])
+            if not page_rows:
+                break
 
-        columns = [
-            {
-                "name": f["name"],
-                "friendly_name": f["name"],
-                "type": "string" if f.get("mode") == "REPEATED" else types_map.get(f["type"], "string"),
-            }
-            for f in query_reply["schema"]["fields"]
-        ]
+            rows.extend(page_rows)
+            start_index += len(page_rows)
 
-        data = {
-            "columns": columns,
-            "rows": rows,
-            "metadata": {"data_scanned": _get_total_bytes_processed_for_resp(query_reply)},
-        }
+        return rows
 
-        return data
+    def _get_remaining_pages(self, jobs, start_index, total_rows, page_size):
+        """Yields the pages of rows from start_index on, in order. As their start index is known upfront, up to
+        BIGQUERY_PARALLEL_PAGE_REQUESTS pages are fetched at once, each over its own connection (the API client
+        isn't thread safe)."""
+        if start_index >= total_rows or not page_size:
+            return
+
+        page_ranges = [
+            (index, min(index + page_size, total_rows)) for index in range(start_index, total_rows, page_size)
+        ]
+        parallel = min(settings.BIGQUERY_PARALLEL_PAGE_REQUESTS, len(page_ranges))
+        if parallel < 2:
+            for start, end in page_ranges:
+                yield self._get_rows(jobs, start, end)
+            return
+
+        local = threading.local()
+
+        def get_rows(page_range):
+            if not hasattr(local, "jobs"):
+                local.jobs = self._get_bigquery_service().jobs()
+            return self._get_rows(local.jobs, *page_range)
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            # Only `parallel` pages are requested ahead, so that fetched pages don't pile up waiting to be converted.
+            pending = deque()
+            page_ranges = iter(page_ranges)
+            for page_range in itertools.islice(page_ranges, parallel):
+                pending.append(executor.submit(get_rows, page_range))
+
+            while pending:
+                rows = pending.popleft().result()
+                for page_range in itertools.islice(page_ranges, 1):
+                    pending.append(executor.submit(get_rows, page_range))
+                yield rows
 
     def _get_columns_schema(self, table_data):
         columns = []
@@ -345,6 +405,9 @@ class BigQuery(BaseQueryRunner):
             data = self._get_query_result(jobs, query)
             error = None
 
+        except QueryResultTooLarge as e:
+            data = None
+            error = str(e)
         except apiclient.errors.HttpError as e:
             data = None
             if e.resp.status in [400, 404]:
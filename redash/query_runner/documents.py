@@ -0,0 +1,107 @@
+"""
+Turns JSON like documents (MongoDB documents, JSON API responses) into result rows and columns.
+
+Nested objects are flattened into columns named after their path (`{"a": {"b": 1}}` becomes the column `a.b`), up
+to a configurable depth, and arrays are either kept as values or flattened by index (`a.0`, `a.1`, ...). The
+columns are collected while the documents are consumed, so a cursor can be flattened without holding its documents.
+"""
+import datetime
+
+from redash.query_runner import (
+    TYPE_BOOLEAN,
+    TYPE_DATETIME,
+    TYPE_FLOAT,
+    TYPE_INTEGER,
+    TYPE_STRING,
+)
+
+TYPES_MAP = {
+    str: TYPE_STRING,
+    bytes: TYPE_STRING,
+    int: TYPE_INTEGER,
+    float: TYPE_FLOAT,
+    bool: TYPE_BOOLEAN,
+    datetime.datetime: TYPE_DATETIME,
+}
+
+
+class ColumnRegistry:
+    """The columns of a result in the order they were first seen, indexed by name. A column's type is the one of
+    its first value."""
+
+    def __init__(self):
+        self._columns = {}
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __len__(self):
+        return len(self._columns)
+
+    def get(self, name):
+        return self._columns.get(name)
+
+    def add(self, name, value):
+        if name not in self._columns:
+            self._columns[name] = {
+                "name": name,
+                "friendly_name": name,
+                "type": TYPES_MAP.get(type(value), TYPE_STRING),
+            }
+
+    def to_list(self, names=None):
+        """Returns the columns, or only the given ones (when they exist) in the given order."""
+        if names is None:
+            return list(self._columns.values())
+
+        return [self._columns[name] for name in names if name in self._columns]
+
+
+class DocumentFlattener:
+    """
+    Flattens documents into rows, registering their columns.
+
+    :param max_depth: how many levels of nested objects are flattened. None flattens all of them, 0 none.
+    :param flatten_lists: whether lists are flattened by index (like objects), or kept as values.
+    :param fields: when set, only the columns whose name (or the name of one of their parent objects) is one of
+        these are kept.
+    """
+
+    def __init__(self, max_depth=None, flatten_lists=False, fields=None):
+        self.max_depth = max_depth
+        self.flatten_lists = flatten_lists
+        self.fields = set(fields) if fields else None
+        self.columns = ColumnRegistry()
+
+    def _is_nested(self, value):
+        return isinstance(value, dict) or (self.flatten_lists and isinstance(value, list))
+
+    def _flatten(self, row, prefix, value, depth, selected):
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        for key, item in items:
+            name = "{}.{}".format(prefix, key)
+            item_selected = selected or name in self.fields
+            if self._is_nested(item) and (self.max_depth is None or depth < self.max_depth):
+                self._flatten(row, name, item, depth + 1, item_selected)
+            elif item_selected:
+                row[name] = item
+
+    def flatten(self, document):
+        row = {}
+        for key, value in document.items():
+            # Documents have string keys, but JSON APIs may return other scalars.
+            selected = self.fields is None or key in self.fields
+            if self._is_nested(value) and self.max_depth != 0:
+                self._flatten(row, key, value, 1, selected)
+            elif selected:
+                row[key] = value
+
+        for name, value in row.items():
+            self.columns.add(name, value)
+
+        return row
+
+    def iter_rows(self, documents):
+        """Yields the documents' rows as it consumes them."""
+        for document in documents:
+            yield self.flatten(document)
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import urllib.error
 import urllib.parse
@@ -6,6 +7,7 @@ import urllib.request
 import requests
 from requests.auth import HTTPBasicAuth
 
+from redash import redis_connection, settings
 from redash.query_runner import (
     TYPE_BOOLEAN,
     TYPE_DATE,
@@ -16,7 +18,7 @@ from redash.query_runner import (
     JobTimeoutException,
     register,
 )
-from redash.utils import json_loads
+from redash.utils import json_dumps, json_loads
 
 try:
     import http.client as http_client
@@ -40,6 +42,9 @@ ELASTICSEARCH_TYPES_MAPPING = {
 
 ELASTICSEARCH_BUILTIN_FIELDS_MAPPING = {"_id": "Id", "_score": "Score"}
 
+# How long Elasticsearch keeps a scroll's search context between two pages.
+SCROLL_KEEP_ALIVE = "1m"
+
 PYTHON_TYPES_MAPPING = {
     str: TYPE_STRING,
     bytes: TYPE_STRING,
@@ -121,6 +126,21 @@ class BaseElasticSearch(BaseQueryRunner):
         return mappings, error
 
     def _get_query_mappings(self, url):
+        """Returns the types of the fields of the index, kept in Redis for ELASTICSEARCH_MAPPINGS_CACHE_TTL seconds
+        as they rarely change."""
+        cache_key = "elasticsearch:mappings:{}".format(hashlib.sha1(url.encode("utf-8")).hexdigest())
+        if settings.ELASTICSEARCH_MAPPINGS_CACHE_TTL:
+            cached_mappings = redis_connection.get(cache_key)
+            if cached_mappings:
+                return json_loads(cached_mappings), None
+
+        mappings, error = self._parse_query_mappings(url)
+        if not error and settings.ELASTICSEARCH_MAPPINGS_CACHE_TTL:
+            redis_connection.set(cache_key, json_dumps(mappings), ex=settings.ELASTICSEARCH_MAPPINGS_CACHE_TTL)
+
+        return mappings, error
+
+    def _parse_query_mappings(self, url):
         mappings_data, error = self._get_mappings(url)
         if error:
             return mappings_data, error
@@ -353,6 +373,45 @@ class Kibana(BaseElasticSearch):
 
         return raw_result["hits"]["total"]
 
+    def _execute_scroll_query(self, url, limit, mappings, result_fields, result_columns, result_rows):
+        """Pages through the results with the scroll API, which unlike `from` doesn't get slower as it goes deeper
+        in the results, nor is capped by the index's max_result_window."""
+        r = requests.get(url + "&scroll={0}".format(SCROLL_KEEP_ALIVE), auth=self.auth)
+        r.raise_for_status()
+        raw_result = r.json()
+        scroll_id = raw_result.get("_scroll_id")
+
+        try:
+            while True:
+                # Each page is parsed as it comes, rather than once all of them are fetched.
+                self._parse_results(mappings, result_fields, raw_result, result_columns, result_rows)
+                logger.debug("Result Size: {0}  Total: {1}".format(len(result_rows), raw_result["hits"]["total"]))
+                if not raw_result["hits"]["hits"] or len(result_rows) >= limit:
+                    break
+
+                r = requests.post(
+                    "{0}/_search/scroll".format(self.server_url),
+                    json={"scroll": SCROLL_KEEP_ALIVE, "scroll_id": scroll_id},
+                    auth=self.auth,
+                )
+                r.raise_for_status()
+                raw_result = r.json()
+                scroll_id = raw_result.get("_scroll_id", scroll_id)
+        finally:
+            if scroll_id:
+                self._clear_scroll(scroll_id)
+
+        del result_rows[limit:]
+
+    def _clear_scroll(self, scroll_id):
+        try:
+            requests.delete(
+                "{0}/_search/scroll".format(self.server_url), json={"scroll_id": [scroll_id]}, auth=self.auth
+            )
+        except requests.exceptions.RequestException as e:
+            # The scroll expires on its own after SCROLL_KEEP_ALIVE.
+            logger.warning("Failed clearing scroll: %s", e)
+
     def run_query(self, query, user):
         try:
             error = None
@@ -366,6 +425,10 @@ class Kibana(BaseElasticSearch):
             limit = int(query_params.get("limit", 500))
             result_fields = query_params.get("fields", None)
             sort = query_params.get("sort", None)
+            # Opt-in, as scrolls keep a search context open on the cluster.
+            pagination = query_params.get("pagination", None)
+            if pagination not in (None, "scroll"):
+                raise Exception("'pagination' should be 'scroll'.")
 
             if not self.server_url:
                 error = "Missing configuration key 'server'"
@@ -388,7 +451,16 @@ class Kibana(BaseElasticSearch):
 
             result_columns = []
             result_rows = []
-            if isinstance(query_data, str):
+            if isinstance(query_data, str) and pagination == "scroll":
+                self._execute_scroll_query(
+                    url + "&size={0}".format(min(size, limit)),
+                    limit,
+                    mappings,
+                    result_fields,
+                    result_columns,
+                    result_rows,
+                )
+            elif isinstance(query_data, str):
                 _from = 0
                 while True:
                     query_size = size if limit >= (_from + size) else (limit - _from)
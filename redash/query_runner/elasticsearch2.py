@@ -1,5 +1,9 @@
 import json
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from typing import Optional, Tuple
 
 from redash.query_runner import (
@@ -58,6 +62,10 @@ class ElasticSearch2(BaseHTTPQueryRunner):
 
     def run_query(self, query, user):
         query, url, result_fields = self._build_query(query)
+        pagination = query.pop("pagination", None)
+        if pagination is not None:
+            return self._run_paginated_query(url, query, result_fields, pagination), None
+
         response, error = self.get_response(url, http_method="post", json=query)
         query_results = response.json()
         data = self._parse_results(result_fields, query_results)
@@ -71,6 +79,135 @@ class ElasticSearch2(BaseHTTPQueryRunner):
         url = "/{}/_search".format(index_name)
         return query, url, result_fields
 
+    def _run_paginated_query(self, url, query, result_fields, pagination):
+        """
+        Fetches all the hits of a query (or its first `limit` ones) page by page, parsing each page as it comes.
+
+        `pagination` is an object with:
+        - type: "search_after" pages with search_after over a point in time (Elasticsearch 7.10+), "scroll" with the
+          scroll API. Unlike from/size, neither gets slower as it goes deeper, nor is capped by max_result_window.
+        - size: hits per page (default 1000).
+        - limit: most hits to fetch.
+        - slices: number of slices of a scroll fetched in parallel (default 1).
+        - keep_alive: how long Elasticsearch keeps the search context between two pages (default "1m").
+        """
+        if not isinstance(pagination, dict) or pagination.get("type") not in ("search_after", "scroll"):
+            raise Exception("'pagination' should be an object with a type of 'search_after' or 'scroll'.")
+        if "aggs" in query or "aggregations" in query:
+            raise Exception("Queries with aggregations can't be paginated.")
+
+        index_url = url.rsplit("/_search", 1)[0]
+        size = pagination.get("size", 1000)
+        limit = pagination.get("limit")
+        keep_alive = pagination.get("keep_alive", "1m")
+        slices = pagination.get("slices", 1)
+
+        if pagination["type"] == "search_after":
+            pages = self._iter_search_after_pages(index_url, query, size, keep_alive)
+        elif slices > 1:
+            pages = self._iter_sliced_scroll_pages(index_url, query, size, keep_alive, slices)
+        else:
+            pages = self._iter_scroll_pages(index_url, query, size, keep_alive)
+
+        result_columns = []
+        result_rows = []
+        with closing(pages):
+            for raw_result in pages:
+                self._parse_results(result_fields, raw_result, result_columns, result_rows)
+                if limit is not None and len(result_rows) >= limit:
+                    del result_rows[limit:]
+                    break
+
+        return {"columns": result_columns, "rows": result_rows}
+
+    def _post(self, url, **kwargs):
+        response, error = self.get_response(url, http_method="post", **kwargs)
+        if error is not None:
+            raise Exception(error)
+
+        return response.json()
+
+    def _iter_search_after_pages(self, index_url, query, size, keep_alive):
+        pit_id = self._post("{}/_pit?keep_alive={}".format(index_url, keep_alive))["id"]
+        query = dict(query, size=size)
+        # search_after needs a total order of the hits. _shard_doc is the cheapest tiebreaker.
+        query.setdefault("sort", ["_shard_doc"])
+
+        try:
+            while True:
+                query["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                raw_result = self._post("/_search", json=query)
+                pit_id = raw_result.get("pit_id", pit_id)
+                yield raw_result
+
+                hits = raw_result["hits"]["hits"]
+                if len(hits) < size:
+                    break
+                query["search_after"] = hits[-1]["sort"]
+        finally:
+            self.get_response("/_pit", http_method="delete", json={"id": pit_id})
+
+    def _iter_scroll_pages(self, index_url, query, size, keep_alive):
+        raw_result = self._post("{}/_search?scroll={}".format(index_url, keep_alive), json=dict(query, size=size))
+        scroll_id = raw_result.get("_scroll_id")
+
+        try:
+            while True:
+                yield raw_result
+                if len(raw_result["hits"]["hits"]) < size:
+                    break
+
+                raw_result = self._post("/_search/scroll", json={"scroll": keep_alive, "scroll_id": scroll_id})
+                scroll_id = raw_result.get("_scroll_id", scroll_id)
+        finally:
+            if scroll_id:
+                self.get_response("/_search/scroll", http_method="delete", json={"scroll_id": [scroll_id]})
+
+    def _iter_sliced_scroll_pages(self, index_url, query, size, keep_alive, slices):
+        """Scrolls through the slices of the query in parallel, yielding their pages as they arrive."""
+        pages = queue.Queue(maxsize=slices)
+        stopped = threading.Event()
+        done = object()
+
+        def put(item):
+            # Gives up once the pages aren't consumed anymore, rather than blocking on a full queue.
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def scroll_slice(slice_id):
+            try:
+                slice_query = dict(query, slice={"id": slice_id, "max": slices})
+                with closing(self._iter_scroll_pages(index_url, slice_query, size, keep_alive)) as slice_pages:
+                    for raw_result in slice_pages:
+                        if not put(raw_result):
+                            return
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        with ThreadPoolExecutor(max_workers=slices) as executor:
+            for slice_id in range(slices):
+                executor.submit(scroll_slice, slice_id)
+
+            try:
+                running = slices
+                while running:
+                    item = pages.get()
+                    if item is done:
+                        running -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                stopped.set()
+
     @classmethod
     def _parse_mappings(cls, mappings_data: dict):
         mappings = {}
@@ -110,9 +247,10 @@ class ElasticSearch2(BaseHTTPQueryRunner):
         return list(schema.values())
 
     @classmethod
-    def _parse_results(cls, result_fields, raw_result):  # noqa: C901
-        result_columns = []
-        result_rows = []
+    def _parse_results(cls, result_fields, raw_result, result_columns=None, result_rows=None):  # noqa: C901
+        """Parses the rows of the results, adding them (and their columns) to the given ones if any."""
+        result_columns = [] if result_columns is None else result_columns
+        result_rows = [] if result_rows is None else result_rows
         result_columns_index = {c["name"]: c for c in result_columns}
         result_fields_index = {}
 
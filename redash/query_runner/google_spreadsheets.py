@@ -13,7 +13,7 @@ from redash.query_runner import (
     TYPE_INTEGER,
     TYPE_STRING,
     BaseQueryRunner,
-    guess_type,
+    guess_column_types,
     register,
 )
 from redash.utils import json_loads
@@ -82,6 +82,7 @@ def _value_eval_list(row_values, col_types):
 
 
 HEADER_INDEX = 0
+TYPE_GUESS_SAMPLE_ROWS = 100
 
 
 class WorksheetNotFoundError(Exception):
@@ -121,9 +122,12 @@ def parse_worksheet(worksheet):
 
     columns, column_names = _get_columns_and_column_names(worksheet[HEADER_INDEX])
 
-    if len(worksheet) > 1:
-        for j, value in enumerate(worksheet[HEADER_INDEX + 1]):
-            columns[j]["type"] = guess_type(value)
+    # The column types are guessed from the non empty cells of the first rows.
+    sample = worksheet[HEADER_INDEX + 1 : HEADER_INDEX + 1 + TYPE_GUESS_SAMPLE_ROWS]
+    for index, column in enumerate(columns):
+        values = [(row[index],) for row in sample if index < len(row) and row[index] != ""]
+        (column_type,) = guess_column_types(values, 1)
+        column["type"] = column_type or TYPE_STRING
 
     column_types = [c["type"] for c in columns]
     rows = [dict(zip(column_names, _value_eval_list(row, column_types))) for row in worksheet[HEADER_INDEX + 1 :]]
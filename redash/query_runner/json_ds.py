@@ -1,19 +1,19 @@
-import datetime
+import itertools
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from urllib.parse import urljoin
 
 import yaml
-from funcy import compact, project
+from funcy import project
 
+from redash import settings
 from redash.query_runner import (
-    TYPE_BOOLEAN,
-    TYPE_DATETIME,
-    TYPE_FLOAT,
-    TYPE_INTEGER,
-    TYPE_STRING,
     BaseHTTPQueryRunner,
     register,
 )
+from redash.query_runner.documents import DocumentFlattener
 
 
 class QueryParseError(Exception):
@@ -34,33 +34,6 @@ def parse_query(query):
         raise QueryParseError(error)
 
 
-TYPES_MAP = {
-    str: TYPE_STRING,
-    bytes: TYPE_STRING,
-    int: TYPE_INTEGER,
-    float: TYPE_FLOAT,
-    bool: TYPE_BOOLEAN,
-    datetime.datetime: TYPE_DATETIME,
-}
-
-
-def _get_column_by_name(columns, column_name):
-    for c in columns:
-        if "name" in c and c["name"] == column_name:
-            return c
-
-    return None
-
-
-def _get_type(value):
-    return TYPES_MAP.get(type(value), TYPE_STRING)
-
-
-def add_column(columns, column_name, column_type):
-    if _get_column_by_name(columns, column_name) is None:
-        columns.append({"name": column_name, "friendly_name": column_name, "type": column_type})
-
-
 def _apply_path_search(response, path, default=None):
     if path is None:
         return response
@@ -90,44 +63,12 @@ def _normalize_json(data, path):
     return data
 
 
-def _sort_columns_with_fields(columns, fields):
-    if fields:
-        columns = compact([_get_column_by_name(columns, field) for field in fields])
-
-    return columns
-
-
-# TODO: merge the logic here with the one in MongoDB's queyr runner
-def parse_json(data, fields):
-    rows = []
-    columns = []
-
-    for row in data:
-        parsed_row = {}
-
-        for key in row:
-            if isinstance(row[key], dict):
-                for inner_key in row[key]:
-                    column_name = "{}.{}".format(key, inner_key)
-                    if fields and key not in fields and column_name not in fields:
-                        continue
-
-                    value = row[key][inner_key]
-                    add_column(columns, column_name, _get_type(value))
-                    parsed_row[column_name] = value
-            else:
-                if fields and key not in fields:
-                    continue
+def _get_limit(query, name):
+    limit = query.get(name)
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise QueryParseError("'{}' should be a positive integer.".format(name))
 
-                value = row[key]
-                add_column(columns, key, _get_type(value))
-                parsed_row[key] = row[key]
-
-        rows.append(parsed_row)
-
-    columns = _sort_columns_with_fields(columns, fields)
-
-    return {"rows": rows, "columns": columns}
+    return limit
 
 
 class JSON(BaseHTTPQueryRunner):
@@ -194,27 +135,73 @@ class JSON(BaseHTTPQueryRunner):
         if fields and not isinstance(fields, list):
             raise QueryParseError("'fields' needs to be a list.")
 
-        results, error = self._get_all_results(query["url"], method, path, pagination, **request_options)
-        return parse_json(results, fields), error
-
-    def _get_all_results(self, url, method, result_path, pagination, **request_options):
-        """Get all results from a paginated endpoint."""
+        max_pages = _get_limit(query, "max_pages")
+        max_rows = _get_limit(query, "max_rows")
+
+        flattener = DocumentFlattener(max_depth=1, fields=fields)
+        rows = []
+        error = None
+        # Each page is parsed while the next one is fetched.
+        with closing(self._get_pages(query["url"], method, path, pagination, max_pages, **request_options)) as pages:
+            for results, error in pages:
+                if max_rows is not None:
+                    results = results[: max_rows - len(rows)]
+                rows.extend(flattener.iter_rows(results))
+                if max_rows is not None and len(rows) >= max_rows:
+                    break
+
+        return {"rows": rows, "columns": flattener.columns.to_list(fields or None)}, error
+
+    def _get_pages(self, url, method, result_path, pagination, max_pages=None, **request_options):
+        """Yields the results of each page of a paginated endpoint with the error of its request, requesting the
+        next page before yielding the current one."""
         base_url = self.configuration.get("base_url")
         url = urljoin(base_url, url)
 
-        results = []
-        has_more = True
-        while has_more:
-            response, error = self._get_json_response(url, method, **request_options)
-            has_more = False
+        if isinstance(pagination, PagePagination):
+            yield from self._get_numbered_pages(url, method, result_path, pagination, max_pages, **request_options)
+            return
 
-            result = _normalize_json(response, result_path)
-            if result:
-                results.extend(result)
-                if pagination:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            fetched = executor.submit(self._get_json_response, url, method, **request_options)
+            page_count = 0
+            while fetched is not None:
+                response, error = fetched.result()
+                page_count += 1
+                fetched = None
+
+                result = _normalize_json(response, result_path)
+                if result and pagination and (max_pages is None or page_count < max_pages):
                     has_more, url, request_options = pagination.next(url, request_options, response)
+                    if has_more:
+                        fetched = executor.submit(self._get_json_response, url, method, **request_options)
+
+                yield result or [], error
+
+    def _get_numbered_pages(self, url, method, result_path, pagination, max_pages, **request_options):
+        """Fetches `pagination.parallel` pages at once, until the first empty page."""
+        page_numbers = itertools.count() if max_pages is None else iter(range(max_pages))
+
+        with ThreadPoolExecutor(max_workers=pagination.parallel) as executor:
 
-        return results, error
+            def fetch(page_number):
+                page_options = pagination.page_options(request_options, page_number)
+                return executor.submit(self._get_json_response, url, method, **page_options)
+
+            fetching = deque(fetch(page_number) for page_number in itertools.islice(page_numbers, pagination.parallel))
+            while fetching:
+                response, error = fetching.popleft().result()
+                result = _normalize_json(response, result_path)
+                if not result:
+                    for future in fetching:
+                        future.cancel()
+                    yield [], error
+                    return
+
+                for page_number in itertools.islice(page_numbers, 1):
+                    fetching.append(fetch(page_number))
+
+                yield result, error
 
     def _get_json_response(self, url, method, **request_options):
         response, error = self.get_response(url, http_method=method, **request_options)
@@ -240,6 +227,8 @@ class RequestPagination:
             return UrlPagination(pagination)
         elif pagination["type"] == "token":
             return TokenPagination(pagination)
+        elif pagination["type"] == "page":
+            return PagePagination(pagination)
 
         raise QueryParseError("Unknown 'pagination.type' {}".format(pagination["type"]))
 
@@ -281,4 +270,30 @@ class TokenPagination(RequestPagination):
         return True, url, request_options
 
 
+class PagePagination(RequestPagination):
+    """Requests the pages by number, with the `param` query parameter set to `start`, `start + step`, ... (use the
+    page size as `step` for offsets). As the pages don't depend on each other, `parallel` of them are fetched at once.
+    """
+
+    def __init__(self, pagination):
+        self.param = pagination.get("param", "page")
+        if not isinstance(self.param, str):
+            raise QueryParseError("'pagination.param' should be a string")
+
+        self.start = pagination.get("start", 1)
+        self.step = pagination.get("step", 1)
+        if not isinstance(self.start, int) or not isinstance(self.step, int) or self.step < 1:
+            raise QueryParseError("'pagination.start' and 'pagination.step' should be integers, and step positive")
+
+        parallel = pagination.get("parallel", 1)
+        if not isinstance(parallel, int) or parallel < 1:
+            raise QueryParseError("'pagination.parallel' should be a positive integer")
+        self.parallel = min(parallel, settings.JSON_DS_MAX_PARALLEL_PAGES)
+
+    def page_options(self, request_options, page_number):
+        params = dict(request_options.get("params", {}))
+        params[self.param] = self.start + page_number * self.step
+        return dict(request_options, params=params)
+
+
 register(JSON)
@@ -1,18 +1,14 @@
-import datetime
 import logging
 import re
 
 from dateutil.parser import parse
 
 from redash.query_runner import (
-    TYPE_BOOLEAN,
-    TYPE_DATETIME,
-    TYPE_FLOAT,
     TYPE_INTEGER,
-    TYPE_STRING,
     BaseQueryRunner,
     register,
 )
+from redash.query_runner.documents import DocumentFlattener
 from redash.utils import json_loads, parse_human_time
 
 logger = logging.getLogger(__name__)
@@ -32,16 +28,6 @@ except ImportError:
     enabled = False
 
 
-TYPES_MAP = {
-    str: TYPE_STRING,
-    bytes: TYPE_STRING,
-    int: TYPE_INTEGER,
-    float: TYPE_FLOAT,
-    bool: TYPE_BOOLEAN,
-    datetime.datetime: TYPE_DATETIME,
-}
-
-
 date_regex = re.compile(r'ISODate\("(.*)"\)', re.IGNORECASE)
 
 
@@ -82,53 +68,11 @@ def _get_column_by_name(columns, column_name):
     return None
 
 
-def _parse_dict(dic: dict, flatten: bool = False) -> dict:
-    res = {}
-
-    def _flatten(x, name=""):
-        if isinstance(x, dict):
-            for k, v in x.items():
-                _flatten(v, "{}.{}".format(name, k))
-        elif isinstance(x, list):
-            for idx, item in enumerate(x):
-                _flatten(item, "{}.{}".format(name, idx))
-        else:
-            res[name[1:]] = x
-
-    if flatten:
-        _flatten(dic)
-    else:
-        for key, value in dic.items():
-            if isinstance(value, dict):
-                for tmp_key, tmp_value in _parse_dict(value).items():
-                    new_key = "{}.{}".format(key, tmp_key)
-                    res[new_key] = tmp_value
-            else:
-                res[key] = value
-    return res
-
-
 def parse_results(results: list, flatten: bool = False) -> list:
-    rows = []
-    columns = []
-
-    for row in results:
-        parsed_row = {}
-
-        parsed_row = _parse_dict(row, flatten)
-        for column_name, value in parsed_row.items():
-            if _get_column_by_name(columns, column_name) is None:
-                columns.append(
-                    {
-                        "name": column_name,
-                        "friendly_name": column_name,
-                        "type": TYPES_MAP.get(type(value), TYPE_STRING),
-                    }
-                )
+    flattener = DocumentFlattener(flatten_lists=flatten)
+    rows = list(flattener.iter_rows(results))
 
-        rows.append(parsed_row)
-
-    return rows, columns
+    return rows, flattener.columns.to_list()
 
 
 def _sorted_fields(fields):
@@ -375,13 +319,8 @@ class MongoDB(BaseQueryRunner):
             rows, columns = parse_results(cursor, flatten=self.flatten)
 
         if f:
-            ordered_columns = []
-            for k in _sorted_fields(f):
-                column = _get_column_by_name(columns, k)
-                if column:
-                    ordered_columns.append(column)
-
-            columns = ordered_columns
+            columns_by_name = {column["name"]: column for column in columns}
+            columns = [columns_by_name[k] for k in _sorted_fields(f) if k in columns_by_name]
             logger.debug("columns: {}".format(columns))
 
         if query_data.get("sortColumns"):
@@ -6,8 +6,10 @@ from tempfile import NamedTemporaryFile
 from uuid import uuid4
 
 import psycopg2
+import sqlparse
 from psycopg2.extras import Range
 
+from redash import settings
 from redash.query_runner import (
     TYPE_BOOLEAN,
     TYPE_DATE,
@@ -18,7 +20,10 @@ from redash.query_runner import (
     BaseSQLQueryRunner,
     InterruptException,
     JobTimeoutException,
+    QueryResultTooLarge,
+    ResultWriter,
     register,
+    split_sql_statements,
 )
 
 logger = logging.getLogger(__name__)
@@ -71,6 +76,16 @@ def _wait(conn, timeout=None):
             raise psycopg2.OperationalError("select.error received")
 
 
+def _is_select(statement):
+    """Whether the statement is a SELECT (or a WITH ... SELECT) returning its rows, which a cursor can be declared for."""
+    parsed = sqlparse.parse(statement)
+    if not parsed or parsed[0].get_type() != "SELECT":
+        return False
+
+    # SELECT ... INTO creates a table instead.
+    return not any(token.match(sqlparse.tokens.Keyword, "INTO") for token in parsed[0].tokens)
+
+
 def full_table_name(schema, name):
     if "." in name:
         name = '"{}"'.format(name)
@@ -167,6 +182,11 @@ class PostgreSQL(BaseSQLQueryRunner):
                 "sslrootcertFile": {"type": "string", "title": "SSL Root Certificate"},
                 "sslcertFile": {"type": "string", "title": "SSL Client Certificate"},
                 "sslkeyFile": {"type": "string", "title": "SSL Client Key"},
+                "streaming": {
+                    "type": "boolean",
+                    "title": "Stream results using a server-side cursor",
+                    "default": False,
+                },
             },
             "order": ["host", "port", "user", "password"],
             "required": ["dbname"],
@@ -176,6 +196,7 @@ class PostgreSQL(BaseSQLQueryRunner):
                 "sslrootcertFile",
                 "sslcertFile",
                 "sslkeyFile",
+                "streaming",
             ],
         }
 
@@ -263,6 +284,57 @@ class PostgreSQL(BaseSQLQueryRunner):
 
         return connection
 
+    def _fetch_rows(self, connection, cursor, query):
+        cursor.execute(query)
+        _wait(connection)
+
+        if cursor.description is None:
+            return None
+
+        columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
+
+        return self.fetch_result(columns, cursor)
+
+    def _stream_rows(self, connection, cursor, query):
+        """
+        Runs the last statement of the query through a server-side cursor and fetches its rows in batches of
+        QUERY_RESULTS_FETCH_BATCH_SIZE, so the whole result set is never buffered by the client at once. Queries whose
+        last statement isn't a SELECT are run as is.
+        """
+        statements = split_sql_statements(query)
+        if not _is_select(statements[-1]):
+            return self._fetch_rows(connection, cursor, query)
+
+        cursor_name = "redash_{}".format(uuid4().hex)
+
+        # Server-side cursors only live within a transaction (asynchronous connections are in autocommit mode).
+        declare = "DECLARE {} NO SCROLL CURSOR FOR {}".format(cursor_name, statements[-1])
+        for statement in ["BEGIN"] + statements[:-1] + [declare]:
+            cursor.execute(statement)
+            _wait(connection)
+
+        fetch = "FETCH FORWARD {} FROM {}".format(settings.QUERY_RESULTS_FETCH_BATCH_SIZE, cursor_name)
+        writer = None
+        while True:
+            cursor.execute(fetch)
+            _wait(connection)
+
+            if writer is None:
+                if cursor.description is None:
+                    return None
+                columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
+                writer = ResultWriter(columns)
+
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            writer.write(rows)
+
+        cursor.execute("COMMIT")
+        _wait(connection)
+
+        return writer.result
+
     def run_query(self, query, user):
         connection = self._get_connection()
         _wait(connection, timeout=10)
@@ -270,18 +342,18 @@ class PostgreSQL(BaseSQLQueryRunner):
         cursor = connection.cursor()
 
         try:
-            cursor.execute(query)
-            _wait(connection)
-
-            if cursor.description is not None:
-                columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
-                rows = [dict(zip((column["name"] for column in columns), row)) for row in cursor]
+            if self.configuration.get("streaming", False):
+                data = self._stream_rows(connection, cursor, query)
+            else:
+                data = self._fetch_rows(connection, cursor, query)
 
-                data = {"columns": columns, "rows": rows}
+            if data is not None:
                 error = None
             else:
                 error = "Query completed but it returned no data."
-                data = None
+        except QueryResultTooLarge as e:
+            error = str(e)
+            data = None
         except (select.error, OSError):
             error = "Query interrupted. Please retry."
             data = None
@@ -346,6 +418,11 @@ class Redshift(PostgreSQL):
                     "title": "Query Group for Scheduled Queries",
                     "default": "default",
                 },
+                "streaming": {
+                    "type": "boolean",
+                    "title": "Stream results using a server-side cursor",
+                    "default": False,
+                },
             },
             "order": [
                 "host",
@@ -356,6 +433,7 @@ class Redshift(PostgreSQL):
                 "sslmode",
                 "adhoc_query_group",
                 "scheduled_query_group",
+                "streaming",
             ],
             "required": ["dbname", "user", "password", "host", "port"],
             "secret": ["password"],
@@ -462,6 +540,11 @@ class RedshiftIAM(Redshift):
                     "title": "Query Group for Scheduled Queries",
                     "default": "default",
                 },
+                "streaming": {
+                    "type": "boolean",
+                    "title": "Stream results using a server-side cursor",
+                    "default": False,
+                },
             },
             "order": [
                 "rolename",
@@ -476,6 +559,7 @@ class RedshiftIAM(Redshift):
                 "sslmode",
                 "adhoc_query_group",
                 "scheduled_query_group",
+                "streaming",
             ],
             "required": ["dbname", "user", "host", "port", "aws_region"],
             "secret": ["aws_secret_access_key"],
@@ -21,6 +21,7 @@ from redash.query_runner import (
     TYPE_INTEGER,
     TYPE_STRING,
     BaseQueryRunner,
+    TupleResult,
     register,
 )
 from redash.utils.pandas import pandas_installed
@@ -227,7 +228,7 @@ class Python(BaseQueryRunner):
             raise Exception(error)
 
         # TODO: allow avoiding the JSON dumps/loads in same process
-        query_result = data
+        query_result = data.to_dict() if isinstance(data, TupleResult) else data
 
         if result_type == "dataframe" and pandas_installed:
             return pd.DataFrame(query_result["rows"])
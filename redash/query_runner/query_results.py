@@ -1,18 +1,27 @@
+import ctypes
 import datetime
 import decimal
 import hashlib
 import logging
+import os
 import re
 import sqlite3
-from urllib.parse import parse_qs
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qs, quote
 
-from redash import models
+from flask import current_app
+
+from redash import models, settings
 from redash.permissions import has_access, view_only
 from redash.query_runner import (
-    TYPE_STRING,
     BaseQueryRunner,
+    InterruptException,
     JobTimeoutException,
-    guess_type,
+    TupleResult,
+    guess_column_types,
     register,
 )
 from redash.utils import json_dumps
@@ -42,6 +51,79 @@ def extract_cached_query_ids(query):
     return [int(q) for q in queries]
 
 
+QUERY_TABLE = r"(?:cached_)?query_\d+(?:_[0-9a-f]{32})?"
+COLUMN = r'(?:\w+|"[^"]+")'
+NOT_ALIASES = {
+    "as",
+    "cross",
+    "except",
+    "full",
+    "group",
+    "having",
+    "inner",
+    "intersect",
+    "join",
+    "left",
+    "limit",
+    "natural",
+    "on",
+    "order",
+    "outer",
+    "right",
+    "union",
+    "using",
+    "where",
+    "window",
+}
+
+
+def extract_index_columns(query, infer=True):
+    """
+    Returns the (table, column) pairs of the query tables that should be indexed: the ones declared in the query
+    with an `-- index: query_1.id, query_2.user_id` comment and, when `infer` is set, the columns the query compares
+    for equality between two tables (e.g. `JOIN query_2 q2 ON q2.user_id = query_1.id`).
+    """
+    columns = set()
+    for declaration in re.findall(r"--\s*index:(.*)$", query, re.IGNORECASE | re.MULTILINE):
+        for table, column in re.findall(r"({})\.({})".format(QUERY_TABLE, COLUMN), declaration, re.IGNORECASE):
+            columns.add((table.lower(), column.strip('"')))
+
+    if not infer:
+        return columns
+
+    tables = {}
+    for table, alias in re.findall(r"\b({})(?:\s+as)?\s+(\w+)".format(QUERY_TABLE), query, re.IGNORECASE):
+        if alias.lower() not in NOT_ALIASES:
+            tables[alias.lower()] = table.lower()
+
+    comparisons = re.findall(r"\b([a-z_]\w*)\.({0})\s*=\s*([a-z_]\w*)\.({0})".format(COLUMN), query, re.IGNORECASE)
+    for left_table, left_column, right_table, right_column in comparisons:
+        for table, column in ((left_table, left_column), (right_table, right_column)):
+            table = tables.get(table.lower(), table.lower())
+            if re.fullmatch(QUERY_TABLE, table):
+                columns.add((table, column.strip('"')))
+
+    return columns
+
+
+def create_indexes(connection, columns):
+    for table, column in sorted(columns):
+        # sqlite takes unknown quoted identifiers as string literals, so check that the column exists first.
+        table_columns = [row[1] for row in connection.execute("PRAGMA table_info({})".format(table))]
+        if fix_column_name(column)[1:-1] not in table_columns:
+            logger.debug("Skipping index on %s.%s: no such column.", table, column)
+            continue
+
+        index_name = fix_column_name("index_{}_{}".format(table, re.sub(r"\W", "_", column)))
+        try:
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(index_name, table, fix_column_name(column))
+            )
+        except sqlite3.OperationalError as exc:
+            # Tables attached from the table cache are read only.
+            logger.debug("Skipping index on %s.%s: %s", table, column, exc)
+
+
 def _load_query(user, query_id):
     query = models.Query.get_by_id(query_id)
 
@@ -82,23 +164,211 @@ def get_query_results(user, query_id, bring_from_cache, params=None):
     return results
 
 
-def create_tables_from_query_ids(user, connection, query_ids, query_params, cached_query_ids=[]):
+class TableCache:
+    """
+    Keeps the sqlite tables built from cached query results in files, so other queries using the same results
+    don't have to load them again. The files are shared by all the worker processes using the same directory.
+
+    Each table is kept in its own file, named after the query and query result ids, which is attached (read only)
+    to the connection of the queries that use it. The least recently used files are removed once the cache takes
+    more than `max_size` bytes.
+    """
+
+    # sqlite's default limit on the number of databases attached to a connection.
+    max_attached = 10
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+
+    def _path(self, query_id, query_result_id):
+        return os.path.join(self.path, "query_{}_{}.sqlite".format(query_id, query_result_id))
+
+    def get(self, query_id, query_result_id, load_results):
+        """Returns the path of the table's file, creating it with the results `load_results()` returns if needed."""
+        path = self._path(query_id, query_result_id)
+        try:
+            # The files' modification time is used to find the least recently used ones.
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(self.path, exist_ok=True)
+        # Build the table in a temporary file first, so other processes never see a partially written table.
+        temp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        connection = sqlite3.connect(temp_path)
+        try:
+            create_table(connection, "cached_query_{}".format(query_id), load_results())
+        except Exception:
+            os.remove(temp_path)
+            raise
+        finally:
+            connection.close()
+        os.replace(temp_path, path)
+
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".sqlite") and entry.path != keep:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(file_size for _, file_size, _ in files)
+        if keep is not None:
+            size += os.path.getsize(keep)
+
+        for _, file_size, file_path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+
+def get_table_cache():
+    if not settings.QUERY_RESULTS_TABLE_CACHE_PATH:
+        return None
+
+    return TableCache(settings.QUERY_RESULTS_TABLE_CACHE_PATH, settings.QUERY_RESULTS_TABLE_CACHE_SIZE)
+
+
+def create_cached_tables(user, connection, cached_query_ids):
+    table_cache = get_table_cache()
+    attached = 0
+
     for query_id in set(cached_query_ids):
-        results = get_query_results(user, query_id, True)
         table_name = "cached_query_{query_id}".format(query_id=query_id)
-        create_table(connection, table_name, results)
+        if table_cache is None or attached == table_cache.max_attached:
+            create_table(connection, table_name, get_query_results(user, query_id, True))
+            continue
+
+        query = _load_query(user, query_id)
+        if query.latest_query_data_id is None:
+            raise Exception("No cached result available for query {}.".format(query.id))
+
+        path = table_cache.get(query.id, query.latest_query_data_id, lambda: query.latest_query_data.data)
+        # Queries refer to the table by its name, which sqlite looks up in the attached databases as well.
+        connection.execute(
+            "ATTACH DATABASE ? AS {}".format(fix_column_name("cache_" + table_name)),
+            ("file:{}?mode=ro".format(quote(path)),),
+        )
+        attached += 1
+
+
+class RunningQueries:
+    """
+    The threads running upstream queries. They can be interrupted with InterruptException, raised in them the way the
+    worker raises it in a job's main thread, so their query runners cancel the queries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread_ids = set()
+
+    def run(self, query_runner, query_text, user):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._thread_ids.add(thread_id)
+        try:
+            return query_runner.run_query(query_text, user)
+        finally:
+            # Once removed, the thread isn't interrupted anymore. An interruption that came before is raised here.
+            with self._lock:
+                self._thread_ids.discard(thread_id)
+
+    def interrupt(self):
+        with self._lock:
+            for thread_id in self._thread_ids:
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                    ctypes.c_ulong(thread_id), ctypes.py_object(InterruptException)
+                )
 
+
+def _run_upstream_query(app, semaphore, running_queries, query_runner, query_text, user, query_id):
+    with app.app_context(), semaphore:
+        results, error = running_queries.run(query_runner, query_text, user)
+
+    if error:
+        raise Exception("Failed loading results for query id {}.".format(query_id))
+
+    return results
+
+
+def fetch_query_results(user, queries):
+    """
+    Runs the given queries ({table name: (query id, params)}) concurrently and yields (table name, results) pairs as
+    they complete. At most QUERY_RESULTS_MAX_PARALLEL_QUERIES run at once, and at most
+    QUERY_RESULTS_MAX_PARALLEL_QUERIES_PER_DATA_SOURCE of them on the same data source. When the results aren't all
+    consumed (e.g. a query failed or the job timed out), the queries still running are interrupted and waited for.
+    """
+    if len(queries) < 2:
+        for table_name, (query_id, params) in queries.items():
+            yield table_name, get_query_results(user, query_id, False, params)
+        return
+
+    app = current_app._get_current_object()
+    semaphores = defaultdict(
+        lambda: threading.BoundedSemaphore(settings.QUERY_RESULTS_MAX_PARALLEL_QUERIES_PER_DATA_SOURCE)
+    )
+    executor = ThreadPoolExecutor(max_workers=min(settings.QUERY_RESULTS_MAX_PARALLEL_QUERIES, len(queries)))
+    running_queries = RunningQueries()
+    futures = {}
+    try:
+        for table_name, (query_id, params) in queries.items():
+            # The queries and their data sources are loaded here, as the database session belongs to this thread.
+            query = _load_query(user, query_id)
+            query_text = query.query_text
+            if params is not None:
+                query_text = replace_query_parameters(query_text, params)
+
+            future = executor.submit(
+                _run_upstream_query,
+                app,
+                semaphores[query.data_source_id],
+                running_queries,
+                query.data_source.query_runner,
+                query_text,
+                user,
+                query.id,
+            )
+            futures[future] = table_name
+
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        running_queries.interrupt()
+        # The interrupted query runners cancel their queries, and release the data sources' semaphores.
+        executor.shutdown(wait=True)
+
+
+def create_tables_from_query_ids(user, connection, query_ids, query_params, cached_query_ids=[]):
+    create_cached_tables(user, connection, cached_query_ids)
+
+    queries = {}
     for query in set(query_params):
-        results = get_query_results(user, query[0], False, query[1])
         table_hash = hashlib.md5(
             "query_{query}_{hash}".format(query=query[0], hash=query[1]).encode(), usedforsecurity=False
         ).hexdigest()
         table_name = "query_{query_id}_{param_hash}".format(query_id=query[0], param_hash=table_hash)
-        create_table(connection, table_name, results)
+        queries[table_name] = (query[0], query[1])
 
     for query_id in set(query_ids):
-        results = get_query_results(user, query_id, False)
         table_name = "query_{query_id}".format(query_id=query_id)
+        queries[table_name] = (query_id, None)
+
+    # Each table is loaded as soon as its query completes, while the other queries are still running.
+    for table_name, results in fetch_query_results(user, queries):
         create_table(connection, table_name, results)
 
 
@@ -108,7 +378,8 @@ def fix_column_name(name):
 
 def flatten(value):
     if isinstance(value, (list, dict)):
-        return json_dumps(value)
+        # Keeps the spacing of json.dumps, as queries may compare these values as text.
+        return json_dumps(value, separators=(", ", ": "))
     elif isinstance(value, decimal.Decimal):
         return float(value)
     elif isinstance(value, datetime.timedelta):
@@ -137,9 +408,14 @@ def create_table(connection, table_name, query_results):
         place_holders=",".join(["?"] * len(columns)),
     )
 
-    for row in query_results["rows"]:
-        values = [flatten(row.get(column)) for column in columns]
-        connection.execute(insert_template, values)
+    if isinstance(query_results, TupleResult):
+        rows = query_results.tuples
+    else:
+        rows = ([row.get(column) for column in columns] for row in query_results["rows"])
+
+    # A single executemany in one transaction, instead of a statement (and implicit transaction) per row.
+    with connection:
+        connection.executemany(insert_template, ([flatten(value) for value in row] for row in rows))
 
 
 def prepare_parameterized_query(query, query_params):
@@ -159,14 +435,30 @@ class Results(BaseQueryRunner):
 
     @classmethod
     def configuration_schema(cls):
-        return {"type": "object", "properties": {}}
+        return {
+            "type": "object",
+            "properties": {
+                "index_join_columns": {
+                    "type": "boolean",
+                    "title": "Index the columns used to join query results",
+                    "default": False,
+                },
+                "use_temp_file": {
+                    "type": "boolean",
+                    "title": "Load query results into a temporary file instead of memory",
+                    "default": False,
+                },
+            },
+        }
 
     @classmethod
     def name(cls):
         return "Query Results"
 
     def run_query(self, query, user):
-        connection = sqlite3.connect(":memory:")
+        # An empty file name makes sqlite use a temporary file, which is deleted when the connection is closed. URI
+        # file names are enabled to attach the table cache's files as read only.
+        connection = sqlite3.connect("" if self.configuration.get("use_temp_file") else ":memory:", uri=True)
 
         query_ids = extract_query_ids(query)
 
@@ -180,27 +472,17 @@ class Results(BaseQueryRunner):
         if query_params is not None:
             query = prepare_parameterized_query(query, query_params)
 
+        create_indexes(connection, extract_index_columns(query, self.configuration.get("index_join_columns", False)))
+
         try:
             cursor.execute(query)
 
             if cursor.description is not None:
                 columns = self.fetch_columns([(i[0], None) for i in cursor.description])
+                data = self.fetch_result(columns, cursor)
 
-                rows = []
-                column_names = [c["name"] for c in columns]
-
-                for i, row in enumerate(cursor):
-                    for j, col in enumerate(row):
-                        guess = guess_type(col)
-
-                        if columns[j]["type"] is None:
-                            columns[j]["type"] = guess
-                        elif columns[j]["type"] != guess:
-                            columns[j]["type"] = TYPE_STRING
-
-                    rows.append(dict(zip(column_names, row)))
-
-                data = {"columns": columns, "rows": rows}
+                for column, column_type in zip(columns, guess_column_types(data.tuples, len(columns))):
+                    column["type"] = column_type
                 error = None
             else:
                 error = "Query completed but it returned no data."
@@ -16,6 +16,8 @@ from redash.serializers.query_result import (
     serialize_query_result,
     serialize_query_result_to_dsv,
     serialize_query_result_to_xlsx,
+    stream_query_result_to_dsv,
+    stream_query_result_to_xlsx,
 )
 
 
@@ -130,9 +132,13 @@ def serialize_query(
         if query.latest_query_data is not None:
             d["retrieved_at"] = query.retrieved_at
             d["runtime"] = query.runtime
+            d["row_count"] = query.latest_query_data.row_count
+            d["byte_size"] = query.latest_query_data.byte_size
         else:
             d["retrieved_at"] = None
             d["runtime"] = None
+            d["row_count"] = None
+            d["byte_size"] = None
 
     if with_visualizations:
         d["visualizations"] = [serialize_visualization(vis, with_query=False) for vis in query.visualizations]
@@ -1,5 +1,6 @@
 import csv
 import io
+import tempfile
 
 import xlsxwriter
 from dateutil.parser import isoparse as parse_date
@@ -80,45 +81,71 @@ def serialize_query_result(query_result, is_api_user):
         return query_result.to_dict()
 
 
+def _get_columns(query_result):
+    if query_result.column_schema is not None:
+        return query_result.column_schema
+
+    return query_result.get_data(limit=0)["columns"]
+
+
 def serialize_query_result_to_dsv(query_result, delimiter):
-    s = io.StringIO()
+    return "".join(stream_query_result_to_dsv(query_result, delimiter))
+
 
-    query_data = query_result.data
+def stream_query_result_to_dsv(query_result, delimiter):
+    """Yields the result as delimiter separated values, one chunk per batch of rows."""
+    s = io.StringIO()
 
-    fieldnames, special_columns = _get_column_lists(query_data["columns"] or [])
+    fieldnames, special_columns = _get_column_lists(_get_columns(query_result) or [])
 
     writer = csv.DictWriter(s, extrasaction="ignore", fieldnames=fieldnames, delimiter=delimiter)
     writer.writeheader()
 
-    for row in query_data["rows"]:
-        for col_name, converter in special_columns.items():
-            if col_name in row:
-                row[col_name] = converter(row[col_name])
+    for rows in query_result.iter_row_batches():
+        for row in rows:
+            for col_name, converter in special_columns.items():
+                if col_name in row:
+                    row[col_name] = converter(row[col_name])
+
+            writer.writerow(row)
 
-        writer.writerow(row)
+        yield s.getvalue()
+        s.seek(0)
+        s.truncate()
 
-    return s.getvalue()
+    if s.tell():
+        yield s.getvalue()
 
 
 def serialize_query_result_to_xlsx(query_result):
-    output = io.BytesIO()
+    return b"".join(stream_query_result_to_xlsx(query_result))
+
+
+XLSX_CHUNK_SIZE = 64 * 1024
+
 
-    query_data = query_result.data
-    book = xlsxwriter.Workbook(output, {"constant_memory": True})
-    sheet = book.add_worksheet("result")
+def stream_query_result_to_xlsx(query_result):
+    """Builds the workbook in a temporary file and yields its content in chunks."""
+    with tempfile.TemporaryFile() as output:
+        book = xlsxwriter.Workbook(output, {"constant_memory": True})
+        sheet = book.add_worksheet("result")
 
-    column_names = []
-    for c, col in enumerate(query_data["columns"]):
-        sheet.write(0, c, col["name"])
-        column_names.append(col["name"])
+        column_names = []
+        for c, col in enumerate(_get_columns(query_result)):
+            sheet.write(0, c, col["name"])
+            column_names.append(col["name"])
 
-    for r, row in enumerate(query_data["rows"]):
-        for c, name in enumerate(column_names):
-            v = row.get(name)
-            if isinstance(v, (dict, list)):
-                v = str(v)
-            sheet.write(r + 1, c, v)
+        r = 0
+        for rows in query_result.iter_row_batches():
+            for row in rows:
+                r += 1
+                for c, name in enumerate(column_names):
+                    v = row.get(name)
+                    if isinstance(v, (dict, list)):
+                        v = str(v)
+                    sheet.write(r, c, v)
 
-    book.close()
+        book.close()
 
-    return output.getvalue()
+        output.seek(0)
+        yield from iter(lambda: output.read(XLSX_CHUNK_SIZE), b"")
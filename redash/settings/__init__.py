@@ -49,6 +49,45 @@ QUERY_RESULTS_EXPIRED_TTL_ENABLED = parse_boolean(os.environ.get("REDASH_QUERY_R
 # default set query results expired ttl 86400 seconds
 QUERY_RESULTS_EXPIRED_TTL = int(os.environ.get("REDASH_QUERY_RESULTS_EXPIRED_TTL", "86400"))
 
+# Format used to store new query results: "json" (a single JSON document, the default) or "columnar" (compressed
+# column chunks, see redash.models.result_storage).
+QUERY_RESULTS_STORAGE_FORMAT = os.environ.get("REDASH_QUERY_RESULTS_STORAGE_FORMAT", "json")
+# When set, query results larger than QUERY_RESULTS_STORE_THRESHOLD bytes are stored as files in this directory
+# instead of in the database. The directory must be shared by the server and the workers.
+QUERY_RESULTS_STORE_PATH = os.environ.get("REDASH_QUERY_RESULTS_STORE_PATH", "")
+QUERY_RESULTS_STORE_THRESHOLD = int(os.environ.get("REDASH_QUERY_RESULTS_STORE_THRESHOLD", 1024 * 1024))
+# Queries returning more rows or (JSON encoded) bytes than these limits are aborted. 0 means no limit.
+QUERY_RESULTS_MAX_ROWS = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_ROWS", "0"))
+QUERY_RESULTS_MAX_BYTES = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_BYTES", "0"))
+# Number of first rows of each query result also stored separately, to read them without loading the whole result.
+QUERY_RESULTS_PREVIEW_ROWS = int(os.environ.get("REDASH_QUERY_RESULTS_PREVIEW_ROWS", "10"))
+# Number of rows fetched at a time by query runners that stream their results (e.g. PostgreSQL's server-side cursors).
+QUERY_RESULTS_FETCH_BATCH_SIZE = int(os.environ.get("REDASH_QUERY_RESULTS_FETCH_BATCH_SIZE", "10000"))
+# When set, the Query Results data source keeps the sqlite tables it builds from cached query results (cached_query_N)
+# as files in this directory, and reuses them until the query has a new result. The least recently used files are
+# removed once they take more than QUERY_RESULTS_TABLE_CACHE_SIZE bytes.
+QUERY_RESULTS_TABLE_CACHE_PATH = os.environ.get("REDASH_QUERY_RESULTS_TABLE_CACHE_PATH", "")
+QUERY_RESULTS_TABLE_CACHE_SIZE = int(os.environ.get("REDASH_QUERY_RESULTS_TABLE_CACHE_SIZE", 512 * 1024 * 1024))
+# Number of queries the Query Results data source runs at once to load the query_N tables of a query, overall and on
+# any single data source.
+QUERY_RESULTS_MAX_PARALLEL_QUERIES = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_PARALLEL_QUERIES", "4"))
+QUERY_RESULTS_MAX_PARALLEL_QUERIES_PER_DATA_SOURCE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_MAX_PARALLEL_QUERIES_PER_DATA_SOURCE", "2")
+)
+# Most pages the JSON data source requests at once for a query using `page` pagination. Above 10, the requests no
+# longer all reuse kept-alive connections from the session's pool.
+JSON_DS_MAX_PARALLEL_PAGES = int(os.environ.get("REDASH_JSON_DS_MAX_PARALLEL_PAGES", "10"))
+# Seconds the (legacy) Elasticsearch data sources keep the field mappings of the indexes they query. 0 disables it.
+ELASTICSEARCH_MAPPINGS_CACHE_TTL = int(os.environ.get("REDASH_ELASTICSEARCH_MAPPINGS_CACHE_TTL", "300"))
+
+# When enabled, scheduled queries are refreshed by the `rq query-scheduler` process instead of the periodic
+# refresh_queries job, and query schedule changes are published for it.
+DEDICATED_QUERY_SCHEDULER = parse_boolean(os.environ.get("REDASH_DEDICATED_QUERY_SCHEDULER", "false"))
+# Seconds between full reloads of the scheduled queries by the query scheduler, and before it checks again a due
+# query that wasn't rescheduled (e.g. because it was still running).
+QUERY_SCHEDULER_RELOAD_INTERVAL = int(os.environ.get("REDASH_QUERY_SCHEDULER_RELOAD_INTERVAL", "600"))
+QUERY_SCHEDULER_RETRY_INTERVAL = int(os.environ.get("REDASH_QUERY_SCHEDULER_RETRY_INTERVAL", "30"))
+
 SCHEMAS_REFRESH_SCHEDULE = int(os.environ.get("REDASH_SCHEMAS_REFRESH_SCHEDULE", 30))
 
 AUTH_TYPE = os.environ.get("REDASH_AUTH_TYPE", "api_key")
@@ -208,6 +247,9 @@ ADHOC_QUERY_TIME_LIMIT = int(os.environ.get("REDASH_ADHOC_QUERY_TIME_LIMIT", -1)
 
 JOB_EXPIRY_TIME = int(os.environ.get("REDASH_JOB_EXPIRY_TIME", 3600 * 12))
 JOB_DEFAULT_FAILURE_TTL = int(os.environ.get("REDASH_JOB_DEFAULT_FAILURE_TTL", 7 * 24 * 60 * 60))
+# Longest time (in seconds) a `GET /api/jobs/<id>?wait=<seconds>` request waits for the job to complete. Each waiting
+# request holds a web server worker, so only enable this with threaded or async (e.g. gevent) workers. 0 disables it.
+JOB_WAIT_TIMEOUT = int(os.environ.get("REDASH_JOB_WAIT_TIMEOUT", "0"))
 
 LOG_LEVEL = os.environ.get("REDASH_LOG_LEVEL", "INFO")
 LOG_STDOUT = parse_boolean(os.environ.get("REDASH_LOG_STDOUT", "false"))
@@ -422,6 +464,8 @@ FEATURE_EXTENDED_ALERT_OPTIONS = parse_boolean(os.environ.get("REDASH_FEATURE_EX
 
 # BigQuery
 BIGQUERY_HTTP_TIMEOUT = int(os.environ.get("REDASH_BIGQUERY_HTTP_TIMEOUT", "600"))
+# Number of pages of a query's results BigQuery data sources fetch at once. 1 fetches them one after the other.
+BIGQUERY_PARALLEL_PAGE_REQUESTS = int(os.environ.get("REDASH_BIGQUERY_PARALLEL_PAGE_REQUESTS", "4"))
 
 # Allow Parameters in Embeds
 # WARNING: Deprecated!
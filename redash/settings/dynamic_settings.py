@@ -25,8 +25,9 @@ def periodic_jobs():
     pass
 
 
-# This provides the ability to override the way we store QueryResult's data column.
-# Reference implementation: redash.models.DBPersistence
+# This provides the ability to override where large QueryResult payloads are stored, by setting it to an instance of a
+# `redash.models.result_storage.ResultStore` subclass (for example, one backed by an object store).
+# Reference implementation: redash.models.result_storage.FileSystemResultStore
 QueryResultPersistence = None
 
 
@@ -9,6 +9,7 @@ from redash.tasks.general import (
     sync_user_details,
 )
 from redash.tasks.queries import (
+    QueryScheduler,
     cleanup_query_results,
     empty_schedules,
     enqueue_query,
@@ -6,3 +6,4 @@ from .maintenance import (
     refresh_schemas,
     remove_ghost_locks,
 )
+from .scheduler import QueryScheduler
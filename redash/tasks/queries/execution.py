@@ -1,7 +1,7 @@
 import signal
-import sys
 import time
-from collections import deque
+import uuid
+from collections import defaultdict
 
 import redis
 from rq import get_current_job
@@ -9,7 +9,13 @@ from rq.exceptions import NoSuchJobError
 from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
 
-from redash import models, redis_connection, settings
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
 from redash.query_runner import InterruptException
 from redash.tasks.alerts import check_alerts_for_query
 from redash.tasks.failure_report import track_failure
@@ -21,6 +27,17 @@ logger = get_job_logger(__name__)
 TIMEOUT_MESSAGE = "Query exceeded Redash query execution time limit."
 
 
+_queues = {}
+
+
+def _get_queue(name):
+    """Returns the queue with the given name. Queues are kept, as RQ looks up the Redis server version (with an INFO
+    command) once per queue instance."""
+    if name not in _queues:
+        _queues[name] = Queue(name, connection=rq_redis_connection)
+    return _queues[name]
+
+
 def _job_lock_id(query_hash, data_source_id):
     return "query_hash_job:%s:%s" % (data_source_id, query_hash)
 
@@ -29,9 +46,196 @@ def _unlock(query_hash, data_source_id):
     redis_connection.delete(_job_lock_id(query_hash, data_source_id))
 
 
+def _job_options(data_source, user_id, is_api_key, scheduled_query, metadata):
+    if scheduled_query:
+        queue_name = data_source.scheduled_queue_name
+        scheduled_query_id = scheduled_query.id
+    else:
+        queue_name = data_source.queue_name
+        scheduled_query_id = None
+
+    time_limit = settings.dynamic_settings.query_time_limit(scheduled_query, user_id, data_source.org_id)
+    metadata["Queue"] = queue_name
+
+    enqueue_kwargs = {
+        "user_id": user_id,
+        "scheduled_query_id": scheduled_query_id,
+        "is_api_key": is_api_key,
+        "job_timeout": time_limit,
+        "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
+        "meta": {
+            "data_source_id": data_source.id,
+            "org_id": data_source.org_id,
+            "scheduled": scheduled_query_id is not None,
+            "query_id": metadata.get("query_id"),
+            "user_id": user_id,
+        },
+    }
+
+    if not scheduled_query:
+        enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
+
+    return queue_name, enqueue_kwargs
+
+
+def _job_data(query, data_source, user_id, is_api_key=False, scheduled_query=None, metadata={}, job_id=None):
+    """Returns the queue and the `Queue.enqueue_many` job data of the job that runs a query."""
+    queue_name, enqueue_kwargs = _job_options(data_source, user_id, is_api_key, scheduled_query, metadata)
+    job_data = Queue.prepare_data(
+        execute_query,
+        args=(query, data_source.id, metadata),
+        kwargs={key: enqueue_kwargs[key] for key in ("user_id", "scheduled_query_id", "is_api_key")},
+        timeout=enqueue_kwargs["job_timeout"],
+        result_ttl=enqueue_kwargs.get("result_ttl"),
+        failure_ttl=enqueue_kwargs["failure_ttl"],
+        meta=enqueue_kwargs["meta"],
+        job_id=job_id,
+    )
+
+    return queue_name, job_data
+
+
+# Deletes a job lock (KEYS[1]) only if it still points to the given job (ARGV[1]), as another job may have taken it
+# since.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def enqueue_queries(queries):
+    """
+    Enqueues several queries at once. `queries` is a list of dicts with `enqueue_query`'s arguments.
+
+    The job locks of all the queries are taken with a single pipeline (`SET NX`, with the id the job will have), and
+    all the jobs are then enqueued with another one. Queries whose lock is already taken go through `enqueue_query`,
+    which checks whether the existing job is still relevant. When enqueuing fails, the locks taken here are released.
+
+    Returns the jobs, in the order of the queries.
+    """
+    jobs = [None] * len(queries)
+    job_ids = [str(uuid.uuid4()) for _ in queries]
+    lock_ids = [_job_lock_id(gen_query_hash(query["query"]), query["data_source"].id) for query in queries]
+
+    pipe = redis_connection.pipeline()
+    for lock_id, job_id in zip(lock_ids, job_ids):
+        pipe.set(lock_id, job_id, ex=settings.JOB_EXPIRY_TIME, nx=True)
+    locked = pipe.execute()
+
+    try:
+        job_datas = defaultdict(list)
+        for index, (query, job_id, lock_taken) in enumerate(zip(queries, job_ids, locked)):
+            if not lock_taken:
+                jobs[index] = enqueue_query(**query)
+                continue
+
+            queue_name, job_data = _job_data(job_id=job_id, **query)
+            job_datas[queue_name].append((index, job_data))
+
+        if job_datas:
+            rq_pipe = rq_redis_connection.pipeline()
+            for queue_name, indexed_job_datas in job_datas.items():
+                queue = _get_queue(queue_name)
+                enqueued = queue.enqueue_many([job_data for _, job_data in indexed_job_datas], pipeline=rq_pipe)
+                for (index, _), job in zip(indexed_job_datas, enqueued):
+                    jobs[index] = job
+            rq_pipe.execute()
+    except Exception:
+        pipe = redis_connection.pipeline()
+        for lock_id, job_id, lock_taken in zip(lock_ids, job_ids, locked):
+            if lock_taken:
+                pipe.eval(RELEASE_LOCK_SCRIPT, 1, lock_id, job_id)
+        pipe.execute()
+        raise
+
+    for queue_name, indexed_job_datas in job_datas.items():
+        # enqueue_many bypasses Queue.enqueue_job, which records this metric.
+        statsd_client.incr("rq.jobs.created.{}".format(queue_name), len(indexed_job_datas))
+
+    logger.info("Enqueued %d queries in bulk.", len(queries))
+
+    return jobs
+
+
+# Runs in the MULTI/EXEC block that enqueues a new job (ARGV[1], stored at KEYS[3] and pushed to the queue at KEYS[2]),
+# right after it. If the query's lock (KEYS[1]) points to another job that is still queued or running, the new job is
+# taken back and deleted. Otherwise the lock is pointed to the new job. Returns the id of the job running the query.
+# Jobs are cancelled by setting their (serialized) meta, so a job found cancelled is passed back in ARGV[4].
+ENQUEUE_QUERY_SCRIPT = """
+local job_id = redis.call("GET", KEYS[1])
+if job_id and job_id ~= ARGV[1] and job_id ~= ARGV[4] and redis.call("EXISTS", ARGV[3] .. job_id) == 1 then
+    local status = redis.call("HGET", ARGV[3] .. job_id, "status")
+    if status ~= "finished" and status ~= "failed" and status ~= "canceled" and status ~= "stopped" then
+        redis.call("LREM", KEYS[2], 0, ARGV[1])
+        redis.call("DEL", KEYS[3])
+        return job_id
+    end
+end
+redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+return ARGV[1]
+"""
+
+
+def _locks_share_rq_redis():
+    """Whether the job locks are kept in the same Redis database as the jobs, so a script can access both."""
+    locks, jobs = [c.connection_pool.connection_kwargs for c in (redis_connection, rq_redis_connection)]
+    return all(locks.get(key) == jobs.get(key) for key in ("host", "port", "path", "db"))
+
+
 def enqueue_query(query, data_source, user_id, is_api_key=False, scheduled_query=None, metadata={}):
     query_hash = gen_query_hash(query)
     logger.info("Inserting job for %s with metadata=%s", query_hash, metadata)
+
+    if not _locks_share_rq_redis():
+        return _watch_and_enqueue_query(query_hash, query, data_source, user_id, is_api_key, scheduled_query, metadata)
+
+    # The job is enqueued and deduplicated in a single round trip, so concurrent requests for the same query don't
+    # contend on the lock. When the job expires before it's fetched, or was cancelled, the query is enqueued again.
+    cancelled_job_id = ""
+    for _ in range(5):
+        queue_name, job_data = _job_data(query, data_source, user_id, is_api_key, scheduled_query, metadata)
+        queue = _get_queue(queue_name)
+
+        with queue.connection.pipeline() as pipe:
+            (job,) = queue.enqueue_many([job_data], pipeline=pipe)
+            pipe.eval(
+                ENQUEUE_QUERY_SCRIPT,
+                3,
+                _job_lock_id(query_hash, data_source.id),
+                queue.key,
+                job.key,
+                job.id,
+                settings.JOB_EXPIRY_TIME,
+                Job.redis_job_namespace_prefix,
+                cancelled_job_id,
+            )
+            job_id = pipe.execute()[-1].decode()
+
+        if job_id == job.id:
+            # enqueue_many bypasses Queue.enqueue_job, which records this metric.
+            statsd_client.incr("rq.jobs.created.{}".format(queue_name))
+            logger.info("[%s] Created new job: %s", query_hash, job.id)
+            return job
+
+        logger.info("[%s] Found existing job: %s", query_hash, job_id)
+        try:
+            job = Job.fetch(job_id, connection=queue.connection)
+        except NoSuchJobError:
+            continue
+
+        if not job.is_cancelled:
+            return job
+
+        logger.info("[%s] job found has been cancelled, replacing it", query_hash)
+        cancelled_job_id = job.id
+
+    logger.error("[Manager][%s] Failed adding job for query.", query_hash)
+    return None
+
+
+def _watch_and_enqueue_query(query_hash, query, data_source, user_id, is_api_key, scheduled_query, metadata):
     try_count = 0
     job = None
 
@@ -72,35 +276,8 @@ def enqueue_query(query, data_source, user_id, is_api_key=False, scheduled_query
             if not job:
                 pipe.multi()
 
-                if scheduled_query:
-                    queue_name = data_source.scheduled_queue_name
-                    scheduled_query_id = scheduled_query.id
-                else:
-                    queue_name = data_source.queue_name
-                    scheduled_query_id = None
-
-                time_limit = settings.dynamic_settings.query_time_limit(scheduled_query, user_id, data_source.org_id)
-                metadata["Queue"] = queue_name
-
-                queue = Queue(queue_name)
-                enqueue_kwargs = {
-                    "user_id": user_id,
-                    "scheduled_query_id": scheduled_query_id,
-                    "is_api_key": is_api_key,
-                    "job_timeout": time_limit,
-                    "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
-                    "meta": {
-                        "data_source_id": data_source.id,
-                        "org_id": data_source.org_id,
-                        "scheduled": scheduled_query_id is not None,
-                        "query_id": metadata.get("query_id"),
-                        "user_id": user_id,
-                    },
-                }
-
-                if not scheduled_query:
-                    enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
-
+                queue_name, enqueue_kwargs = _job_options(data_source, user_id, is_api_key, scheduled_query, metadata)
+                queue = _get_queue(queue_name)
                 job = queue.enqueue(execute_query, query, data_source.id, metadata, **enqueue_kwargs)
 
                 logger.info("[%s] Created new job: %s", query_hash, job.id)
@@ -147,30 +324,6 @@ def _resolve_user(user_id, is_api_key, query_id):
         return None
 
 
-def _get_size_iterative(dict_obj):
-    """Iteratively finds size of objects in bytes"""
-    seen = set()
-    size = 0
-    objects = deque([dict_obj])
-
-    while objects:
-        current = objects.popleft()
-        if id(current) in seen:
-            continue
-        seen.add(id(current))
-        size += sys.getsizeof(current)
-
-        if isinstance(current, dict):
-            objects.extend(current.keys())
-            objects.extend(current.values())
-        elif hasattr(current, "__dict__"):
-            objects.append(current.__dict__)
-        elif hasattr(current, "__iter__") and not isinstance(current, (str, bytes, bytearray)):
-            objects.extend(current)
-
-    return size
-
-
 class QueryExecutor:
     def __init__(self, query, data_source_id, user_id, is_api_key, metadata, is_scheduled_query):
         self.job = get_current_job()
@@ -217,17 +370,10 @@ class QueryExecutor:
 
         run_time = time.time() - started_at
 
-        logger.info(
-            "job=execute_query query_hash=%s ds_id=%d data_length=%s error=[%s]",
-            self.query_hash,
-            self.data_source_id,
-            data and _get_size_iterative(data),
-            error,
-        )
-
         _unlock(self.query_hash, self.data_source.id)
 
         if error is not None and data is None:
+            self._log_result(None, error)
             result = QueryExecutionError(error)
             if self.is_scheduled_query:
                 self.query_model = models.db.session.merge(self.query_model, load=False)
@@ -249,6 +395,7 @@ class QueryExecutor:
                 run_time,
                 utcnow(),
             )
+            self._log_result(query_result.byte_size, error)
 
             updated_query_ids = models.Query.update_latest_result(query_result)
 
@@ -269,6 +416,18 @@ class QueryExecutor:
 
         return query_runner.annotate_query(self.query, self.metadata)
 
+    def _log_result(self, data_length, error):
+        logger.info(
+            "job=execute_query query_hash=%s ds_id=%d data_length=%s error=[%s]",
+            self.query_hash,
+            self.data_source_id,
+            data_length,
+            error,
+        )
+        if data_length is not None:
+            # statsd timers are aggregated as histograms, which is what we want for result sizes.
+            statsd_client.timing("query_results.size.{}".format(self.data_source_id), data_length)
+
     def _log_progress(self, state):
         logger.info(
             "job=execute_query state=%s query_hash=%s type=%s ds_id=%d "
@@ -1,19 +1,28 @@
 import logging
 import time
 
+from funcy import chunks
+from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
 
-from redash import models, redis_connection, settings, statsd_client
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
 from redash.models.parameterized_query import (
     InvalidParameterError,
     QueryDetachedFromDataSourceError,
 )
-from redash.monitor import rq_job_ids
+from redash.models.result_storage import delete_stored_payloads
 from redash.tasks.failure_report import track_failure
-from redash.utils import json_dumps, sentry
+from redash.tasks.worker import Job
+from redash.utils import gen_query_hash, json_dumps, sentry
 from redash.worker import get_job_logger, job
 
-from .execution import enqueue_query
+from .execution import _job_lock_id, enqueue_queries, enqueue_query
 
 logger = get_job_logger(__name__)
 
@@ -39,18 +48,28 @@ def _should_refresh_query(query):
     elif query.data_source is None:
         logger.debug("Skipping refresh of %s because the datasource is none.", query.id)
         return False
-    elif query.data_source.paused:
-        logger.debug(
-            "Skipping refresh of %s because datasource - %s is paused (%s).",
-            query.id,
-            query.data_source.name,
-            query.data_source.pause_reason,
-        )
-        return False
     else:
         return True
 
 
+def _fetch_pauses_and_locks(queries):
+    """
+    Returns the pause reasons of the paused data sources ({data source id: reason}) and the queries' job locks (in
+    the order of the queries, None when there's no lock), fetched with a single MGET.
+    """
+    data_sources = list({query["data_source"].id: query["data_source"] for query in queries}.values())
+    keys = [data_source._pause_key for data_source in data_sources] + [
+        _job_lock_id(gen_query_hash(query["query"]), query["data_source"].id) for query in queries
+    ]
+    if not keys:
+        return {}, []
+
+    values = redis_connection.mget(keys)
+    pauses = {data_source.id: reason for data_source, reason in zip(data_sources, values) if reason is not None}
+
+    return pauses, values[len(data_sources) :]
+
+
 def _apply_default_parameters(query):
     parameters = {p["name"]: p.get("value") for p in query.parameters}
     if any(parameters):
@@ -80,42 +99,99 @@ def _apply_auto_limit(query_text, query):
     return query.data_source.query_runner.apply_auto_limit(query_text, should_apply_auto_limit)
 
 
-def refresh_queries():
+def refresh_queries(query_ids=None):
     started_at = time.time()
     logger.info("Refreshing queries...")
-    enqueued = []
-    for query in models.Query.outdated_queries():
+    timings = {}
+
+    phase_started_at = time.time()
+    outdated_queries = models.Query.outdated_queries(query_ids)
+    timings["load_duration"] = time.time() - phase_started_at
+
+    phase_started_at = time.time()
+    candidates = []
+    for query in outdated_queries:
         if not _should_refresh_query(query):
             continue
 
         try:
             query_text = _apply_default_parameters(query)
             query_text = _apply_auto_limit(query_text, query)
-            enqueue_query(
-                query_text,
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata={"query_id": query.id, "Username": query.user.get_actual_user()},
+        except Exception as e:
+            _report_enqueue_error(query, e)
+            continue
+
+        candidates.append(
+            (
+                query,
+                {
+                    "query": query_text,
+                    "data_source": query.data_source,
+                    "user_id": query.user_id,
+                    "scheduled_query": query,
+                    "metadata": {"query_id": query.id, "Username": query.user.get_actual_user()},
+                },
             )
+        )
+    timings["prepare_duration"] = time.time() - phase_started_at
+
+    phase_started_at = time.time()
+    pauses, locks = _fetch_pauses_and_locks([arguments for _, arguments in candidates])
+    timings["lookup_duration"] = time.time() - phase_started_at
+
+    phase_started_at = time.time()
+    enqueued = []
+    to_enqueue = []
+    for (query, arguments), lock in zip(candidates, locks):
+        if query.data_source_id in pauses:
+            logger.debug(
+                "Skipping refresh of %s because datasource - %s is paused (%s).",
+                query.id,
+                query.data_source.name,
+                pauses[query.data_source_id],
+            )
+            continue
+
+        if lock is None:
+            to_enqueue.append((query, arguments))
+            continue
+
+        # The query may still be running, which enqueue_query checks.
+        try:
+            enqueue_query(**arguments)
             enqueued.append(query)
         except Exception as e:
-            message = "Could not enqueue query %d due to %s" % (query.id, repr(e))
+            _report_enqueue_error(query, e)
+
+    if to_enqueue:
+        try:
+            enqueue_queries([arguments for _, arguments in to_enqueue])
+            enqueued.extend(query for query, _ in to_enqueue)
+        except Exception as e:
+            message = "Could not enqueue queries due to %s" % repr(e)
             logging.info(message)
-            error = RefreshQueriesError(message).with_traceback(e.__traceback__)
-            sentry.capture_exception(error)
+            sentry.capture_exception(RefreshQueriesError(message).with_traceback(e.__traceback__))
+    timings["enqueue_duration"] = time.time() - phase_started_at
 
     status = {
         "started_at": started_at,
         "outdated_queries_count": len(enqueued),
         "last_refresh_at": time.time(),
         "query_ids": json_dumps([q.id for q in enqueued]),
+        **timings,
     }
 
     redis_connection.hset("redash:status", mapping=status)
     logger.info("Done refreshing queries: %s" % status)
 
 
+def _report_enqueue_error(query, e):
+    message = "Could not enqueue query %d due to %s" % (query.id, repr(e))
+    logging.info(message)
+    error = RefreshQueriesError(message).with_traceback(e.__traceback__)
+    sentry.capture_exception(error)
+
+
 def cleanup_query_results():
     """
     Job to cleanup unused query results -- such that no query links to them anymore, and older than
@@ -131,30 +207,82 @@ def cleanup_query_results():
         settings.QUERY_RESULTS_CLEANUP_MAX_AGE,
     )
 
-    unused_query_results = models.QueryResult.unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE)
-    deleted_count = models.QueryResult.query.filter(
-        models.QueryResult.id.in_(unused_query_results.limit(settings.QUERY_RESULTS_CLEANUP_COUNT).subquery())
-    ).delete(synchronize_session=False)
+    unused_query_result_ids = [
+        query_result.id
+        for query_result in models.QueryResult.unused(settings.QUERY_RESULTS_CLEANUP_MAX_AGE).limit(
+            settings.QUERY_RESULTS_CLEANUP_COUNT
+        )
+    ]
+    unused_query_results = models.QueryResult.query.filter(models.QueryResult.id.in_(unused_query_result_ids))
+    stored_payloads = models.QueryResult.stored_payloads(unused_query_results)
+    deleted_count = unused_query_results.delete(synchronize_session=False)
     models.db.session.commit()
+    delete_stored_payloads(stored_payloads)
     logger.info("Deleted %d unused query results.", deleted_count)
 
 
-def remove_ghost_locks():
-    """
-    Removes query locks that reference a non existing RQ job.
-    """
-    keys = redis_connection.keys("query_hash_job:*")
-    locks = {k: redis_connection.get(k) for k in keys}
-    jobs = list(rq_job_ids())
+# Statuses of the jobs whose locks are still in use: the lock is released once its job completes.
+LIVE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.STARTED)
 
-    count = 0
+# Deletes the locks (KEYS) that still reference the ghost job ids (ARGV), and not a job enqueued since.
+REMOVE_LOCKS_SCRIPT = """
+local removed = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[i] then
+        removed = removed + redis.call('del', key)
+    end
+end
+return removed
+"""
 
-    for lock, job_id in locks.items():
-        if job_id not in jobs:
-            redis_connection.delete(lock)
-            count += 1
 
-    logger.info("Locks found: {}, Locks removed: {}".format(len(locks), count))
+def _find_ghost_locks(lock_keys):
+    with redis_connection.pipeline(transaction=False) as pipe:
+        for key in lock_keys:
+            pipe.get(key)
+        job_ids = pipe.execute()
+
+    locks = [(key, job_id) for key, job_id in zip(lock_keys, job_ids) if job_id is not None]
+    with rq_redis_connection.pipeline(transaction=False) as pipe:
+        for _, job_id in locks:
+            pipe.hget(Job.key_for(job_id), "status")
+        statuses = pipe.execute()
+
+    ghost_locks = [
+        lock for lock, status in zip(locks, statuses) if status is None or status.decode() not in LIVE_JOB_STATUSES
+    ]
+    return len(locks), ghost_locks
+
+
+def remove_ghost_locks(batch_size=1000):
+    """
+    Removes query locks that reference a non existing (or completed) RQ job.
+
+    The locks are scanned incrementally, and the jobs of each batch are looked up with a single pipeline, to keep
+    Redis responsive regardless of the number of locks.
+    """
+    started_at = time.time()
+    lock_count = 0
+    removed_count = 0
+
+    for lock_keys in chunks(batch_size, redis_connection.scan_iter("query_hash_job:*", count=batch_size)):
+        found, ghost_locks = _find_ghost_locks(lock_keys)
+        lock_count += found
+        if ghost_locks:
+            keys, job_ids = zip(*ghost_locks)
+            removed_count += redis_connection.eval(REMOVE_LOCKS_SCRIPT, len(keys), *keys, *job_ids)
+
+    duration = time.time() - started_at
+    statsd_client.timing("remove_ghost_locks.duration", duration * 1000)
+    statsd_client.incr("remove_ghost_locks.scanned", lock_count)
+    statsd_client.incr("remove_ghost_locks.removed", removed_count)
+    logger.info(
+        "Locks found: %d, Locks removed: %d, Duration: %.2fs (%.0f locks/s)",
+        lock_count,
+        removed_count,
+        duration,
+        lock_count / duration if duration else 0,
+    )
 
 
 @job("schemas")
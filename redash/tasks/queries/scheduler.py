@@ -0,0 +1,145 @@
+"""
+A long running alternative to the periodic `refresh_queries` job, enabled with REDASH_DEDICATED_QUERY_SCHEDULER.
+
+The scheduler keeps a heap of the scheduled queries' `next_run_at` and refreshes the queries the second they are due.
+Instead of scanning the queries, it follows the stream of the ids of the queries whose `next_run_at` changed
+(`models.query_schedule_changes`), and reloads all of them only every QUERY_SCHEDULER_RELOAD_INTERVAL seconds.
+
+Several schedulers can run for availability: only the one holding the leader lock schedules queries.
+"""
+import heapq
+import logging
+import time
+import uuid
+
+import redis
+
+from redash import models, redis_connection, settings
+from redash.tasks.queries.maintenance import refresh_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryScheduler:
+    LEADER_KEY = "redash:query_scheduler:leader"
+    LEADER_TTL = 30
+    # Longest time between two checks of the leader lock and the schedule changes.
+    MAX_WAIT = 1.0
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.is_leader = False
+        self.loaded_at = None
+        self.last_change_id = None
+        self.heap = []
+        # The due time of each query's live entry in the heap. Entries that don't match it are outdated.
+        self.due = {}
+
+    def schedule(self, query_id, due):
+        if due is None:
+            self.due.pop(query_id, None)
+            return
+
+        self.due[query_id] = due
+        heapq.heappush(self.heap, (due, query_id))
+
+    def load(self):
+        # The stream position is taken first, so changes made while loading are read again rather than missed.
+        self.last_change_id = models.query_schedule_changes.last_id()
+        self.heap = []
+        self.due = {}
+
+        scheduled_queries = models.db.session.query(models.Query.id, models.Query.next_run_at).filter(
+            models.Query.next_run_at.isnot(None)
+        )
+        for query_id, next_run_at in scheduled_queries:
+            self.schedule(query_id, next_run_at.timestamp())
+
+        self.loaded_at = time.time()
+        logger.info("Loaded %d scheduled queries.", len(self.due))
+
+    def reload(self, query_ids):
+        next_runs = dict(
+            models.db.session.query(models.Query.id, models.Query.next_run_at).filter(models.Query.id.in_(query_ids))
+        )
+        for query_id in query_ids:
+            next_run_at = next_runs.get(query_id)
+            self.schedule(query_id, next_run_at and next_run_at.timestamp())
+
+    def pop_due_queries(self, now):
+        query_ids = []
+        while self.heap and self.heap[0][0] <= now:
+            due, query_id = heapq.heappop(self.heap)
+            if self.due.get(query_id) == due:
+                del self.due[query_id]
+                query_ids.append(query_id)
+
+        return query_ids
+
+    def refresh(self, query_ids):
+        try:
+            refresh_queries(query_ids)
+        except Exception:
+            logger.exception("Failed refreshing queries %s.", query_ids)
+
+        # Queries that are refreshed get a new next_run_at once their execution completes. Until then (or if they
+        # weren't refreshed, e.g. because their data source is paused), they are checked again periodically.
+        retry_at = time.time() + settings.QUERY_SCHEDULER_RETRY_INTERVAL
+        for query_id in query_ids:
+            self.schedule(query_id, retry_at)
+
+    def wait_time(self):
+        if not self.heap:
+            return self.MAX_WAIT
+
+        return min(self.MAX_WAIT, max(0, self.heap[0][0] - time.time()))
+
+    def acquire_leadership(self):
+        """Takes or renews the leader lock. Returns whether this scheduler holds it."""
+        with redis_connection.pipeline() as pipe:
+            try:
+                pipe.watch(self.LEADER_KEY)
+                leader = pipe.get(self.LEADER_KEY)
+                if leader is not None and leader != self.id:
+                    return False
+
+                pipe.multi()
+                pipe.set(self.LEADER_KEY, self.id, ex=self.LEADER_TTL)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+
+        return True
+
+    def tick(self):
+        if not self.acquire_leadership():
+            if self.is_leader:
+                logger.info("Query scheduler %s lost the leader lock.", self.id)
+                self.is_leader = False
+            time.sleep(self.MAX_WAIT)
+            return
+
+        if not self.is_leader:
+            logger.info("Query scheduler %s is the leader.", self.id)
+            self.is_leader = True
+            self.load()
+        elif time.time() - self.loaded_at > settings.QUERY_SCHEDULER_RELOAD_INTERVAL:
+            self.load()
+
+        self.last_change_id, changed_query_ids = models.query_schedule_changes.read(
+            self.last_change_id, self.wait_time()
+        )
+        if changed_query_ids:
+            self.reload(changed_query_ids)
+
+        query_ids = self.pop_due_queries(time.time())
+        if query_ids:
+            self.refresh(query_ids)
+
+        # Don't keep a transaction (and stale objects) open between ticks.
+        models.db.session.remove()
+
+    def run(self):
+        logger.info("Starting query scheduler %s.", self.id)
+        while True:
+            self.tick()
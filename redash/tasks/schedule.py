@@ -56,7 +56,6 @@ def schedule(kwargs):
 
 def periodic_job_definitions():
     jobs = [
-        {"func": refresh_queries, "timeout": 600, "interval": 30, "result_ttl": 600},
         {
             "func": remove_ghost_locks,
             "interval": timedelta(minutes=1),
@@ -79,6 +78,10 @@ def periodic_job_definitions():
         },
     ]
 
+    # Otherwise scheduled queries are refreshed by the `rq query-scheduler` process.
+    if not settings.DEDICATED_QUERY_SCHEDULER:
+        jobs.append({"func": refresh_queries, "timeout": 600, "interval": 30, "result_ttl": 600})
+
     if settings.QUERY_RESULTS_CLEANUP_ENABLED:
         jobs.append({"func": cleanup_query_results, "interval": timedelta(minutes=5)})
 
@@ -2,6 +2,7 @@ import errno
 import os
 import signal
 import sys
+import time
 
 from rq import Queue as BaseQueue
 from rq.job import Job as BaseJob
@@ -22,12 +23,43 @@ else:
     BaseWorker = HerokuWorker
 
 
+COMPLETED_JOB_STATUSES = (JobStatus.FINISHED, JobStatus.FAILED, JobStatus.CANCELED, JobStatus.STOPPED)
+
+
+def job_completion_channel(job_id):
+    return "rq:job:{}:completed".format(job_id)
+
+
+def publish_job_completion(job):
+    job.connection.publish(job_completion_channel(job.id), job.id)
+
+
+def wait_for_job(job, timeout):
+    """Blocks until the job completes or `timeout` seconds pass, without polling the job."""
+    deadline = time.time() + timeout
+    pubsub = job.connection.pubsub()
+    try:
+        pubsub.subscribe(job_completion_channel(job.id))
+        # Once subscribed, check whether the job completed before the subscription.
+        message = pubsub.get_message(timeout=timeout)
+        if message is None or job.get_status() in COMPLETED_JOB_STATUSES:
+            return
+
+        while time.time() < deadline:
+            message = pubsub.get_message(timeout=deadline - time.time())
+            if message and message["type"] == "message":
+                return
+    finally:
+        pubsub.close()
+
+
 class CancellableJob(BaseJob):
     def cancel(self, pipeline=None):
         self.meta["cancelled"] = True
         self.save_meta()
 
         super().cancel(pipeline=pipeline)
+        publish_job_completion(self)
 
     @property
     def is_cancelled(self):
@@ -71,6 +103,18 @@ class StatsdRecordingWorker(BaseWorker):
                 statsd_client.incr("rq.jobs.failed.{}".format(queue.name))
 
 
+class CompletionPublishingWorker(BaseWorker):
+    """
+    RQ Worker Mixin that publishes the completion of jobs (see `wait_for_job`), once their status is stored
+    """
+
+    def execute_job(self, job, queue):
+        try:
+            super().execute_job(job, queue)
+        finally:
+            publish_job_completion(job)
+
+
 class HardLimitingWorker(BaseWorker):
     """
     RQ's work horses enforce time limits by setting a timed alarm and stopping jobs
@@ -174,7 +218,7 @@ class HardLimitingWorker(BaseWorker):
             )
 
 
-class RedashWorker(StatsdRecordingWorker, HardLimitingWorker):
+class RedashWorker(StatsdRecordingWorker, CompletionPublishingWorker, HardLimitingWorker):
     queue_class = RedashQueue
 
 
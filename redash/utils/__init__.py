@@ -3,15 +3,19 @@ import codecs
 import csv
 import datetime
 import decimal
+import enum
 import hashlib
 import io
 import json
+import math
 import os
 import random
 import re
 import sys
 import uuid
+from collections.abc import Mapping, Sequence
 
+import orjson
 import pystache
 import pytz
 import sqlparse
@@ -70,65 +74,170 @@ def generate_token(length):
     return "".join(rand.choice(chars) for x in range(length))
 
 
+def _json_datetime(o):
+    # See "Date Time String Format" in the ECMA-262 specification.
+    result = o.isoformat()
+    if o.microsecond:
+        result = result[:23] + result[26:]
+    if result.endswith("+00:00"):
+        result = result[:-6] + "Z"
+    return result
+
+
+def _json_time(o):
+    if o.utcoffset() is not None:
+        raise ValueError("JSON can't represent timezone-aware times.")
+    result = o.isoformat()
+    if o.microsecond:
+        result = result[:12]
+    return result
+
+
+def _json_binary(o):
+    return binascii.hexlify(o).decode()
+
+
+# Encoders of the common non JSON types, looked up by their exact type.
+_JSON_TYPE_ENCODERS = {
+    decimal.Decimal: float,
+    datetime.datetime: _json_datetime,
+    datetime.date: datetime.date.isoformat,
+    datetime.time: _json_time,
+    datetime.timedelta: str,
+    uuid.UUID: str,
+    bytes: _json_binary,
+    memoryview: _json_binary,
+}
+
+
 class JSONEncoder(json.JSONEncoder):
     """Adapter for `json.dumps`."""
 
     def __init__(self, **kwargs):
-        from redash.query_runner import query_runners
+        from redash.query_runner import custom_json_encoders
 
-        self.encoders = [r.custom_json_encoder for r in query_runners.values() if hasattr(r, "custom_json_encoder")]
+        self.encoders = custom_json_encoders
         super().__init__(**kwargs)
 
     def default(self, o):
-        for encoder in self.encoders:
+        encoder = _JSON_TYPE_ENCODERS.get(type(o))
+        if encoder is not None:
+            return encoder(o)
+
+        for encoder in self.encoders.values():
             result = encoder(self, o)
             if result:
                 return result
+
         if isinstance(o, Query):
             result = list(o)
         elif isinstance(o, decimal.Decimal):
             result = float(o)
         elif isinstance(o, (datetime.timedelta, uuid.UUID)):
             result = str(o)
-        # See "Date Time String Format" in the ECMA-262 specification.
         elif isinstance(o, datetime.datetime):
-            result = o.isoformat()
-            if o.microsecond:
-                result = result[:23] + result[26:]
-            if result.endswith("+00:00"):
-                result = result[:-6] + "Z"
+            result = _json_datetime(o)
         elif isinstance(o, datetime.date):
             result = o.isoformat()
         elif isinstance(o, datetime.time):
-            if o.utcoffset() is not None:
-                raise ValueError("JSON can't represent timezone-aware times.")
-            result = o.isoformat()
-            if o.microsecond:
-                result = result[:12]
-        elif isinstance(o, memoryview):
-            result = binascii.hexlify(o).decode()
-        elif isinstance(o, bytes):
-            result = binascii.hexlify(o).decode()
+            result = _json_time(o)
+        elif isinstance(o, (memoryview, bytes)):
+            result = _json_binary(o)
+        # As orjson does.
+        elif isinstance(o, enum.Enum):
+            result = o.value
+        # Lazy containers, like the query runners' TupleResult.
+        elif isinstance(o, (Mapping, Sequence)):
+            result = dict(o) if isinstance(o, Mapping) else list(o)
         else:
             result = super().default(o)
         return result
 
 
+def _nan_to_none(o):
+    """Returns the data with its float (and Decimal) values nan and inf replaced by None."""
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    if isinstance(o, decimal.Decimal):
+        return o if o.is_finite() else None
+    if isinstance(o, Mapping):
+        return {key: _nan_to_none(value) for key, value in o.items()}
+    if isinstance(o, Sequence) and not isinstance(o, (str, bytes, bytearray, memoryview)):
+        return [_nan_to_none(value) for value in o]
+    return o
+
+
+# Datetimes are left to the encoder for their ECMA-262 format, and dataclasses aren't JSON serializable (as with
+# `json.dumps`).
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+# orjson decodes integers over 64 bits as floats, so the documents which may have one are decoded by json.loads.
+_BIG_INTEGER_RE = re.compile(r"\d{20}")
+_BIG_INTEGER_BYTES_RE = re.compile(rb"\d{20}")
+_orjson_encoder = None
+
+
+def _orjson_default(o):
+    global _orjson_encoder
+    if _orjson_encoder is None:
+        _orjson_encoder = JSONEncoder()
+    return _orjson_encoder.default(o)
+
+
+def _has_big_integer(data):
+    if isinstance(data, str):
+        return _BIG_INTEGER_RE.search(data) is not None
+    if isinstance(data, (bytes, bytearray)):
+        return _BIG_INTEGER_BYTES_RE.search(data) is not None
+    return False
+
+
 def json_loads(data, *args, **kwargs):
     """A custom JSON loading function which passes all parameters to the
-    json.loads function."""
+    json.loads function.
+
+    Without any parameters, the data is decoded with orjson, unless it may have integers orjson can't represent
+    exactly (over 64 bits) or literals it rejects (NaN or Infinity), which json.loads decodes.
+    """
+    if not args and not kwargs and not _has_big_integer(data):
+        try:
+            # orjson only accepts exact str instances (not e.g. SerializedJSON).
+            return orjson.loads(str(data) if isinstance(data, str) else data)
+        except orjson.JSONDecodeError:
+            pass
+
     return json.loads(data, *args, **kwargs)
 
 
 def json_dumps(data, *args, **kwargs):
     """A custom JSON dumping function which passes all parameters to the
-    json.dumps function."""
+    json.dumps function.
+
+    Without any parameters, the data is encoded with orjson, and json.dumps is only used for the values orjson can't
+    encode (like integers over 64 bits). Either way, the output has no spaces after separators. Float values nan and
+    inf are encoded as null unless allow_nan or cls is given.
+    """
+    if not args and not kwargs:
+        try:
+            return orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS).decode()
+        except orjson.JSONEncodeError:
+            pass
+
+        # The same format as orjson's.
+        kwargs["separators"] = (",", ":")
+
+    null_nan = "cls" not in kwargs and "allow_nan" not in kwargs
     kwargs.setdefault("cls", JSONEncoder)
     kwargs.setdefault("ensure_ascii", False)
     # Float value nan or inf in Python should be render to None or null in json.
     # Using allow_nan = True will make Python render nan as NaN, leading to parse error in front-end
     kwargs.setdefault("allow_nan", False)
-    return json.dumps(data, *args, **kwargs)
+    try:
+        return json.dumps(data, *args, **kwargs)
+    except ValueError:
+        if not null_nan:
+            raise
+
+    return json.dumps(_nan_to_none(data), *args, **kwargs)
 
 
 def mustache_render(template, context=None, **kwargs):
@@ -4,6 +4,8 @@ import os
 from contextlib import contextmanager
 from unittest import TestCase
 
+from sqlalchemy import event
+
 os.environ["REDASH_REDIS_URL"] = os.environ.get("REDASH_REDIS_URL", "redis://localhost:6379/0").replace("/0", "/5")
 # Use different url for RQ to avoid DB being cleaned up:
 os.environ["RQ_REDIS_URL"] = os.environ.get("REDASH_REDIS_URL", "redis://localhost:6379/0").replace("/5", "/6")
@@ -43,6 +45,70 @@ def authenticated_user(c, user=None):
     yield user
 
 
+class _CountingCursor:
+    """Wraps a DBAPI cursor to add the size of the rows fetched through it to a `FetchedBytes` counter."""
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._counter.add([row])
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._counter.add(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._counter.add(rows)
+        return rows
+
+
+class FetchedBytes:
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows):
+        for row in rows:
+            self.rows += 1
+            self.bytes += sum(self._size(value) for value in row)
+
+    @staticmethod
+    def _size(value):
+        if value is None:
+            return 0
+        if isinstance(value, (bytes, memoryview)):
+            return len(value)
+        if isinstance(value, (dict, list)):
+            value = json_dumps(value)
+        return len(str(value).encode("utf-8"))
+
+
+@contextmanager
+def count_fetched_bytes():
+    """Counts the rows and bytes fetched from the database, e.g. by a request, to catch over-fetching."""
+    counter = FetchedBytes()
+
+    def wrap_cursor(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.cursor = _CountingCursor(cursor, counter)
+
+    event.listen(db.engine, "after_cursor_execute", wrap_cursor)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "after_cursor_execute", wrap_cursor)
+
+
 class BaseTestCase(TestCase):
     def setUp(self):
         self.app = create_app()
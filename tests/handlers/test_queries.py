@@ -2,7 +2,7 @@ from redash import models
 from redash.models import db
 from redash.permissions import ACCESS_TYPE_MODIFY
 from redash.serializers import serialize_query
-from tests import BaseTestCase
+from tests import BaseTestCase, count_fetched_bytes
 
 
 class TestQueryResourceGet(BaseTestCase):
@@ -251,6 +251,31 @@ class TestQueryListResourceGet(BaseTestCase):
         assert len(rv.json["results"]) == 2
         assert set([result["id"] for result in rv.json["results"]]) == {q1.id, q2.id}
 
+    def test_returns_result_stats(self):
+        query_result = self.factory.create_query_result(data={"columns": [], "rows": [{"a": 1}, {"a": 2}]})
+        self.factory.create_query(latest_query_data=query_result)
+        db.session.commit()
+        db.session.expire_all()
+
+        rv = self.make_request("get", "/api/queries")
+
+        self.assertEqual(2, rv.json["results"][0]["row_count"])
+        self.assertEqual(query_result.byte_size, rv.json["results"][0]["byte_size"])
+
+    def test_doesnt_fetch_results_data(self):
+        rows = [{"a": "x" * 1000} for _ in range(100)]
+        query_result = self.factory.create_query_result(data={"columns": [], "rows": rows})
+        for _ in range(3):
+            self.factory.create_query(latest_query_data=query_result)
+        db.session.commit()
+        db.session.expunge_all()
+
+        with count_fetched_bytes() as fetched:
+            rv = self.make_request("get", "/api/queries")
+
+        self.assertEqual(3, len(rv.json["results"]))
+        self.assertLess(fetched.bytes, query_result.byte_size)
+
 
 class TestQueryListResourcePost(BaseTestCase):
     def test_create_query(self):
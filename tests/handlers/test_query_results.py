@@ -1,6 +1,13 @@
+import threading
+import time
+
+from mock import patch
+
+from redash import models, rq_redis_connection, settings
 from redash.handlers.query_results import error_messages, run_query
 from redash.models import db
-from tests import BaseTestCase
+from redash.tasks.worker import Job
+from tests import BaseTestCase, count_fetched_bytes
 
 
 class TestRunQuery(BaseTestCase):
@@ -196,6 +203,57 @@ class TestQueryResultListAPI(BaseTestCase):
 
 
 class TestQueryResultAPI(BaseTestCase):
+    def test_fetches_data_with_the_result(self):
+        rows = [{"a": "x" * 1000} for _ in range(100)]
+        query_result = self.factory.create_query_result(data={"columns": [], "rows": rows})
+        db.session.commit()
+        db.session.expunge_all()
+
+        with count_fetched_bytes() as fetched:
+            rv = self.make_request("get", "/api/query_results/{}".format(query_result.id))
+
+        self.assertEqual(rows, rv.json["query_result"]["data"]["rows"])
+        self.assertGreater(fetched.bytes, query_result.byte_size)
+        self.assertLess(fetched.bytes, 2 * query_result.byte_size)
+
+    def test_serves_stored_json_as_is(self):
+        data = {"columns": [{"name": "a", "type": "string"}], "rows": [{"a": "x"}]}
+        query_result = self.factory.create_query_result(data=data)
+        db.session.commit()
+        db.session.expunge_all()
+
+        with patch.object(models.QueryResult, "get_data") as get_data:
+            rv = self.make_request("get", "/api/query_results/{}".format(query_result.id))
+
+        get_data.assert_not_called()
+        self.assertEqual(data, rv.json["query_result"]["data"])
+        self.assertEqual(query_result.id, rv.json["query_result"]["id"])
+
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_serves_columnar_results_as_json(self):
+        data = {"columns": [{"name": "a", "type": "string"}], "rows": [{"a": "x"}]}
+        query_result = self.factory.create_query_result(data=data)
+        db.session.commit()
+
+        rv = self.make_request("get", "/api/query_results/{}".format(query_result.id))
+
+        self.assertEqual("columnar", query_result.data_format)
+        self.assertEqual(data, rv.json["query_result"]["data"])
+
+    def test_revalidates_with_etag(self):
+        query_result = self.factory.create_query_result()
+
+        rv = self.make_request("get", "/api/query_results/{}".format(query_result.id))
+        etag = rv.headers["ETag"]
+
+        rv = self.client.get(
+            "/{}/api/query_results/{}".format(self.factory.org.slug, query_result.id),
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(304, rv.status_code)
+        self.assertEqual(b"", rv.data)
+        self.assertEqual(etag, rv.headers["ETag"])
+
     def test_has_no_access_to_data_source(self):
         ds = self.factory.create_data_source(group=self.factory.create_group())
         query_result = self.factory.create_query_result(data_source=ds)
@@ -432,6 +490,31 @@ class TestQueryResultExcelResponse(BaseTestCase):
         self.assertEqual(rv.status_code, 200)
 
 
+class TestQueryResultCSVResponse(BaseTestCase):
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    @patch("redash.models.result_storage.ROW_GROUP_SIZE", 2)
+    def test_streams_csv_file(self):
+        query = self.factory.create_query()
+        data = {
+            "rows": [{"test": i, "flag": i % 2 == 0} for i in range(5)],
+            "columns": [{"name": "test", "type": "integer"}, {"name": "flag", "type": "boolean"}],
+        }
+        query_result = self.factory.create_query_result(data=data)
+
+        rv = self.make_request(
+            "get",
+            "/api/queries/{}/results/{}.csv".format(query.id, query_result.id),
+            is_json=False,
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertTrue(rv.is_streamed)
+        self.assertEqual(
+            "test,flag\r\n0,true\r\n1,false\r\n2,true\r\n3,false\r\n4,true\r\n",
+            rv.get_data(as_text=True),
+        )
+
+
 class TestJobResource(BaseTestCase):
     def test_cancels_queued_queries(self):
         QUEUED = 1
@@ -454,3 +537,30 @@ class TestJobResource(BaseTestCase):
         job = self.make_request("get", f"/api/jobs/{job_id}").json["job"]
         self.assertEqual(job["status"], FAILED)
         self.assertTrue("cancelled" in job["error"])
+
+    def create_job(self):
+        query = self.factory.create_query()
+        job_id = self.make_request("post", f"/api/queries/{query.id}/results", data={"parameters": {}}).json["job"][
+            "id"
+        ]
+        return Job.fetch(job_id, connection=rq_redis_connection)
+
+    @patch("redash.handlers.query_results.wait_for_job")
+    def test_doesnt_wait_unless_enabled(self, wait_for_job):
+        job = self.create_job()
+
+        self.make_request("get", f"/api/jobs/{job.id}?wait=10")
+
+        wait_for_job.assert_not_called()
+
+    def test_waits_for_job_completion(self):
+        job = self.create_job()
+        threading.Timer(0.2, job.cancel).start()
+
+        with patch.object(settings, "JOB_WAIT_TIMEOUT", 10):
+            started_at = time.time()
+            rv = self.make_request("get", f"/api/jobs/{job.id}?wait=10")
+
+        self.assertLess(time.time() - started_at, 10)
+        self.assertEqual(4, rv.json["job"]["status"])
+        self.assertIn("cancelled", rv.json["job"]["error"])
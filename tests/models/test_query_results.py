@@ -1,7 +1,14 @@
 import datetime
+import os
+import tempfile
+
+from mock import patch
 
 from redash import models
-from redash.utils import utcnow
+from redash.models import result_storage
+from redash.query_runner import TupleResult
+from redash.tasks.queries.maintenance import cleanup_query_results
+from redash.utils import json_dumps, json_loads, utcnow
 from tests import BaseTestCase
 
 
@@ -73,3 +80,204 @@ class QueryResultTest(BaseTestCase):
         )
 
         self.assertEqual(original_updated_at, query.updated_at)
+
+
+class QueryResultStorageFormatTest(BaseTestCase):
+    data = {
+        "columns": [{"name": "a", "type": "integer"}, {"name": "b", "type": "string"}],
+        "rows": [{"a": i, "b": str(i)} for i in range(25)] + [{"a": 25}],
+        "metadata": {"data_scanned": 10},
+    }
+
+    def store(self, data):
+        query_result = models.QueryResult.store_result(
+            self.factory.org.id, self.factory.data_source, "hash", "SELECT 1", data, 0, utcnow()
+        )
+        models.db.session.commit()
+        models.db.session.expire_all()
+        return models.QueryResult.query.get(query_result.id)
+
+    def test_stores_json_by_default(self):
+        query_result = self.store(self.data)
+
+        self.assertIsNone(query_result.data_format)
+        self.assertIsNone(query_result.data_blob)
+        self.assertEqual(len(json_dumps(self.data).encode("utf-8")), query_result.byte_size)
+        self.assertEqual(self.data, query_result.data)
+
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_stores_columnar_format(self):
+        query_result = self.store(self.data)
+
+        self.assertEqual("columnar", query_result.data_format)
+        self.assertIsNone(query_result._data)
+        self.assertEqual(self.data, query_result.data)
+        self.assertEqual(self.data, json_loads(query_result.get_serialized_data()))
+
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_falls_back_to_json_for_unexpected_data(self):
+        query_result = self.store({})
+
+        self.assertIsNone(query_result.data_format)
+        self.assertEqual({}, query_result.data)
+
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    @patch("redash.models.result_storage.ROW_GROUP_SIZE", 10)
+    def test_get_data_with_columns_and_range(self):
+        query_result = self.store(self.data)
+        expected = result_storage.select_data(self.data, ["b"], 8, 18)
+
+        data = query_result.get_data(columns=["b"], offset=8, limit=18)
+
+        self.assertEqual(expected, data)
+        self.assertEqual([{"name": "b", "type": "string"}], data["columns"])
+        self.assertEqual([{"b": str(i)} for i in range(8, 25)] + [{}], data["rows"])
+
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_reads_first_rows_from_preview(self):
+        query_result = self.store(self.data)
+        self.assertEqual(self.data["rows"][:10], query_result.preview)
+
+        with patch.object(models.QueryResult, "_load_payload") as load_payload:
+            data = query_result.get_data(columns=["b"], offset=2, limit=8)
+
+        load_payload.assert_not_called()
+        self.assertEqual([{"name": "b", "type": "string"}], data["columns"])
+        self.assertEqual([{"b": str(i)} for i in range(2, 10)], data["rows"])
+        self.assertEqual(
+            result_storage.select_data(self.data, None, 5, 10)["rows"],
+            query_result.get_data(offset=5, limit=10)["rows"],
+        )
+
+    def test_loads_data_only_when_read(self):
+        org_id = self.factory.org.id
+        query_result_id = self.store(self.data).id
+        models.db.session.expunge_all()
+        org = models.Organization.query.get(org_id)
+
+        query_result = models.QueryResult.get_by_id_and_org(query_result_id, org)
+        self.assertNotIn("_data", query_result.__dict__)
+        self.assertEqual(self.data, query_result.data)
+
+        models.db.session.expunge(query_result)
+        query_result = models.QueryResult.get_by_id_and_org(query_result_id, org, with_data=True)
+        self.assertIn("_data", query_result.__dict__)
+
+    def test_decodes_data_once(self):
+        query_result = self.store(self.data)
+
+        with patch.object(
+            models.QueryResult, "get_data", autospec=True, side_effect=models.QueryResult.get_data
+        ) as get_data:
+            for _ in range(3):
+                self.assertEqual(self.data, query_result.data)
+            self.assertEqual(1, get_data.call_count)
+
+            query_result.data = {"columns": [], "rows": []}
+            self.assertEqual({"columns": [], "rows": []}, query_result.data)
+            self.assertEqual(2, get_data.call_count)
+
+            models.db.session.expire(query_result)
+            self.assertEqual(self.data, query_result.data)
+            self.assertEqual(3, get_data.call_count)
+
+    def test_iterates_no_rows_of_null_legacy_data(self):
+        query_result = self.store(None)
+
+        self.assertIsNone(query_result.data)
+        self.assertEqual([], list(query_result.iter_row_batches()))
+
+    def tuple_result(self):
+        return TupleResult(self.data["columns"], [(i, str(i)) for i in range(25)], metadata={"data_scanned": 10})
+
+    @patch("redash.models.result_storage.ROW_GROUP_SIZE", 10)
+    def test_stores_tuple_result_as_json(self):
+        query_result = self.store(self.tuple_result())
+
+        self.assertIsNone(query_result.data_format)
+        self.assertEqual(25, query_result.row_count)
+        self.assertEqual(self.tuple_result().to_dict(), query_result.data)
+
+    @patch("redash.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    @patch("redash.models.result_storage.ROW_GROUP_SIZE", 10)
+    def test_stores_tuple_result_as_columnar(self):
+        query_result = self.store(self.tuple_result())
+
+        self.assertEqual("columnar", query_result.data_format)
+        self.assertEqual(self.tuple_result().to_dict(), query_result.data)
+
+
+class QueryResultStoreTest(BaseTestCase):
+    data = {
+        "columns": [{"name": "a", "type": "integer"}],
+        "rows": [{"a": i} for i in range(100)],
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.path = tempfile.mkdtemp()
+        patcher = patch("redash.settings.QUERY_RESULTS_STORE_PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.path) for name in names]
+
+    def test_keeps_small_results_in_the_database(self):
+        query_result = self.factory.create_query_result(data=self.data)
+
+        self.assertIsNone(query_result.data_ref)
+        self.assertEqual("json", query_result.data_format)
+        self.assertEqual([], self.stored_files())
+        self.assertEqual(self.data, query_result.data)
+
+    @patch("redash.settings.QUERY_RESULTS_STORE_THRESHOLD", 100)
+    def test_offloads_large_results(self):
+        query_result = self.factory.create_query_result(data=self.data)
+        models.db.session.commit()
+        models.db.session.expire_all()
+        query_result = models.QueryResult.query.get(query_result.id)
+
+        self.assertIsNone(query_result.data_blob)
+        self.assertEqual([query_result.data_ref], self.stored_files())
+        self.assertEqual(100, query_result.row_count)
+        self.assertEqual(self.data["columns"], query_result.column_schema)
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.path, query_result.data_ref[:2], query_result.data_ref)),
+            query_result.byte_size,
+        )
+        self.assertEqual(self.data, query_result.data)
+
+    @patch("redash.settings.QUERY_RESULTS_STORE_THRESHOLD", 100)
+    def test_deletes_payloads_of_rolled_back_results(self):
+        committed_query_result = self.factory.create_query_result(data=self.data)
+        models.QueryResult.store_result(
+            self.factory.org.id, self.factory.data_source, "hash", "SELECT 1", self.data, 1, utcnow()
+        )
+
+        models.db.session.rollback()
+
+        self.assertEqual([committed_query_result.data_ref], self.stored_files())
+        self.assertEqual(self.data, models.QueryResult.query.get(committed_query_result.id).data)
+
+    @patch("redash.settings.QUERY_RESULTS_STORE_THRESHOLD", 100)
+    def test_serializes_stored_json_payloads_as_is(self):
+        query_result = self.factory.create_query_result(data=self.data)
+        payload = result_storage.get_result_store().get(query_result.data_ref)
+
+        with patch.object(models.QueryResult, "get_data") as get_data:
+            self.assertEqual(payload.decode("utf-8"), query_result.get_serialized_data())
+
+        get_data.assert_not_called()
+
+    @patch("redash.settings.QUERY_RESULTS_STORE_THRESHOLD", 100)
+    def test_cleanup_deletes_stored_payloads(self):
+        two_weeks_ago = utcnow() - datetime.timedelta(days=14)
+        self.factory.create_query_result(data=self.data, retrieved_at=two_weeks_ago)
+        used_query_result = self.factory.create_query_result(data=self.data)
+        self.factory.create_query(latest_query_data=used_query_result)
+        models.db.session.commit()
+
+        cleanup_query_results()
+
+        self.assertEqual([used_query_result.data_ref], self.stored_files())
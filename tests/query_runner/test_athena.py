@@ -2,6 +2,7 @@
 Some test cases around the Glue catalog.
 """
 
+import io
 from unittest import TestCase
 
 import botocore
@@ -324,3 +325,82 @@ class TestGlueSchema(TestCase):
                 {"columns": [{"name": "row_id", "type": "int"}], "name": "test1.jdbc_table"},
                 {"columns": [{"name": "row_id", "type": "int"}], "name": "test2.jdbc_table"},
             ]
+
+
+class FakeS3:
+    """A stand-in for an S3 client, serving objects (and ranges of them) from memory."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.ranges = []
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = Range[len("bytes=") :].split("-")
+        self.ranges.append(Range)
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)][int(start) : int(end) + 1])}
+
+
+RESULTS_CSV = '"id","name","score","active"\n"1","a ""quoted"", value","1.5","true"\n"2","",,"false"\n"3",,,\n'
+
+
+class TestResultsFromS3(TestCase):
+    def setUp(self):
+        self.cursor = mock.Mock(
+            description=[("id", "integer"), ("name", "varchar"), ("score", "double"), ("active", "boolean")],
+            output_location="s3://bucket/results/query.csv",
+            query_id="query",
+            data_scanned_in_bytes=1000,
+        )
+        self.s3 = FakeS3({("bucket", "results/query.csv"): RESULTS_CSV.encode("utf-8")})
+
+        patchers = [
+            mock.patch("redash.query_runner.athena.pyathena.connect"),
+            mock.patch("redash.query_runner.athena.boto3.client", return_value=self.s3),
+            mock.patch("redash.query_runner.athena.S3_DOWNLOAD_PART_SIZE", 16),
+        ]
+        patchers[0].start().return_value.cursor.return_value = self.cursor
+        for patcher in patchers[1:]:
+            patcher.start()
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def run_query(self, **configuration):
+        query_runner = Athena(
+            dict({"glue": False, "region": "mars-east-1", "s3_staging_dir": "s3://bucket"}, **configuration)
+        )
+        return query_runner.run_query("SELECT * FROM results", None)
+
+    def test_reads_results_from_s3(self):
+        data, error = self.run_query(read_results_from_s3=True)
+
+        self.assertIsNone(error)
+        self.assertEqual(
+            [
+                {"id": 1, "name": 'a "quoted", value', "score": 1.5, "active": True},
+                {"id": 2, "name": "", "score": None, "active": False},
+                {"id": 3, "name": None, "score": None, "active": None},
+            ],
+            list(data["rows"]),
+        )
+        self.assertEqual(1000, data["metadata"]["data_scanned"])
+        self.assertGreater(len(self.s3.ranges), 1)
+        self.cursor.fetchall.assert_not_called()
+
+    def test_fetches_results_unless_enabled(self):
+        self.cursor.fetchall.return_value = [(1, "a", 1.5, True)]
+
+        data, error = self.run_query()
+
+        self.assertEqual([{"id": 1, "name": "a", "score": 1.5, "active": True}], list(data["rows"]))
+        self.assertEqual([], self.s3.ranges)
+
+    def test_fetches_results_of_other_statements(self):
+        self.cursor.output_location = "s3://bucket/results/query.txt"
+        self.cursor.fetchall.return_value = []
+
+        data, error = self.run_query(read_results_from_s3=True)
+
+        self.cursor.fetchall.assert_called_once()
@@ -1,6 +1,12 @@
 import unittest
 
-from redash.query_runner import BaseQueryRunner
+from redash.query_runner import (
+    BaseQueryRunner,
+    QueryResultTooLarge,
+    ResultWriter,
+    TupleResult,
+)
+from redash.utils import json_dumps
 
 
 class TestBaseQueryRunner(unittest.TestCase):
@@ -30,5 +36,56 @@ class TestBaseQueryRunner(unittest.TestCase):
         self.assertEqual(new_columns, expected)
 
 
+class TestTupleResult(unittest.TestCase):
+    def setUp(self):
+        self.columns = [{"name": "id", "type": "integer"}, {"name": "name", "type": "string"}]
+        self.result = TupleResult(self.columns, [(1, "a"), (2, "b")], metadata={"truncated": False})
+        self.legacy = {
+            "columns": self.columns,
+            "rows": [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}],
+            "metadata": {"truncated": False},
+        }
+
+    def test_behaves_like_a_legacy_result(self):
+        self.assertEqual(self.legacy["rows"], self.result["rows"])
+        self.assertEqual({"id": 2, "name": "b"}, self.result["rows"][-1])
+        self.assertEqual([{"id": 2, "name": "b"}], self.result["rows"][1:])
+        self.assertEqual(2, len(self.result["rows"]))
+        self.assertEqual(self.legacy["metadata"], self.result.get("metadata"))
+        self.assertIsNone(self.result.get("error"))
+
+    def test_to_dict(self):
+        self.assertEqual(self.legacy, self.result.to_dict())
+
+    def test_json_dumps(self):
+        self.assertEqual(json_dumps(self.legacy), json_dumps(self.result))
+
+
+class TestResultWriter(unittest.TestCase):
+    def setUp(self):
+        self.columns = [{"name": "id", "friendly_name": "id", "type": "integer"}]
+
+    def test_builds_rows_from_batches(self):
+        writer = ResultWriter(self.columns, max_rows=0, max_bytes=0)
+        writer.write([(1,), (2,)])
+        writer.write([(3,)])
+
+        self.assertEqual(writer.result, {"columns": self.columns, "rows": [{"id": 1}, {"id": 2}, {"id": 3}]})
+
+    def test_raises_when_exceeding_max_rows(self):
+        writer = ResultWriter(self.columns, max_rows=2, max_bytes=0)
+        writer.write([(1,), (2,)])
+
+        with self.assertRaises(QueryResultTooLarge):
+            writer.write([(3,)])
+
+    def test_raises_when_exceeding_max_bytes(self):
+        writer = ResultWriter(self.columns, max_rows=0, max_bytes=20)
+        writer.write([(1,)])
+
+        with self.assertRaises(QueryResultTooLarge):
+            writer.write([(2,), (3,)])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,7 @@
 import unittest
+from unittest import mock
 
+from redash.query_runner import QueryResultTooLarge
 from redash.query_runner.big_query import BigQuery
 
 
@@ -43,3 +45,64 @@ class TestBigQueryQueryRunner(unittest.TestCase):
         expect = query
 
         self.assertEqual(query_runner.annotate_query(query, metadata), expect)
+
+
+class FakeJobs:
+    """Serves the results of a query returning the rows 0 to `count - 1`."""
+
+    fields = [
+        {"name": "n", "type": "INTEGER"},
+        {"name": "even", "type": "BOOLEAN"},
+        {"name": "tags", "type": "STRING", "mode": "REPEATED"},
+    ]
+
+    def __init__(self, count):
+        self.rows = [
+            {"f": [{"v": str(n)}, {"v": "true" if n % 2 == 0 else "false"}, {"v": [{"v": "t{}".format(n)}]}]}
+            for n in range(count)
+        ]
+        self.requested = []
+
+    def insert(self, projectId, body):
+        return mock.Mock(**{"execute.return_value": {"jobReference": {"jobId": "job"}}})
+
+    def getQueryResults(self, projectId, jobId, startIndex, location=None, maxResults=None):
+        self.requested.append(startIndex)
+        # The first reply sets the page size to 4 rows, but the next ones are capped to 3 rows.
+        end = startIndex + (4 if maxResults is None else min(maxResults, 3))
+        reply = {
+            "jobComplete": True,
+            "jobReference": {"jobId": jobId},
+            "schema": {"fields": self.fields},
+            "totalRows": str(len(self.rows)),
+            "totalBytesProcessed": "1000",
+            "rows": self.rows[startIndex:end],
+        }
+        return mock.Mock(**{"execute.return_value": reply})
+
+
+class TestBigQueryResults(unittest.TestCase):
+    def get_query_result(self, jobs):
+        query_runner = BigQuery({"projectId": "project"})
+        with mock.patch.object(query_runner, "_get_bigquery_service") as get_bigquery_service:
+            get_bigquery_service.return_value.jobs.return_value = jobs
+            return query_runner._get_query_result(jobs, "SELECT n")
+
+    def test_fetches_all_pages(self):
+        for parallel in (1, 4):
+            jobs = FakeJobs(11)
+            with mock.patch("redash.query_runner.big_query.settings.BIGQUERY_PARALLEL_PAGE_REQUESTS", parallel):
+                data = self.get_query_result(jobs)
+
+            self.assertEqual(list(range(11)), [row["n"] for row in data["rows"]])
+            self.assertEqual({"n": 4, "even": True, "tags": ["t4"]}, data["rows"][4])
+            self.assertEqual({"data_scanned": 1000}, data["metadata"])
+            self.assertEqual(["n", "even", "tags"], [column["name"] for column in data["columns"]])
+
+    def test_checks_rows_limit_before_downloading(self):
+        jobs = FakeJobs(11)
+        with mock.patch("redash.query_runner.settings.QUERY_RESULTS_MAX_ROWS", 10):
+            with self.assertRaises(QueryResultTooLarge):
+                self.get_query_result(jobs)
+
+        self.assertEqual([0], jobs.requested)
@@ -0,0 +1,56 @@
+from unittest import TestCase
+
+from redash.query_runner import TYPE_INTEGER, TYPE_STRING
+from redash.query_runner.documents import ColumnRegistry, DocumentFlattener
+
+
+class TestColumnRegistry(TestCase):
+    def test_keeps_first_seen_order_and_type(self):
+        columns = ColumnRegistry()
+        columns.add("b", 1)
+        columns.add("a", "x")
+        columns.add("b", "y")
+
+        self.assertEqual(["b", "a"], [column["name"] for column in columns.to_list()])
+        self.assertEqual(TYPE_INTEGER, columns.get("b")["type"])
+        self.assertEqual(TYPE_STRING, columns.get("a")["type"])
+
+    def test_selects_columns_in_the_given_order(self):
+        columns = ColumnRegistry()
+        for name in ("a", "b", "c"):
+            columns.add(name, 1)
+
+        self.assertEqual(["c", "a"], [column["name"] for column in columns.to_list(["c", "missing", "a"])])
+
+
+class TestDocumentFlattener(TestCase):
+    document = {"a": 1, "b": {"c": {"d": 2}, "e": [1, 2]}, "f": {}}
+
+    def test_flattens_nested_objects(self):
+        self.assertEqual({"a": 1, "b.c.d": 2, "b.e": [1, 2]}, DocumentFlattener().flatten(self.document))
+
+    def test_flattens_lists(self):
+        self.assertEqual(
+            {"a": 1, "b.c.d": 2, "b.e.0": 1, "b.e.1": 2},
+            DocumentFlattener(flatten_lists=True).flatten(self.document),
+        )
+
+    def test_limits_depth(self):
+        self.assertEqual(
+            {"a": 1, "b.c": {"d": 2}, "b.e": [1, 2]}, DocumentFlattener(max_depth=1).flatten(self.document)
+        )
+        self.assertEqual(self.document, DocumentFlattener(max_depth=0).flatten(self.document))
+
+    def test_keeps_selected_fields(self):
+        flattener = DocumentFlattener(fields=["a", "b.c"])
+
+        self.assertEqual({"a": 1, "b.c.d": 2}, flattener.flatten(self.document))
+
+    def test_registers_columns_while_consuming_documents(self):
+        flattener = DocumentFlattener()
+        rows = flattener.iter_rows(iter([{"a": 1}, {"b": "x", "a": 2}]))
+
+        self.assertEqual({"a": 1}, next(rows))
+        self.assertEqual(["a"], [column["name"] for column in flattener.columns.to_list()])
+        self.assertEqual({"b": "x", "a": 2}, next(rows))
+        self.assertEqual(["a", "b"], [column["name"] for column in flattener.columns.to_list()])
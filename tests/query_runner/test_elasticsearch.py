@@ -0,0 +1,84 @@
+from unittest import mock
+
+from redash.query_runner.elasticsearch import ElasticSearch, Kibana
+from redash.utils import json_dumps
+from tests import BaseTestCase
+
+MAPPINGS = {"index": {"mappings": {"doc": {"properties": {"n": {"type": "integer"}}}}}}
+
+
+def response(data):
+    return mock.Mock(**{"json.return_value": data})
+
+
+class TestElasticSearchMappings(BaseTestCase):
+    @mock.patch("redash.query_runner.elasticsearch.requests.get", return_value=response(MAPPINGS))
+    def test_caches_query_mappings(self, get):
+        query_runner = ElasticSearch({"server": "http://localhost:9200"})
+
+        for _ in range(2):
+            mappings, error = query_runner._get_query_mappings("http://localhost:9200/index/_mapping")
+            self.assertIsNone(error)
+            self.assertEqual({"n": "integer"}, mappings)
+
+        get.assert_called_once()
+
+    @mock.patch("redash.query_runner.elasticsearch.settings.ELASTICSEARCH_MAPPINGS_CACHE_TTL", 0)
+    @mock.patch("redash.query_runner.elasticsearch.requests.get", return_value=response(MAPPINGS))
+    def test_doesnt_cache_mappings_when_disabled(self, get):
+        query_runner = ElasticSearch({"server": "http://localhost:9200"})
+
+        query_runner._get_query_mappings("http://localhost:9200/index/_mapping")
+        query_runner._get_query_mappings("http://localhost:9200/index/_mapping")
+
+        self.assertEqual(2, get.call_count)
+
+
+class TestKibana(BaseTestCase):
+    def hits(self, start, stop):
+        return [{"_source": {"n": n}} for n in range(start, stop)]
+
+    @mock.patch("redash.query_runner.elasticsearch.requests.delete")
+    @mock.patch("redash.query_runner.elasticsearch.requests.post")
+    @mock.patch("redash.query_runner.elasticsearch.requests.get")
+    def test_scrolls_through_results(self, get, post, delete):
+        get.side_effect = [
+            response(MAPPINGS),
+            response({"_scroll_id": "scroll", "hits": {"total": 7, "hits": self.hits(0, 3)}}),
+        ]
+        post.side_effect = [
+            response({"_scroll_id": "scroll", "hits": {"total": 7, "hits": self.hits(3, 6)}}),
+            response({"_scroll_id": "scroll", "hits": {"total": 7, "hits": self.hits(6, 7)}}),
+        ]
+        query_runner = Kibana({"server": "http://localhost:9200"})
+
+        data, error = query_runner.run_query(
+            json_dumps({"index": "index", "query": "*", "size": 3, "limit": 5, "pagination": "scroll"}), None
+        )
+
+        self.assertIsNone(error)
+        self.assertEqual([0, 1, 2, 3, 4], [row["n"] for row in data["rows"]])
+        self.assertIn("scroll=1m", get.call_args[0][0])
+        self.assertEqual(1, post.call_count)
+        delete.assert_called_once_with(
+            "http://localhost:9200/_search/scroll", json={"scroll_id": ["scroll"]}, auth=None
+        )
+
+    @mock.patch("redash.query_runner.elasticsearch.requests.post")
+    @mock.patch("redash.query_runner.elasticsearch.requests.get")
+    def test_pages_with_from_and_size_by_default(self, get, post):
+        get.side_effect = [
+            response(MAPPINGS),
+            response({"hits": {"total": 7, "hits": self.hits(0, 3)}}),
+            response({"hits": {"total": 7, "hits": self.hits(3, 5)}}),
+        ]
+        query_runner = Kibana({"server": "http://localhost:9200"})
+
+        data, error = query_runner.run_query(json_dumps({"index": "index", "query": "*", "size": 3, "limit": 5}), None)
+
+        self.assertIsNone(error)
+        self.assertEqual([0, 1, 2, 3, 4], [row["n"] for row in data["rows"]])
+        self.assertTrue(get.call_args_list[1][0][0].endswith("&size=3&from=0"))
+        self.assertTrue(get.call_args_list[2][0][0].endswith("&size=2&from=3"))
+        self.assertNotIn("scroll", get.call_args[0][0])
+        post.assert_not_called()
@@ -1,3 +1,4 @@
+import json
 from unittest import TestCase, mock
 
 from redash.query_runner.elasticsearch2 import (
@@ -148,3 +149,85 @@ class TestElasticSearch2(TestCase):
         self.assertEqual(query_dict, {})
         self.assertEqual(url, "/test_index/_search")
         self.assertEqual(result_fields, ["field1", "field2"])
+
+
+class FakeElasticsearch:
+    """Serves the hits of the documents `{"n": 0}` to `{"n": count - 1}` with scrolls and search_after."""
+
+    def __init__(self, count):
+        self.hits = [{"_source": {"n": n}, "sort": [n]} for n in range(count)]
+        self.scrolls = {}
+        self.pits = set()
+
+    def search(self, query):
+        hits = self.hits
+        if "slice" in query:
+            hits = [h for h in hits if h["_source"]["n"] % query["slice"]["max"] == query["slice"]["id"]]
+        return hits
+
+    def scroll(self, scroll_id):
+        hits, offset, size = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = (hits, offset + size, size)
+        return {"_scroll_id": scroll_id, "hits": {"hits": hits[offset : offset + size]}}
+
+    def get_response(self, url, http_method="get", json=None):
+        if url.startswith("/index/_search?scroll="):
+            scroll_id = str(len(self.scrolls))
+            self.scrolls[scroll_id] = (self.search(json), 0, json["size"])
+            data = self.scroll(scroll_id)
+        elif url == "/_search/scroll" and http_method == "post":
+            data = self.scroll(json["scroll_id"])
+        elif url == "/_search/scroll":
+            del self.scrolls[json["scroll_id"][0]]
+            data = {}
+        elif url.startswith("/index/_pit"):
+            self.pits.add("pit")
+            data = {"id": "pit"}
+        elif url == "/_search":
+            offset = json["search_after"][0] + 1 if "search_after" in json else 0
+            data = {"pit_id": json["pit"]["id"], "hits": {"hits": self.hits[offset : offset + json["size"]]}}
+        elif url == "/_pit":
+            self.pits.remove(json["id"])
+            data = {}
+        else:
+            raise AssertionError(url)
+
+        return mock.Mock(**{"json.return_value": data}), None
+
+
+@mock.patch("redash.query_runner.elasticsearch2.ElasticSearch2.__init__", return_value=None)
+class TestElasticSearch2Pagination(TestCase):
+    def run_query(self, pagination, count=23):
+        query_runner = ElasticSearch2()
+        elasticsearch = FakeElasticsearch(count)
+        query_runner.get_response = elasticsearch.get_response
+        query = json.dumps({"index": "index", "query": {"match_all": {}}, "pagination": pagination})
+
+        data, error = query_runner.run_query(query, None)
+
+        self.assertIsNone(error)
+        # The search contexts are released.
+        self.assertEqual({}, elasticsearch.scrolls)
+        self.assertEqual(set(), elasticsearch.pits)
+        return [row["n"] for row in data["rows"]]
+
+    def test_search_after(self, mock_init):
+        self.assertEqual(list(range(23)), self.run_query({"type": "search_after", "size": 5}))
+        self.assertEqual(list(range(20)), self.run_query({"type": "search_after", "size": 5}, count=20))
+
+    def test_scroll(self, mock_init):
+        self.assertEqual(list(range(23)), self.run_query({"type": "scroll", "size": 5}))
+
+    def test_sliced_scroll(self, mock_init):
+        self.assertEqual(list(range(23)), sorted(self.run_query({"type": "scroll", "size": 2, "slices": 3})))
+
+    def test_limit(self, mock_init):
+        self.assertEqual(list(range(7)), self.run_query({"type": "scroll", "size": 5, "limit": 7}))
+        self.assertEqual(7, len(self.run_query({"type": "scroll", "size": 2, "slices": 3, "limit": 7})))
+
+    def test_rejects_aggregations(self, mock_init):
+        query_runner = ElasticSearch2()
+        query = json.dumps({"index": "index", "aggs": {}, "pagination": {"type": "scroll"}})
+
+        with self.assertRaises(Exception):
+            query_runner.run_query(query, None)
@@ -6,7 +6,7 @@ from google.auth.exceptions import TransportError
 from gspread.exceptions import APIError
 from mock import MagicMock, patch
 
-from redash.query_runner import TYPE_DATETIME, TYPE_FLOAT
+from redash.query_runner import TYPE_DATETIME, TYPE_FLOAT, TYPE_INTEGER
 from redash.query_runner.google_spreadsheets import (
     TYPE_BOOLEAN,
     TYPE_STRING,
@@ -107,6 +107,22 @@ class TestParseWorksheet(TestCase):
         self.assertEqual(True, parsed["rows"][0]["Another Column"])
         self.assertEqual(1, parsed["rows"][0]["Column1"])
 
+    def test_guesses_column_types_from_the_first_rows(self):
+        worksheet = [
+            ["Number", "Code", "Blank", "Sparse"],
+            ["1", "1", "", ""],
+            ["2", "A2", "", "3.5"],
+            ["3", "3", "", ""],
+        ]
+
+        parsed = parse_worksheet(worksheet)
+
+        self.assertEqual(
+            [TYPE_INTEGER, TYPE_STRING, TYPE_STRING, TYPE_FLOAT], [column["type"] for column in parsed["columns"]]
+        )
+        self.assertEqual(["1", "A2", "3"], [row["Code"] for row in parsed["rows"]])
+        self.assertEqual([None, 3.5, None], [row["Sparse"] for row in parsed["rows"]])
+
 
 class TestParseQuery(TestCase):
     def test_parse_query(self):
@@ -5,7 +5,7 @@ Some test cases for JSON api runner
 from unittest import TestCase
 from urllib.parse import urlencode, urljoin
 
-from redash.query_runner.json_ds import JSON
+from redash.query_runner.json_ds import JSON, QueryParseError
 
 
 def mock_api(url, method, **request_options):
@@ -45,6 +45,9 @@ def mock_api(url, method, **request_options):
             },
             "page": {"size": 2, "totalElements": 3, "totalPages": 2},
         }
+    elif url.startswith("http://localhost/pages?page="):
+        page = int(url.rsplit("=", 1)[1])
+        data = {"records": [{"id": page * 10 + i} for i in range(2)] if page <= 3 else []}
     else:
         error = "404: {} not found".format(url)
 
@@ -87,3 +90,31 @@ class TestJSON(TestCase):
 
         expected = [{"id": 10}, {"id": 11}, {"id": 12}]
         self.assertEqual(results["rows"], expected)
+
+    def test_page_pagination(self):
+        q = {"url": "pages", "pagination": {"type": "page", "parallel": 2}, "path": "records"}
+        results, error = self.runner._run_json_query(q)
+        self.assertIsNone(error)
+
+        expected = [{"id": 10}, {"id": 11}, {"id": 20}, {"id": 21}, {"id": 30}, {"id": 31}]
+        self.assertEqual(results["rows"], expected)
+
+    def test_page_pagination_stops_on_errors(self):
+        q = {"url": "pages", "pagination": {"type": "page", "param": "missing", "parallel": 3}, "path": "records"}
+        results, error = self.runner._run_json_query(q)
+
+        self.assertIsNotNone(error)
+        self.assertEqual(results["rows"], [])
+
+    def test_max_pages_and_rows(self):
+        q = {"url": "token-test", "pagination": {"type": "token"}, "path": "records", "max_pages": 2}
+        results, error = self.runner._run_json_query(q)
+        self.assertEqual([row["id"] for row in results["rows"]], [1, 2, 3, 4])
+
+        q = {"url": "pages", "pagination": {"type": "page", "parallel": 4}, "path": "records", "max_rows": 3}
+        results, error = self.runner._run_json_query(q)
+        self.assertEqual([row["id"] for row in results["rows"]], [10, 11, 20])
+
+    def test_invalid_limits(self):
+        with self.assertRaises(QueryParseError):
+            self.runner._run_json_query({"url": "basics", "max_rows": 0})
@@ -1,6 +1,8 @@
 from unittest import TestCase
 
-from redash.query_runner.pg import build_schema
+from mock import MagicMock, patch
+
+from redash.query_runner.pg import PostgreSQL, build_schema
 
 
 class TestBuildSchema(TestCase):
@@ -41,3 +43,66 @@ class TestBuildSchema(TestCase):
         self.assertListEqual(
             schema["main.users"]["columns"], [{"name": "id", "type": "integer"}, {"name": "name", "type": "varchar"}]
         )
+
+
+@patch("redash.query_runner.pg._wait")
+@patch.object(PostgreSQL, "_get_connection")
+class TestStreamingRunQuery(TestCase):
+    def setUp(self):
+        self.batches = [[(1,), (2,)], [(3,)], []]
+        self.cursor = MagicMock(description=[("id", 23)])
+        self.cursor.fetchall.side_effect = self.batches
+        self.query_runner = PostgreSQL({"dbname": "test", "streaming": True})
+        self.query_runner.ssl_config = {}
+
+    def executed(self):
+        return [c.args[0] for c in self.cursor.execute.call_args_list]
+
+    def test_fetches_rows_in_batches_from_a_server_side_cursor(self, get_connection, _):
+        get_connection.return_value.cursor.return_value = self.cursor
+
+        with patch("redash.settings.QUERY_RESULTS_FETCH_BATCH_SIZE", 2):
+            data, error = self.query_runner.run_query("SET search_path TO x; SELECT id FROM t;", None)
+
+        self.assertIsNone(error)
+        self.assertEqual(data["rows"], [{"id": 1}, {"id": 2}, {"id": 3}])
+        self.assertEqual(data["columns"], [{"name": "id", "friendly_name": "id", "type": "integer"}])
+
+        executed = self.executed()
+        cursor_name = executed[2].split()[1]
+        self.assertEqual(executed[:2], ["BEGIN", "SET search_path TO x"])
+        self.assertEqual(executed[2], "DECLARE {} NO SCROLL CURSOR FOR SELECT id FROM t".format(cursor_name))
+        self.assertEqual(executed[3:6], ["FETCH FORWARD 2 FROM {}".format(cursor_name)] * 3)
+        self.assertEqual(executed[6], "COMMIT")
+
+    def test_streams_with_queries(self, get_connection, _):
+        get_connection.return_value.cursor.return_value = self.cursor
+
+        data, error = self.query_runner.run_query("WITH t AS (SELECT 1 AS id) SELECT id FROM t", None)
+
+        self.assertIsNone(error)
+        self.assertTrue(
+            self.executed()[1].endswith("NO SCROLL CURSOR FOR WITH t AS (SELECT 1 AS id) SELECT id FROM t")
+        )
+
+    def test_runs_queries_not_ending_with_a_select_as_is(self, get_connection, _):
+        self.cursor.__iter__.return_value = iter([(1,)])
+        get_connection.return_value.cursor.return_value = self.cursor
+        query = "CREATE TEMP TABLE t AS SELECT 1 AS id; INSERT INTO t VALUES (2) RETURNING id"
+
+        data, error = self.query_runner.run_query(query, None)
+
+        self.assertIsNone(error)
+        self.assertEqual(data["rows"], [{"id": 1}])
+        self.assertEqual(self.executed(), [query])
+
+    def test_aborts_when_exceeding_max_rows(self, get_connection, _):
+        get_connection.return_value.cursor.return_value = self.cursor
+
+        with patch("redash.settings.QUERY_RESULTS_MAX_ROWS", 2):
+            data, error = self.query_runner.run_query("SELECT id FROM t", None)
+
+        self.assertIsNone(data)
+        self.assertIn("maximum allowed number of rows", error)
+        # the last batch is never fetched
+        self.assertEqual(self.cursor.fetchall.call_count, 2)
@@ -1,19 +1,31 @@
 import datetime
 import decimal
+import os
+import shutil
 import sqlite3
+import tempfile
+import threading
+import time
 from unittest import TestCase
 
 import mock
 import pytest
 
+from redash.query_runner import InterruptException, TupleResult
+from redash.query_runner.pg import PostgreSQL
 from redash.query_runner.query_results import (
     CreateTableError,
     PermissionError,
+    Results,
+    TableCache,
     _load_query,
+    create_indexes,
     create_table,
     extract_cached_query_ids,
+    extract_index_columns,
     extract_query_ids,
     extract_query_params,
+    fetch_query_results,
     fix_column_name,
     get_query_results,
     prepare_parameterized_query,
@@ -134,6 +146,12 @@ class TestCreateTable(TestCase):
         create_table(connection, table_name, results)
         self.assertEqual(len(list(connection.execute("SELECT * FROM query_123"))), 2)
 
+    def test_loads_tuple_results(self):
+        connection = sqlite3.connect(":memory:")
+        results = TupleResult([{"name": "test1"}, {"name": "test2"}], [(1, [1, 2]), (2, None)])
+        create_table(connection, "query_123", results)
+        self.assertEqual([(1, "[1, 2]"), (2, None)], list(connection.execute("SELECT * FROM query_123")))
+
     def test_loads_list_and_dict_results(self):
         connection = sqlite3.connect(":memory:")
         rows = [{"test1": [1, 2, 3]}, {"test2": {"a": "b"}}]
@@ -143,6 +161,174 @@ class TestCreateTable(TestCase):
         self.assertEqual(len(list(connection.execute("SELECT * FROM query_123"))), 2)
 
 
+class TestRunQuery(BaseTestCase):
+    def test_guesses_column_types(self):
+        query_result = self.factory.create_query_result(
+            data={
+                "columns": [{"name": "id"}, {"name": "created_at"}, {"name": "note"}],
+                "rows": [
+                    {"id": 1, "created_at": "2018-10-31", "note": "a"},
+                    {"id": 2, "created_at": "2018-11-01", "note": 3},
+                ],
+            }
+        )
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        data, error = Results({}).run_query("SELECT * FROM cached_query_{}".format(query.id), self.factory.user)
+
+        self.assertIsNone(error)
+        self.assertEqual(["integer", "datetime", "string"], [c["type"] for c in data["columns"]])
+        self.assertEqual({"id": 2, "created_at": "2018-11-01", "note": 3}, data["rows"][1])
+
+    def test_uses_a_temporary_file(self):
+        query_result = self.factory.create_query_result(data={"columns": [{"name": "id"}], "rows": [{"id": 1}]})
+        query = self.factory.create_query(latest_query_data=query_result)
+        query_runner = Results({"use_temp_file": True, "index_join_columns": True})
+
+        with mock.patch("sqlite3.connect", wraps=sqlite3.connect) as connect:
+            data, error = query_runner.run_query(
+                "SELECT a.id FROM cached_query_{0} a JOIN cached_query_{0} b ON a.id = b.id".format(query.id),
+                self.factory.user,
+            )
+
+        connect.assert_called_once_with("", uri=True)
+        self.assertIsNone(error)
+        self.assertEqual([{"id": 1}], data["rows"])
+
+
+class TestTableCache(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        patcher = mock.patch("redash.settings.QUERY_RESULTS_TABLE_CACHE_PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_tables_of_cached_query_results(self):
+        query_result = self.factory.create_query_result(data={"columns": [{"name": "id"}], "rows": [{"id": 1}]})
+        query = self.factory.create_query(latest_query_data=query_result)
+        query_text = "SELECT * FROM cached_query_{}".format(query.id)
+
+        with mock.patch("redash.query_runner.query_results.create_table", wraps=create_table) as create:
+            first, _ = Results({}).run_query(query_text, self.factory.user)
+            second, _ = Results({}).run_query(query_text, self.factory.user)
+
+        self.assertEqual(1, create.call_count)
+        self.assertEqual([{"id": 1}], first["rows"])
+        self.assertEqual([{"id": 1}], second["rows"])
+        self.assertEqual(["query_{}_{}.sqlite".format(query.id, query_result.id)], os.listdir(self.path))
+
+    def test_attached_tables_are_read_only(self):
+        query_result = self.factory.create_query_result(data={"columns": [{"name": "id"}], "rows": [{"id": 1}]})
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        with pytest.raises(sqlite3.OperationalError):
+            Results({}).run_query("DELETE FROM cached_query_{}".format(query.id), self.factory.user)
+
+    def test_evicts_least_recently_used_tables(self):
+        table_cache = TableCache(self.path, 0)
+        results = {"columns": [{"name": "id"}], "rows": [{"id": 1}]}
+
+        first = table_cache.get(1, 1, lambda: results)
+        os.utime(first, (0, 0))
+        second = table_cache.get(2, 2, lambda: results)
+
+        self.assertEqual([os.path.basename(second)], os.listdir(self.path))
+
+
+class TestFetchQueryResults(BaseTestCase):
+    def create_queries(self, count):
+        return {"query_{}".format(i): (self.factory.create_query().id, None) for i in range(count)}
+
+    def test_runs_queries_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run_query(query, user):
+            barrier.wait()
+            return {"columns": [{"name": "a"}], "rows": [{"a": query}]}, None
+
+        queries = self.create_queries(2)
+        with mock.patch.object(PostgreSQL, "run_query", side_effect=run_query):
+            results = dict(fetch_query_results(self.factory.user, queries))
+
+        self.assertEqual(set(queries), set(results))
+
+    @mock.patch("redash.settings.QUERY_RESULTS_MAX_PARALLEL_QUERIES_PER_DATA_SOURCE", 1)
+    def test_limits_concurrent_queries_per_data_source(self):
+        running = []
+        concurrency = []
+
+        def run_query(query, user):
+            running.append(query)
+            concurrency.append(len(running))
+            time.sleep(0.05)
+            running.remove(query)
+            return {"columns": [], "rows": []}, None
+
+        with mock.patch.object(PostgreSQL, "run_query", side_effect=run_query):
+            results = list(fetch_query_results(self.factory.user, self.create_queries(3)))
+
+        self.assertEqual(3, len(results))
+        self.assertEqual([1, 1, 1], concurrency)
+
+    def test_raises_when_a_query_fails(self):
+        with mock.patch.object(PostgreSQL, "run_query", return_value=(None, "error")):
+            with pytest.raises(Exception, match="Failed loading results"):
+                list(fetch_query_results(self.factory.user, self.create_queries(2)))
+
+    def test_interrupts_running_queries_when_a_query_fails(self):
+        slow_query = "SELECT pg_sleep(5)"
+        queries = {
+            "query_0": (self.factory.create_query(query_text=slow_query).id, None),
+            "query_1": (self.factory.create_query(query_text="SELECT 1").id, None),
+        }
+        interrupted = []
+
+        def run_query(query, user):
+            if query != slow_query:
+                return None, "error"
+            try:
+                for _ in range(500):
+                    time.sleep(0.01)
+            except InterruptException:
+                interrupted.append(query)
+                raise
+            return {"columns": [], "rows": []}, None
+
+        with mock.patch.object(PostgreSQL, "run_query", side_effect=run_query):
+            with pytest.raises(Exception, match="Failed loading results"):
+                list(fetch_query_results(self.factory.user, queries))
+
+        # The query was interrupted before fetch_query_results returned.
+        self.assertEqual([slow_query], interrupted)
+
+
+class TestIndexes(TestCase):
+    def test_extracts_declared_columns(self):
+        query = '-- index: query_1.id, cached_query_2."user id"\nSELECT * FROM query_1, cached_query_2'
+
+        self.assertEqual({("query_1", "id"), ("cached_query_2", "user id")}, extract_index_columns(query, infer=False))
+
+    def test_infers_join_columns(self):
+        query = "SELECT * FROM query_1 AS a JOIN query_2 b ON a.id = b.user_id JOIN query_3 ON query_3.id = b.id"
+
+        self.assertEqual(
+            {("query_1", "id"), ("query_2", "user_id"), ("query_3", "id"), ("query_2", "id")},
+            extract_index_columns(query),
+        )
+        self.assertEqual(set(), extract_index_columns(query, infer=False))
+
+    def test_creates_indexes_and_skips_unknown_columns(self):
+        connection = sqlite3.connect(":memory:")
+        create_table(connection, "query_1", {"columns": [{"name": "id"}], "rows": [{"id": 1}]})
+
+        create_indexes(connection, {("query_1", "id"), ("query_1", "missing"), ("query_2", "id")})
+
+        indexes = connection.execute("SELECT tbl_name FROM sqlite_master WHERE type = 'index'").fetchall()
+        self.assertEqual([("query_1",)], indexes)
+
+
 class TestGetQuery(BaseTestCase):
     # test query from different account
     def test_raises_exception_for_query_from_different_account(self):
@@ -242,8 +428,6 @@ class TestGetQueryResult(BaseTestCase):
         query_result = self.factory.create_query_result()
         query = self.factory.create_query(latest_query_data=query_result)
 
-        from redash.query_runner.pg import PostgreSQL
-
         with mock.patch.object(PostgreSQL, "run_query") as qr:
             query_result_data = {"columns": [], "rows": []}
             qr.return_value = (query_result_data, None)
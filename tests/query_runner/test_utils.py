@@ -1,11 +1,14 @@
 from unittest import TestCase
 
+import mock
+
 from redash.query_runner import (
     TYPE_BOOLEAN,
     TYPE_DATETIME,
     TYPE_FLOAT,
     TYPE_INTEGER,
     TYPE_STRING,
+    guess_column_types,
     guess_type,
 )
 
@@ -38,3 +41,34 @@ class TestGuessType(TestCase):
 
     def test_detects_date(self):
         self.assertEqual(guess_type("2018-10-31"), TYPE_DATETIME)
+
+    def test_detects_iso_datetime(self):
+        self.assertEqual(guess_type("2018-10-31T10:20:30.123+02:00"), TYPE_DATETIME)
+        self.assertEqual(guess_type("2018-10-31 10:20:30"), TYPE_DATETIME)
+        self.assertEqual(guess_type("31 Oct 2018"), TYPE_DATETIME)
+        self.assertEqual(guess_type("2018-10-32"), TYPE_STRING)
+
+
+class TestGuessColumnTypes(TestCase):
+    def test_guesses_each_column(self):
+        rows = [(1, "1.5", "2018-10-31", "a", True), (2, "2.5", "2018-11-01", "b", False)]
+
+        self.assertEqual(
+            [TYPE_INTEGER, TYPE_FLOAT, TYPE_DATETIME, TYPE_STRING, TYPE_BOOLEAN], guess_column_types(rows, 5)
+        )
+
+    def test_falls_back_to_string_when_values_disagree(self):
+        rows = [(1, "2018-10-31", None), (1.5, "2018-11-01", 1), ("3", "2018-11-02", 2)]
+
+        self.assertEqual([TYPE_STRING, TYPE_DATETIME, TYPE_STRING], guess_column_types(rows, 3))
+
+    def test_stops_checking_string_columns(self):
+        rows = [("a", 1), ("b", 2), ("c", 3)]
+
+        with mock.patch("redash.query_runner.guess_type", wraps=guess_type) as guess:
+            self.assertEqual([TYPE_STRING, TYPE_INTEGER], guess_column_types(rows, 2))
+
+        self.assertEqual(4, guess.call_count)
+
+    def test_returns_none_without_rows(self):
+        self.assertEqual([None, None], guess_column_types([], 2))
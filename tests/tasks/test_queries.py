@@ -1,15 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import redis
 from mock import Mock, patch
 from rq import Connection
 from rq.exceptions import NoSuchJobError
+from rq.job import JobStatus
 
-from redash import models, rq_redis_connection
+from redash import models, redis_connection, rq_redis_connection, settings
 from redash.query_runner.pg import PostgreSQL
 from redash.tasks import Job
 from redash.tasks.queries.execution import (
     QueryExecutionError,
+    _job_lock_id,
+    _locks_share_rq_redis,
+    enqueue_queries,
     enqueue_query,
     execute_query,
 )
+from redash.utils import gen_query_hash
 from tests import BaseTestCase
 
 
@@ -30,6 +39,27 @@ def create_job(*args, **kwargs):
     return Job(connection=rq_redis_connection)
 
 
+@contextmanager
+def record_redis_commands():
+    """Records the names of the commands sent to Redis, including the ones sent in pipelines."""
+    commands = []
+    send_command = redis.connection.Connection.send_command
+    pack_commands = redis.connection.Connection.pack_commands
+
+    def record_command(connection, *args, **kwargs):
+        commands.append(args[0])
+        return send_command(connection, *args, **kwargs)
+
+    def record_pipeline_commands(connection, pipeline_commands):
+        commands.extend(args[0] for args in pipeline_commands)
+        return pack_commands(connection, pipeline_commands)
+
+    with patch.object(redis.connection.Connection, "send_command", record_command), patch.object(
+        redis.connection.Connection, "pack_commands", record_pipeline_commands
+    ):
+        yield commands
+
+
 @patch("redash.tasks.queries.execution.Job.fetch", side_effect=fetch_job)
 @patch("redash.tasks.queries.execution.Queue.enqueue", side_effect=create_job)
 class TestEnqueueTask(BaseTestCase):
@@ -172,6 +202,181 @@ class TestEnqueueTask(BaseTestCase):
         self.assertEqual(3, enqueue.call_count)
 
 
+class TestEnqueueQueries(BaseTestCase):
+    def _arguments(self, query, query_text=None):
+        return {
+            "query": query_text or query.query_text,
+            "data_source": query.data_source,
+            "user_id": query.user_id,
+            "scheduled_query": query,
+            "metadata": {"Username": "Arik", "query_id": query.id},
+        }
+
+    def test_enqueues_all_queries(self):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            jobs = enqueue_queries([self._arguments(query), self._arguments(query, "select 2")])
+
+        self.assertEqual(2, len(jobs))
+        self.assertEqual(2, len({job.id for job in jobs}))
+        for job, query_text in zip(jobs, [query.query_text, "select 2"]):
+            job = Job.fetch(job.id, connection=rq_redis_connection)
+            self.assertEqual(query_text, job.args[0])
+            self.assertEqual(query.id, job.kwargs["scheduled_query_id"])
+            self.assertEqual(query.data_source.scheduled_queue_name, job.origin)
+
+    def test_takes_job_locks(self):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            (job,) = enqueue_queries([self._arguments(query)])
+
+        lock = redis_connection.get(_job_lock_id(query.query_hash, query.data_source.id))
+        self.assertEqual(job.id, lock)
+
+    @patch("redash.tasks.queries.execution.enqueue_query")
+    def test_falls_back_to_enqueue_query_when_locked(self, enqueue_query):
+        query = self.factory.create_query()
+        redis_connection.set(_job_lock_id(query.query_hash, query.data_source.id), "some-job-id")
+
+        with Connection(rq_redis_connection):
+            jobs = enqueue_queries([self._arguments(query)])
+
+        enqueue_query.assert_called_once_with(**self._arguments(query))
+        self.assertEqual([enqueue_query.return_value], jobs)
+
+    def test_releases_job_locks_when_enqueuing_fails(self):
+        query = self.factory.create_query()
+        other_lock_id = _job_lock_id(gen_query_hash("select 2"), query.data_source.id)
+
+        with patch("redash.tasks.queries.execution.Queue.enqueue_many", side_effect=redis.ConnectionError):
+            with Connection(rq_redis_connection), self.assertRaises(redis.ConnectionError):
+                enqueue_queries([self._arguments(query), self._arguments(query, "select 2")])
+
+        self.assertIsNone(redis_connection.get(_job_lock_id(query.query_hash, query.data_source.id)))
+        self.assertIsNone(redis_connection.get(other_lock_id))
+
+    def test_keeps_job_locks_taken_by_others_when_enqueuing_fails(self):
+        query = self.factory.create_query()
+        lock_id = _job_lock_id(query.query_hash, query.data_source.id)
+        redis_connection.set(lock_id, "some-job-id")
+
+        with patch("redash.tasks.queries.execution.enqueue_query"), patch(
+            "redash.tasks.queries.execution.Queue.enqueue_many", side_effect=redis.ConnectionError
+        ):
+            with Connection(rq_redis_connection), self.assertRaises(redis.ConnectionError):
+                enqueue_queries([self._arguments(query), self._arguments(query, "select 2")])
+
+        self.assertEqual("some-job-id", redis_connection.get(lock_id))
+
+
+class TestEnqueueQueryScript(BaseTestCase):
+    """enqueue_query when the job locks are kept with the jobs (the tests otherwise keep them in separate databases)."""
+
+    def setUp(self):
+        super().setUp()
+        self.locks = redis.from_url(settings.RQ_REDIS_URL, decode_responses=True)
+        patcher = patch("redash.tasks.queries.execution.redis_connection", self.locks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.assertTrue(_locks_share_rq_redis())
+        rq_redis_connection.flushdb()
+        self.addCleanup(rq_redis_connection.flushdb)
+
+    def enqueue(self, query):
+        with Connection(rq_redis_connection):
+            return enqueue_query(
+                query.query_text,
+                query.data_source,
+                query.user_id,
+                False,
+                None,
+                {"Username": "Arik", "query_id": query.id},
+            )
+
+    def queued_job_ids(self, query):
+        return [
+            job_id.decode() for job_id in rq_redis_connection.lrange("rq:queue:" + query.data_source.queue_name, 0, -1)
+        ]
+
+    def test_enqueues_job_and_takes_lock(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query)
+
+        self.assertEqual(job.id, self.locks.get(_job_lock_id(query.query_hash, query.data_source.id)))
+        self.assertEqual([job.id], self.queued_job_ids(query))
+
+    def test_returns_existing_job(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query)
+        self.assertEqual(job.id, self.enqueue(query).id)
+
+        self.assertEqual([job.id], self.queued_job_ids(query))
+        self.assertEqual(1, len(rq_redis_connection.keys("rq:job:*")))
+
+    def test_replaces_completed_job(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query)
+        job.set_status(JobStatus.FINISHED)
+        new_job = self.enqueue(query)
+
+        self.assertNotEqual(job.id, new_job.id)
+        self.assertEqual(new_job.id, self.locks.get(_job_lock_id(query.query_hash, query.data_source.id)))
+
+    def test_replaces_stopped_job(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query)
+        job.set_status(JobStatus.STOPPED)
+
+        self.assertNotEqual(job.id, self.enqueue(query).id)
+
+    def test_replaces_cancelled_job(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query)
+        job.meta["cancelled"] = True
+        job.save_meta()
+        new_job = self.enqueue(query)
+
+        self.assertNotEqual(job.id, new_job.id)
+        self.assertEqual(new_job.id, self.locks.get(_job_lock_id(query.query_hash, query.data_source.id)))
+        self.assertEqual([job.id, new_job.id], self.queued_job_ids(query))
+
+    def test_replaces_expired_job(self):
+        query = self.factory.create_query()
+
+        job = self.enqueue(query)
+        job.delete()
+
+        self.assertNotEqual(job.id, self.enqueue(query).id)
+
+    def test_enqueues_in_a_single_round_trip(self):
+        self.enqueue(self.factory.create_query())
+
+        with record_redis_commands() as commands:
+            self.enqueue(self.factory.create_query(query_text="select 2"))
+
+        self.assertEqual(["MULTI", "SADD", "HSET", "HSET", "RPUSH", "EVAL", "EXEC"], commands)
+
+    def test_concurrent_identical_submissions(self):
+        query = self.factory.create_query()
+        executions = Mock(side_effect=redis.client.Pipeline.execute, autospec=True)
+
+        with patch.object(redis.client.Pipeline, "execute", lambda pipe, **kwargs: executions(pipe, **kwargs)):
+            with ThreadPoolExecutor(max_workers=50) as executor:
+                jobs = list(executor.map(lambda _: self.enqueue(query), range(500)))
+
+        self.assertEqual(1, len({job.id for job in jobs}))
+        self.assertEqual([jobs[0].id], self.queued_job_ids(query))
+        # A single round trip per submission, without retries.
+        self.assertEqual(500, executions.call_count)
+
+
 @patch("redash.tasks.queries.execution.get_current_job", side_effect=fetch_job)
 class QueryExecutorTests(BaseTestCase):
     def test_success(self, _):
@@ -186,6 +391,17 @@ class QueryExecutorTests(BaseTestCase):
             result = models.QueryResult.query.get(result_id)
             self.assertEqual(result.data, query_result_data)
 
+    def test_records_result_size(self, _):
+        with patch.object(PostgreSQL, "run_query") as qr, patch(
+            "redash.tasks.queries.execution.statsd_client.timing"
+        ) as timing:
+            qr.return_value = ({"columns": [], "rows": [{"a": "b"}]}, None)
+            result_id = execute_query("SELECT 1, 2", self.factory.data_source.id, {})
+            result = models.QueryResult.query.get(result_id)
+
+            self.assertTrue(result.byte_size > 0)
+            timing.assert_any_call("query_results.size.{}".format(self.factory.data_source.id), result.byte_size)
+
     def test_success_scheduled(self, _):
         """
         Scheduled queries remember their latest results.
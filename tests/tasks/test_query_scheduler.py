@@ -0,0 +1,132 @@
+import datetime
+import time
+
+from mock import patch
+
+from redash import models, redis_connection
+from redash.tasks.queries.scheduler import QueryScheduler
+from redash.tasks.schedule import periodic_job_definitions
+from redash.utils import utcnow
+from tests import BaseTestCase
+
+
+class TestQueryScheduler(BaseTestCase):
+    def create_scheduled_query(self, next_run_at):
+        query = self.factory.create_query(
+            schedule={"interval": "3600", "time": None, "until": None, "day_of_week": None}
+        )
+        models.Query.query.filter(models.Query.id == query.id).update(
+            {"next_run_at": next_run_at}, synchronize_session=False
+        )
+        models.db.session.commit()
+        return query
+
+    def test_loads_scheduled_queries(self):
+        due = self.create_scheduled_query(utcnow() - datetime.timedelta(seconds=1))
+        later = self.create_scheduled_query(utcnow() + datetime.timedelta(hours=1))
+        self.factory.create_query()
+
+        scheduler = QueryScheduler()
+        scheduler.load()
+
+        self.assertEqual({due.id, later.id}, set(scheduler.due))
+        self.assertEqual([due.id], scheduler.pop_due_queries(time.time()))
+        self.assertEqual([], scheduler.pop_due_queries(time.time()))
+
+    def test_reload_replaces_outdated_entries(self):
+        query = self.create_scheduled_query(utcnow() - datetime.timedelta(seconds=1))
+        unscheduled = self.create_scheduled_query(utcnow() - datetime.timedelta(seconds=1))
+        scheduler = QueryScheduler()
+        scheduler.load()
+
+        models.Query.query.filter(models.Query.id == query.id).update(
+            {"next_run_at": utcnow() + datetime.timedelta(hours=1)}, synchronize_session=False
+        )
+        models.Query.query.filter(models.Query.id == unscheduled.id).update(
+            {"next_run_at": None}, synchronize_session=False
+        )
+        scheduler.reload({query.id, unscheduled.id})
+
+        self.assertEqual([], scheduler.pop_due_queries(time.time()))
+        self.assertEqual([query.id], list(scheduler.due))
+
+    @patch("redash.tasks.queries.scheduler.refresh_queries")
+    def test_refreshes_due_queries(self, refresh_queries):
+        query = self.create_scheduled_query(utcnow() - datetime.timedelta(seconds=1))
+        self.create_scheduled_query(utcnow() + datetime.timedelta(hours=1))
+
+        scheduler = QueryScheduler()
+        scheduler.MAX_WAIT = 0
+        scheduler.tick()
+
+        refresh_queries.assert_called_once_with([query.id])
+        # Checked again later, unless its execution reschedules it.
+        self.assertGreater(scheduler.due[query.id], time.time())
+
+    @patch("redash.tasks.queries.scheduler.refresh_queries")
+    def test_follows_schedule_changes(self, refresh_queries):
+        query = self.create_scheduled_query(utcnow() + datetime.timedelta(hours=1))
+        scheduler = QueryScheduler()
+        scheduler.MAX_WAIT = 0
+        scheduler.tick()
+
+        models.Query.query.filter(models.Query.id == query.id).update(
+            {"next_run_at": utcnow() - datetime.timedelta(seconds=1)}, synchronize_session=False
+        )
+        models.db.session.commit()
+        models.query_schedule_changes.publish([query.id])
+        scheduler.tick()
+
+        refresh_queries.assert_called_once_with([query.id])
+
+    def test_only_the_leader_schedules(self):
+        leader = QueryScheduler()
+        follower = QueryScheduler()
+
+        self.assertTrue(leader.acquire_leadership())
+        self.assertFalse(follower.acquire_leadership())
+        self.assertTrue(leader.acquire_leadership())
+
+        redis_connection.delete(QueryScheduler.LEADER_KEY)
+        self.assertTrue(follower.acquire_leadership())
+
+
+class TestQueryScheduleChanges(BaseTestCase):
+    def test_publishes_rescheduled_queries_on_commit(self):
+        query = self.factory.create_query()
+        query.latest_query_data = self.factory.create_query_result(
+            retrieved_at=utcnow(), query_text=query.query_text, query_hash=query.query_hash
+        )
+        models.db.session.commit()
+        last_id = models.query_schedule_changes.last_id()
+
+        with patch("redash.models.settings.DEDICATED_QUERY_SCHEDULER", True):
+            query.schedule = {"interval": "3600", "time": None, "until": None, "day_of_week": None}
+            models.db.session.commit()
+
+        self.assertEqual({query.id}, models.query_schedule_changes.read(last_id)[1])
+
+    def test_doesnt_publish_rolled_back_changes(self):
+        query = self.factory.create_query()
+        query.latest_query_data = self.factory.create_query_result(
+            retrieved_at=utcnow(), query_text=query.query_text, query_hash=query.query_hash
+        )
+        models.db.session.commit()
+        last_id = models.query_schedule_changes.last_id()
+
+        with patch("redash.models.settings.DEDICATED_QUERY_SCHEDULER", True):
+            query.schedule = {"interval": "3600", "time": None, "until": None, "day_of_week": None}
+            models.db.session.flush()
+            models.db.session.rollback()
+
+        self.assertEqual(set(), models.query_schedule_changes.read(last_id)[1])
+
+
+class TestPeriodicJobDefinitions(BaseTestCase):
+    def test_refresh_queries_job_depends_on_dedicated_scheduler(self):
+        def job_names():
+            return [job["func"].__name__ for job in periodic_job_definitions()]
+
+        self.assertIn("refresh_queries", job_names())
+        with patch("redash.tasks.schedule.settings.DEDICATED_QUERY_SCHEDULER", True):
+            self.assertNotIn("refresh_queries", job_names())
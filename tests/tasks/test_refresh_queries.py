@@ -1,10 +1,26 @@
-from mock import ANY, call, patch
+from mock import ANY, patch
 
+from redash import redis_connection
 from redash.models import Query
+from redash.tasks.queries.execution import _job_lock_id
 from redash.tasks.queries.maintenance import refresh_queries
 from tests import BaseTestCase
 
-ENQUEUE_QUERY = "redash.tasks.queries.maintenance.enqueue_query"
+ENQUEUE_QUERIES = "redash.tasks.queries.maintenance.enqueue_queries"
+
+
+def enqueued(enqueue_mock):
+    return [arguments for call_args in enqueue_mock.call_args_list for arguments in call_args[0][0]]
+
+
+def arguments(query_text, query, metadata=ANY):
+    return {
+        "query": query_text,
+        "data_source": query.data_source,
+        "user_id": query.user_id,
+        "scheduled_query": query,
+        "metadata": metadata,
+    }
 
 
 class TestRefreshQuery(BaseTestCase):
@@ -19,28 +35,24 @@ class TestRefreshQuery(BaseTestCase):
             data_source=self.factory.create_data_source(),
             options={"apply_auto_limit": True},
         )
-        oq = staticmethod(lambda: [query1, query2])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+        oq = staticmethod(lambda query_ids=None: [query1, query2])
+        with patch(ENQUEUE_QUERIES) as add_job_mock, patch.object(Query, "outdated_queries", oq):
             refresh_queries()
-            self.assertEqual(add_job_mock.call_count, 2)
-            add_job_mock.assert_has_calls(
+            self.assertEqual(add_job_mock.call_count, 1)
+            self.assertCountEqual(
+                enqueued(add_job_mock),
                 [
-                    call(
+                    arguments(
                         query1.query_text + " LIMIT 1000",
-                        query1.data_source,
-                        query1.user_id,
-                        scheduled_query=query1,
-                        metadata={"query_id": query1.id, "Username": query1.user.get_actual_user()},
+                        query1,
+                        {"query_id": query1.id, "Username": query1.user.get_actual_user()},
                     ),
-                    call(
+                    arguments(
                         "select 42 LIMIT 1000",
-                        query2.data_source,
-                        query2.user_id,
-                        scheduled_query=query2,
-                        metadata={"query_id": query2.id, "Username": query2.user.get_actual_user()},
+                        query2,
+                        {"query_id": query2.id, "Username": query2.user.get_actual_user()},
                     ),
                 ],
-                any_order=True,
             )
 
     def test_enqueues_outdated_queries_for_non_sqlquery(self):
@@ -51,28 +63,24 @@ class TestRefreshQuery(BaseTestCase):
         ds = self.factory.create_data_source(group=self.factory.org.default_group, type="prometheus")
         query1 = self.factory.create_query(data_source=ds, options={"apply_auto_limit": True})
         query2 = self.factory.create_query(query_text="select 42;", data_source=ds, options={"apply_auto_limit": True})
-        oq = staticmethod(lambda: [query1, query2])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+        oq = staticmethod(lambda query_ids=None: [query1, query2])
+        with patch(ENQUEUE_QUERIES) as add_job_mock, patch.object(Query, "outdated_queries", oq):
             refresh_queries()
-            self.assertEqual(add_job_mock.call_count, 2)
-            add_job_mock.assert_has_calls(
+            self.assertEqual(add_job_mock.call_count, 1)
+            self.assertCountEqual(
+                enqueued(add_job_mock),
                 [
-                    call(
+                    arguments(
                         query1.query_text,
-                        query1.data_source,
-                        query1.user_id,
-                        scheduled_query=query1,
-                        metadata={"query_id": query1.id, "Username": query1.user.get_actual_user()},
+                        query1,
+                        {"query_id": query1.id, "Username": query1.user.get_actual_user()},
                     ),
-                    call(
+                    arguments(
                         query2.query_text,
-                        query2.data_source,
-                        query2.user_id,
-                        scheduled_query=query2,
-                        metadata={"query_id": query2.id, "Username": query2.user.get_actual_user()},
+                        query2,
+                        {"query_id": query2.id, "Username": query2.user.get_actual_user()},
                     ),
                 ],
-                any_order=True,
             )
 
     def test_doesnt_enqueue_outdated_queries_for_paused_data_source_for_sqlquery(self):
@@ -81,24 +89,18 @@ class TestRefreshQuery(BaseTestCase):
         data source is paused.
         """
         query = self.factory.create_query(options={"apply_auto_limit": True})
-        oq = staticmethod(lambda: [query])
+        oq = staticmethod(lambda query_ids=None: [query])
         query.data_source.pause()
         with patch.object(Query, "outdated_queries", oq):
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as add_job_mock:
                 refresh_queries()
                 add_job_mock.assert_not_called()
 
             query.data_source.resume()
 
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as add_job_mock:
                 refresh_queries()
-                add_job_mock.assert_called_with(
-                    query.query_text + " LIMIT 1000",
-                    query.data_source,
-                    query.user_id,
-                    scheduled_query=query,
-                    metadata=ANY,
-                )
+                self.assertEqual(enqueued(add_job_mock), [arguments(query.query_text + " LIMIT 1000", query)])
 
     def test_doesnt_enqueue_outdated_queries_for_paused_data_source_for_non_sqlquery(
         self,
@@ -109,24 +111,18 @@ class TestRefreshQuery(BaseTestCase):
         """
         ds = self.factory.create_data_source(group=self.factory.org.default_group, type="prometheus")
         query = self.factory.create_query(data_source=ds, options={"apply_auto_limit": True})
-        oq = staticmethod(lambda: [query])
+        oq = staticmethod(lambda query_ids=None: [query])
         query.data_source.pause()
         with patch.object(Query, "outdated_queries", oq):
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as add_job_mock:
                 refresh_queries()
                 add_job_mock.assert_not_called()
 
             query.data_source.resume()
 
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as add_job_mock:
                 refresh_queries()
-                add_job_mock.assert_called_with(
-                    query.query_text,
-                    query.data_source,
-                    query.user_id,
-                    scheduled_query=query,
-                    metadata=ANY,
-                )
+                self.assertEqual(enqueued(add_job_mock), [arguments(query.query_text, query)])
 
     def test_enqueues_parameterized_queries_for_sqlquery(self):
         """
@@ -147,16 +143,10 @@ class TestRefreshQuery(BaseTestCase):
                 "apply_auto_limit": True,
             },
         )
-        oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+        oq = staticmethod(lambda query_ids=None: [query])
+        with patch(ENQUEUE_QUERIES) as add_job_mock, patch.object(Query, "outdated_queries", oq):
             refresh_queries()
-            add_job_mock.assert_called_with(
-                "select 42 LIMIT 1000",
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata=ANY,
-            )
+            self.assertEqual(enqueued(add_job_mock), [arguments("select 42 LIMIT 1000", query)])
 
     def test_enqueues_parameterized_queries_for_non_sqlquery(self):
         """
@@ -179,16 +169,10 @@ class TestRefreshQuery(BaseTestCase):
             },
             data_source=ds,
         )
-        oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+        oq = staticmethod(lambda query_ids=None: [query])
+        with patch(ENQUEUE_QUERIES) as add_job_mock, patch.object(Query, "outdated_queries", oq):
             refresh_queries()
-            add_job_mock.assert_called_with(
-                "select 42",
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata=ANY,
-            )
+            self.assertEqual(enqueued(add_job_mock), [arguments("select 42", query)])
 
     def test_doesnt_enqueue_parameterized_queries_with_invalid_parameters(self):
         """
@@ -209,8 +193,8 @@ class TestRefreshQuery(BaseTestCase):
                 "apply_auto_limit": True,
             },
         )
-        oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+        oq = staticmethod(lambda query_ids=None: [query])
+        with patch(ENQUEUE_QUERIES) as add_job_mock, patch.object(Query, "outdated_queries", oq):
             refresh_queries()
             add_job_mock.assert_not_called()
 
@@ -238,7 +222,31 @@ class TestRefreshQuery(BaseTestCase):
 
         self.factory.create_query(id=100, data_source=None)
 
-        oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+        oq = staticmethod(lambda query_ids=None: [query])
+        with patch(ENQUEUE_QUERIES) as add_job_mock, patch.object(Query, "outdated_queries", oq):
             refresh_queries()
             add_job_mock.assert_not_called()
+
+    def test_enqueues_locked_queries_one_by_one(self):
+        query = self.factory.create_query()
+        redis_connection.set(_job_lock_id(query.query_hash, query.data_source.id), "some-job-id")
+
+        oq = staticmethod(lambda query_ids=None: [query])
+        with patch(ENQUEUE_QUERIES) as add_jobs_mock, patch(
+            "redash.tasks.queries.maintenance.enqueue_query"
+        ) as add_job_mock, patch.object(Query, "outdated_queries", oq):
+            refresh_queries()
+
+        add_jobs_mock.assert_not_called()
+        add_job_mock.assert_called_once_with(**arguments(query.query_text, query))
+
+    def test_records_phase_timings(self):
+        query = self.factory.create_query()
+        oq = staticmethod(lambda query_ids=None: [query])
+        with patch(ENQUEUE_QUERIES), patch.object(Query, "outdated_queries", oq):
+            refresh_queries()
+
+        status = redis_connection.hgetall("redash:status")
+        for key in ("load_duration", "prepare_duration", "lookup_duration", "enqueue_duration"):
+            self.assertGreaterEqual(float(status[key]), 0)
+        self.assertEqual("1", str(status["outdated_queries_count"]))
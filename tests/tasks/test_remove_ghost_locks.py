@@ -0,0 +1,77 @@
+from mock import patch
+
+from redash import redis_connection, rq_redis_connection
+from redash.tasks import remove_ghost_locks
+from redash.tasks.queries import maintenance
+from redash.tasks.worker import Queue
+from tests import BaseTestCase
+
+
+def noop():
+    pass
+
+
+class TestRemoveGhostLocks(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        rq_redis_connection.flushdb()
+        self.addCleanup(rq_redis_connection.flushdb)
+        self.queue = Queue("queries", connection=rq_redis_connection)
+
+    def lock(self, name, job_id):
+        key = "query_hash_job:{}".format(name)
+        redis_connection.set(key, job_id)
+        return key
+
+    def test_keeps_locks_of_queued_and_started_jobs(self):
+        queued = self.lock("queued", self.queue.enqueue(noop).id)
+        started_job = self.queue.enqueue(noop)
+        started_job.set_status("started")
+        started = self.lock("started", started_job.id)
+
+        remove_ghost_locks()
+
+        self.assertEqual(2, redis_connection.exists(queued, started))
+
+    def test_removes_locks_of_missing_and_completed_jobs(self):
+        missing = self.lock("missing", "no-such-job")
+        finished_job = self.queue.enqueue(noop)
+        finished_job.set_status("finished")
+        finished = self.lock("finished", finished_job.id)
+
+        remove_ghost_locks()
+
+        self.assertEqual(0, redis_connection.exists(missing, finished))
+
+    def test_scans_in_batches(self):
+        job_id = self.queue.enqueue(noop).id
+        live = [self.lock("live-{}".format(i), job_id) for i in range(7)]
+        ghosts = [self.lock("ghost-{}".format(i), "no-such-job") for i in range(8)]
+
+        # fakeredis pages SCAN over a fresh listing of the keys, so deleting keys mid-scan would skip some;
+        # Redis returns every key present for the whole scan, which a snapshot of the keys stands in for.
+        lock_keys = list(redis_connection.scan_iter("query_hash_job:*"))
+
+        with patch.object(redis_connection, "scan_iter", return_value=iter(lock_keys)), patch.object(
+            redis_connection, "eval", wraps=redis_connection.eval
+        ) as eval_script:
+            remove_ghost_locks(batch_size=2)
+
+        self.assertTrue(all(call.args[1] <= 2 for call in eval_script.call_args_list))
+        self.assertEqual(len(live), redis_connection.exists(*live))
+        self.assertEqual(0, redis_connection.exists(*ghosts))
+
+    def test_keeps_locks_taken_again_during_the_scan(self):
+        key = self.lock("retaken", "no-such-job")
+        job_id = self.queue.enqueue(noop).id
+        find_ghost_locks = maintenance._find_ghost_locks
+
+        def retake_lock(lock_keys):
+            found, ghost_locks = find_ghost_locks(lock_keys)
+            redis_connection.set(key, job_id)
+            return found, ghost_locks
+
+        with patch.object(maintenance, "_find_ghost_locks", retake_lock):
+            remove_ghost_locks()
+
+        self.assertEqual(job_id, redis_connection.get(key))
@@ -1,3 +1,6 @@
+import threading
+import time
+
 from mock import call, patch
 from rq import Connection
 from rq.job import JobStatus
@@ -5,6 +8,7 @@ from rq.job import JobStatus
 from redash import rq_redis_connection
 from redash.tasks import Queue, Worker
 from redash.tasks.queries.execution import enqueue_query
+from redash.tasks.worker import CompletionPublishingWorker, wait_for_job
 from redash.worker import default_queues, job
 from tests import BaseTestCase
 
@@ -97,3 +101,46 @@ class TestQueueMetrics(BaseTestCase):
 
         foo.delay()
         incr.assert_called_with("rq.jobs.created.default")
+
+
+class TestJobCompletion(BaseTestCase):
+    def create_job(self):
+        with Connection(rq_redis_connection):
+            return Queue("queries").enqueue(len, "")
+
+    def test_wait_returns_when_job_completes(self):
+        queued_job = self.create_job()
+        threading.Timer(0.2, queued_job.cancel).start()
+
+        started_at = time.time()
+        wait_for_job(queued_job, 5)
+
+        self.assertLess(time.time() - started_at, 5)
+        self.assertTrue(queued_job.is_canceled)
+
+    def test_wait_returns_right_away_for_completed_jobs(self):
+        completed_job = self.create_job()
+        completed_job.set_status(JobStatus.FINISHED)
+
+        started_at = time.time()
+        wait_for_job(completed_job, 5)
+
+        self.assertLess(time.time() - started_at, 1)
+
+    def test_wait_times_out(self):
+        queued_job = self.create_job()
+
+        started_at = time.time()
+        wait_for_job(queued_job, 0.3)
+
+        self.assertGreaterEqual(time.time() - started_at, 0.3)
+
+    @patch("redash.tasks.worker.HardLimitingWorker.execute_job")
+    @patch("redash.tasks.worker.publish_job_completion")
+    def test_worker_publishes_completion(self, publish_job_completion, _):
+        queued_job = self.create_job()
+
+        with Connection(rq_redis_connection):
+            CompletionPublishingWorker(["queries"]).execute_job(queued_job, Queue("queries"))
+
+        publish_job_completion.assert_called_once_with(queued_job)
@@ -311,6 +311,99 @@ class QueryOutdatedQueriesTest(BaseTestCase):
         queries = models.Query.outdated_queries()
         self.assertNotIn(query, queries)
 
+    def test_loads_relationships_used_to_refresh_queries(self):
+        query = self.create_scheduled_query(interval="3600")
+        self.fake_previous_execution(query, hours=2)
+        db.session.commit()
+        db.session.expunge_all()
+
+        (query,) = models.Query.outdated_queries()
+
+        for relationship in ("org", "data_source", "user"):
+            self.assertIn(relationship, query.__dict__)
+
+
+class QueryNextRunAtTest(BaseTestCase):
+    def schedule(self, **kwargs):
+        schedule = {"interval": None, "time": None, "until": None, "day_of_week": None}
+        schedule.update(**kwargs)
+        return schedule
+
+    def create_executed_query(self, retrieved_at, **kwargs):
+        query = self.factory.create_query(**kwargs)
+        query.latest_query_data = self.factory.create_query_result(
+            retrieved_at=retrieved_at,
+            query_text=query.query_text,
+            query_hash=query.query_hash,
+        )
+        db.session.flush()
+        return query
+
+    def test_set_when_schedule_changes(self):
+        retrieved_at = utcnow() - datetime.timedelta(minutes=10)
+        query = self.create_executed_query(retrieved_at)
+        self.assertIsNone(query.next_run_at)
+
+        query.schedule = self.schedule(interval="3600")
+        db.session.flush()
+        self.assertEqual(retrieved_at + datetime.timedelta(hours=1), query.next_run_at)
+
+        query.schedule["disabled"] = True
+        db.session.flush()
+        self.assertIsNone(query.next_run_at)
+
+    def test_set_when_execution_completes(self):
+        query = self.create_executed_query(
+            utcnow() - datetime.timedelta(hours=2), schedule=self.schedule(interval="60")
+        )
+
+        retrieved_at = utcnow()
+        query.latest_query_data = self.factory.create_query_result(
+            retrieved_at=retrieved_at,
+            query_text=query.query_text,
+            query_hash=query.query_hash,
+        )
+        db.session.flush()
+        self.assertEqual(retrieved_at + datetime.timedelta(minutes=1), query.next_run_at)
+
+    def test_failures_back_off(self):
+        retrieved_at = utcnow() - datetime.timedelta(minutes=10)
+        query = self.create_executed_query(retrieved_at, schedule=self.schedule(interval="60"))
+
+        query.schedule_failures = 3
+        db.session.flush()
+        self.assertEqual(retrieved_at + datetime.timedelta(minutes=1 + 2**3), query.next_run_at)
+
+    def test_counts_from_scheduled_execution(self):
+        query = self.create_executed_query(
+            utcnow() - datetime.timedelta(hours=2), schedule=self.schedule(interval="3600")
+        )
+        models.scheduled_queries_executions.update(query.id)
+
+        query.schedule_failures = 1
+        db.session.flush()
+        self.assertGreater(query.next_run_at, utcnow() + datetime.timedelta(minutes=59))
+
+    def test_not_set_for_queries_that_never_ran(self):
+        query = self.factory.create_query(schedule=self.schedule(interval="60"))
+        self.assertIsNone(query.next_run_at)
+
+    def test_not_set_past_schedule_until(self):
+        until = (utcnow() + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        query = self.create_executed_query(utcnow(), schedule=self.schedule(interval=str(7 * 24 * 3600), until=until))
+        self.assertIsNone(query.next_run_at)
+
+    def test_outdated_queries_only_loads_due_queries(self):
+        query = self.create_executed_query(
+            utcnow() - datetime.timedelta(hours=2), schedule=self.schedule(interval="60")
+        )
+        self.assertIn(query, models.Query.outdated_queries())
+
+        models.Query.query.filter(models.Query.id == query.id).update(
+            {"next_run_at": utcnow() + datetime.timedelta(hours=1)}, synchronize_session=False
+        )
+        self.assertNotIn(query, models.Query.outdated_queries())
+
 
 class QueryArchiveTest(BaseTestCase):
     def test_archive_query_sets_flag(self):
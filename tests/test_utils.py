@@ -1,7 +1,14 @@
+import datetime
+import decimal
+import enum
+import json
+import math
+import uuid
 from collections import namedtuple
 from unittest import TestCase
 
 import pytest
+import pytz
 
 from redash import create_app
 from redash.query_runner import (
@@ -13,11 +20,13 @@ from redash.query_runner import (
     TYPE_STRING,
 )
 from redash.utils import (
+    JSONEncoder,
     build_url,
     collect_parameters_from_request,
     filter_none,
     generate_token,
     json_dumps,
+    json_loads,
     render_template,
 )
 from redash.utils.pandas import pandas_installed
@@ -93,6 +102,67 @@ class TestJsonDumps(TestCase):
     def test_handles_binary(self):
         self.assertEqual(json_dumps(memoryview(b"test")), '"74657374"')
 
+    data = {
+        "datetime": datetime.datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=pytz.utc),
+        "naive_datetime": datetime.datetime(2020, 1, 2, 3, 4, 5),
+        "offset_datetime": datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+        "date": datetime.date(2020, 1, 2),
+        "time": datetime.time(3, 4, 5, 678901),
+        "timedelta": datetime.timedelta(minutes=1),
+        "decimal": decimal.Decimal("1.25"),
+        "uuid": uuid.UUID(int=1),
+        "bytes": b"\x00\xff",
+        "text": "Ω ✓",
+        "tuple": (1, "a"),
+        1: [None, True, 1.5],
+    }
+
+    def test_encodes_like_the_stdlib_encoder(self):
+        expected = json.dumps(self.data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+        self.assertEqual(expected, json_dumps(self.data))
+        self.assertEqual(json.loads(expected), json_loads(json_dumps(self.data)))
+
+    def test_encodes_nan_as_null(self):
+        self.assertEqual(json_dumps({"a": float("nan")}), '{"a":null}')
+        # The stdlib encoder is used for integers over 64 bits.
+        self.assertEqual(
+            json_dumps([2**70, float("inf"), decimal.Decimal("NaN")]), "[1180591620717411303424,null,null]"
+        )
+        self.assertEqual(json_dumps([float("-inf")], indent=None), "[null]")
+        with self.assertRaises(ValueError):
+            json_dumps([float("nan")], allow_nan=False)
+
+    def test_encodes_enums_as_their_value(self):
+        Color = enum.Enum("Color", {"RED": "red"})
+
+        self.assertEqual(json_dumps([Color.RED]), '["red"]')
+        self.assertEqual(json_dumps([Color.RED, 2**70]), '["red",1180591620717411303424]')
+
+    def test_falls_back_to_the_stdlib_encoder(self):
+        # In the same format.
+        self.assertEqual(json_dumps({"a": [2**70, "x"]}), '{"a":[1180591620717411303424,"x"]}')
+        self.assertEqual(json_dumps({"a": 1}, indent=2), '{\n  "a": 1\n}')
+
+    def test_uses_query_runners_encoders(self):
+        from redash.query_runner.pg import Range
+
+        self.assertEqual(json_dumps([Range(1, 2)]), '["[1, 2)"]')
+
+
+class TestJsonLoads(TestCase):
+    def test_decodes_big_integers_exactly(self):
+        self.assertEqual(json_loads(json_dumps({"a": 2**70})), {"a": 2**70})
+        self.assertEqual(json_loads(b"[-1180591620717411303424]"), [-(2**70)])
+
+    def test_decodes_str_subclasses(self):
+        class Text(str):
+            pass
+
+        self.assertEqual(json_loads(Text('{"a": 1}')), {"a": 1})
+
+    def test_decodes_nan(self):
+        self.assertTrue(math.isnan(json_loads("[NaN]")[0]))
+
 
 class TestGenerateToken(TestCase):
     def test_format(self):